@@ -21,9 +21,26 @@ CREATE TABLE IF NOT EXISTS ml_models (
     id SERIAL PRIMARY KEY,
     type VARCHAR(100) NOT NULL,
     name VARCHAR(255) NOT NULL UNIQUE,
-    price_per_char DECIMAL(10, 4) NOT NULL
+    price_per_char DECIMAL(10, 4) NOT NULL,
+    max_length INTEGER,
+    backend VARCHAR(50) NOT NULL DEFAULT 'torch',
+    cascade_path VARCHAR(500),
+    cascade_low DOUBLE PRECISION,
+    cascade_high DOUBLE PRECISION
 );
 
+-- Notify the services' in-memory model catalogs about every change of ml_models
+CREATE OR REPLACE FUNCTION notify_ml_models_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('ml_models_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER ml_models_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ml_models
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_ml_models_changed();
+
 -- Create wallet table
 CREATE TABLE IF NOT EXISTS wallet (
     id SERIAL PRIMARY KEY,
@@ -31,6 +48,15 @@ CREATE TABLE IF NOT EXISTS wallet (
     balance DECIMAL(10, 2) NOT NULL DEFAULT 0.00
 );
 
+-- Create wallet_debit table: every debit, so it can be refunded at most once
+CREATE TABLE IF NOT EXISTS wallet_debit (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(user_id),
+    amount DECIMAL(10, 2) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    refunded_at TIMESTAMP
+);
+
 -- Create session table
 CREATE TABLE IF NOT EXISTS session (
     id SERIAL PRIMARY KEY,
@@ -42,4 +68,4 @@ CREATE TABLE IF NOT EXISTS session (
     total_words_for_classification INTEGER
 );
 
-INSERT INTO ml_models (type, name, price_per_char) VALUES ('text-classification', 'martin-ha/toxic-comment-model', 1.0);
\ No newline at end of file
+INSERT INTO ml_models (type, name, price_per_char, max_length) VALUES ('text-classification', 'martin-ha/toxic-comment-model', 1.0, 512);
\ No newline at end of file
@@ -0,0 +1,84 @@
+import asyncio
+from typing import Awaitable, Optional, TypeVar
+from fastapi import HTTPException, Request
+from starlette.requests import ClientDisconnect
+from model_manager.fair_queue import PRIORITIES
+import config
+
+TIMEOUT_HEADER = "X-Request-Timeout"
+PRIORITY_HEADER = "X-Priority"
+TRACE_HEADER = "X-Trace"
+
+T = TypeVar("T")
+
+
+def request_timeout(request: Request) -> Optional[float]:
+    """
+    Returns how many seconds the caller is willing to wait for the response.
+
+    Read from the ``X-Request-Timeout`` header, falling back to
+    ``ML_DEFAULT_REQUEST_TIMEOUT``; None means no deadline.
+    """
+    value = request.headers.get(TIMEOUT_HEADER)
+    if value is None:
+        return config.DEFAULT_REQUEST_TIMEOUT or None
+    try:
+        timeout = float(value)
+    except ValueError:
+        timeout = 0
+    if timeout <= 0:
+        raise HTTPException(status_code=400, detail=f"{TIMEOUT_HEADER} должен быть положительным числом секунд")
+    return timeout
+
+
+def request_priority(request: Request) -> Optional[str]:
+    """
+    Returns the priority class requested with the ``X-Priority`` header, if any.
+    """
+    value = request.headers.get(PRIORITY_HEADER)
+    if value is None:
+        return None
+    priority = value.strip().lower()
+    if priority not in PRIORITIES:
+        raise HTTPException(
+            status_code=400, detail=f"{PRIORITY_HEADER} должен быть одним из: {', '.join(PRIORITIES)}"
+        )
+    return priority
+
+
+def trace_requested(request: Request) -> bool:
+    """
+    Tells whether the caller asked for the stage timings of its request with ``X-Trace: 1``.
+    """
+    return request.headers.get(TRACE_HEADER, "").strip().lower() in ("1", "true", "yes")
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Awaits ``awaitable`` unless the client disconnects first.
+
+    Once the body has been read, the next ASGI message of the request is the
+    disconnect, so waiting for it tells when nobody needs the response anymore;
+    the work is then cancelled and its queued texts are dropped.
+
+    Raises:
+        ClientDisconnect: If the client disconnected before the result was ready.
+    """
+    work = asyncio.ensure_future(awaitable)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({work, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        disconnect.cancel()
+        raise
+    disconnect.cancel()
+    if work in done:
+        return work.result()
+    work.cancel()
+    raise ClientDisconnect()
+
+
+async def _wait_for_disconnect(request: Request):
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
@@ -0,0 +1,143 @@
+import json
+from typing import Dict, List, Mapping, Optional, Tuple
+import msgpack
+import numpy as np
+import pyarrow as pa
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from pydantic import ValidationError
+from schemas import PredictRequest
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/msgpack", "application/vnd.msgpack")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Response encodings of the prediction endpoints, preferred in this order on a tie.
+RESPONSE_MEDIA_TYPES = (JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, ARROW_MEDIA_TYPE)
+
+# Documents both accepted body encodings of the prediction endpoints.
+PREDICT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": PredictRequest.model_json_schema()},
+            MSGPACK_MEDIA_TYPE: {"schema": PredictRequest.model_json_schema()},
+        },
+    }
+}
+
+
+def is_msgpack(media_type: str) -> bool:
+    return media_type.split(";", 1)[0].strip().lower() in MSGPACK_MEDIA_TYPES
+
+
+def parse_accept(header: str) -> List[Tuple[str, float]]:
+    """
+    Splits an ``Accept`` header into media ranges and their q-values.
+
+    msgpack aliases are reported as ``MSGPACK_MEDIA_TYPE``; ranges with an
+    unreadable q-value are dropped.
+    """
+    ranges = []
+    for item in header.split(","):
+        media_type, *params = item.split(";")
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = None
+        if quality is not None:
+            ranges.append((MSGPACK_MEDIA_TYPE if is_msgpack(media_type) else media_type, quality))
+    return ranges
+
+
+def _quality(media_type: str, ranges: List[Tuple[str, float]]) -> float:
+    # The most specific matching range decides: exact, then "type/*", then "*/*".
+    patterns = (media_type, media_type.split("/", 1)[0] + "/*", "*/*")
+    matches = [(patterns.index(pattern), quality) for pattern, quality in ranges if pattern in patterns]
+    return min(matches)[1] if matches else 0.0
+
+
+def response_media_type(request: Request) -> str:
+    """
+    Picks the response encoding the client prefers in its ``Accept`` header.
+
+    Every encoding gets the q-value of the most specific range matching it, so
+    ``q=0`` rules an encoding out. The highest q-value wins, JSON on a tie and
+    when nothing offered is acceptable.
+    """
+    ranges = parse_accept(request.headers.get("accept", ""))
+    best, best_quality = JSON_MEDIA_TYPE, 0.0
+    for media_type in RESPONSE_MEDIA_TYPES:
+        quality = _quality(media_type, ranges)
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+async def read_predict_request(request: Request) -> PredictRequest:
+    """
+    Parses a ``{"texts": [...]}`` body sent either as JSON or as msgpack.
+    """
+    body = await request.body()
+    try:
+        if is_msgpack(request.headers.get("content-type", "")):
+            payload = msgpack.unpackb(body, raw=False)
+        else:
+            payload = json.loads(body)
+        return PredictRequest.model_validate(payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректное тело запроса: {e}")
+
+
+def encode_columns(predictions: List[dict]) -> dict:
+    """
+    Packs predictions column-wise: every distinct label once, then one uint16
+    label id and one float32 score per text as little-endian binary arrays.
+    """
+    labels: Dict[str, int] = {}
+    label_ids = np.fromiter(
+        (labels.setdefault(prediction["label"], len(labels)) for prediction in predictions),
+        dtype="<u2", count=len(predictions),
+    )
+    scores = np.fromiter((prediction["score"] for prediction in predictions), dtype="<f4", count=len(predictions))
+    return {
+        "count": len(predictions),
+        "labels": list(labels),
+        "label_ids": label_ids.tobytes(),
+        "scores": scores.tobytes(),
+    }
+
+
+def msgpack_response(payload, headers: Optional[Mapping[str, str]] = None) -> Response:
+    return Response(
+        content=msgpack.packb(payload, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE, headers=headers
+    )
+
+
+def arrow_batch(predictions: List[dict], model_ids: Optional[List[int]] = None) -> pa.RecordBatch:
+    """
+    Packs predictions into an Arrow record batch: a dictionary-encoded ``label``
+    and a float32 ``score`` column, preceded by ``model_id`` when given.
+    """
+    columns = {}
+    if model_ids is not None:
+        columns["model_id"] = pa.array(model_ids, pa.int32())
+    columns["label"] = pa.array([prediction["label"] for prediction in predictions], pa.string()).dictionary_encode()
+    columns["score"] = pa.array([prediction["score"] for prediction in predictions], pa.float32())
+    return pa.RecordBatch.from_pydict(columns)
+
+
+def arrow_response(batch: pa.RecordBatch, headers: Optional[Mapping[str, str]] = None) -> Response:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_MEDIA_TYPE, headers=headers)
@@ -1,10 +1,35 @@
+import asyncio
+import logging
+from contextlib import nullcontext
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import ClientDisconnect
+from db.catalog import notify_catalog_changed
 from db.database import get_db
-from schemas import ModelResponse, LoadModelsResponse, PredictResponse, PredictRequest, AddModelRequest
+from schemas import (
+    ModelResponse, LoadModelsResponse, PredictResponse, PredictRequest, AddModelRequest,
+    CacheStatsResponse, CompareBackendsRequest, BackendComparison, ReadinessResponse, CascadeStatsResponse,
+    EnsemblePredictRequest, EnsemblePredictResponse, ProfileResponse
+)
 from typing import List
-from auth import get_current_user
+from auth import get_admin_user, get_current_user
 from db.models import MLModel
+from model_manager.backends import get_backend
+from model_manager.cascade import CascadeClassifier
+from model_manager.batching import DeadlineExceededError, QueueFullError
+from model_manager import metrics, profiling, tracing
+from api.streaming import NDJSON_MEDIA_TYPE, DuplexStreamingResponse, read_texts, stream_predictions
+from api.admission import cancel_on_disconnect, request_priority, request_timeout, trace_requested
+from api.codecs import (
+    ARROW_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, PREDICT_REQUEST_BODY, arrow_batch, arrow_response, encode_columns,
+    msgpack_response, read_predict_request, response_media_type
+)
+from model_manager.fair_queue import BULK
+import config
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -12,20 +37,41 @@ router = APIRouter()
 async def list_models(
     request: Request,
     current_user = Depends(get_current_user),  # Proper user object
-    db: AsyncSession = Depends(get_db)
 ):
     """
     Returns a list of models available for analysis.
 
+    The list comes from the in-memory model catalog, which is reloaded when
+    ``ml_models`` changes, so the call does not query the database.
     Requires authentication to view models.
     """
     try:
-        model_manager = request.app.state.model_manager
-        models = await model_manager.get_available_models(db)
-        return models
+        return await request.app.state.catalog.models()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении моделей: {e}")
 
+@router.get("/ready", response_model=ReadinessResponse)
+async def readiness(request: Request):
+    """
+    Reports the load state of every model in the catalog.
+
+    Responds with 503 until the catalog is loaded and all pinned models are resident,
+    so it can be used as a readiness probe.
+    """
+    states = request.app.state.model_manager.model_states()
+    if not states["ready"]:
+        return JSONResponse(status_code=503, content=jsonable_encoder(states))
+    return states
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Exposes request, queue, batching, stage latency and model pool metrics
+    in the Prometheus text format.
+    """
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @router.post("/load-models", response_model=LoadModelsResponse)
 async def load_all_models(
     request: Request,
@@ -34,15 +80,16 @@ async def load_all_models(
     
 ):  
     """
-    Downloads and loads all available models from the database.
+    Refreshes the catalog of available models from the database.
 
-    Returns a JSON with a message and a list of loaded model IDs.
+    Models are loaded on their first request (pinned ones right away).
+    Returns a JSON with a message and a list of currently loaded model IDs.
     Requires authentication to view models.
     """
     try:
         model_manager = request.app.state.model_manager
         await model_manager.download_models(db)
-        cached_models = list(model_manager._model_pool.keys())
+        cached_models = model_manager.loaded_model_ids()
         return {
             "message": f"Успешно загружено {len(cached_models)} моделей",
             "loaded_model_ids": cached_models
@@ -54,20 +101,44 @@ async def load_all_models(
 async def add_model(
     request: AddModelRequest,
     db: AsyncSession = Depends(get_db),
-    request_state: Request = None
+    request_state: Request = None,
+    current_user = Depends(get_admin_user)
 ):
     """
     Creates a new model and saves it to the database.
 
+    A cascade bundle must be a file in the artifact directory.
     Returns a JSON with a success message.
-    Requires authentication to add models.
+    Only available to ``ML_ADMIN_USERS``.
     """
+    try:
+        get_backend(request.backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if request.cascade_path:
+        low = config.CASCADE_LOW if request.cascade_low is None else request.cascade_low
+        high = config.CASCADE_HIGH if request.cascade_high is None else request.cascade_high
+        if not 0 <= low < high <= 1:
+            raise HTTPException(status_code=400, detail="Пороги каскада должны удовлетворять 0 <= cascade_low < cascade_high <= 1")
+        try:
+            await asyncio.to_thread(CascadeClassifier.load, request.cascade_path, low, high, config.ARTIFACT_DIR)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Не удалось загрузить каскад: {e}")
+
     new_model = MLModel(
         type=request.type,
         name=request.name,
-        price_per_char=request.price_per_char
+        price_per_char=request.price_per_char,
+        max_length=request.max_length,
+        backend=request.backend,
+        cascade_path=request.cascade_path,
+        cascade_low=request.cascade_low,
+        cascade_high=request.cascade_high
     )
     db.add(new_model)
+    await db.flush()
+    await notify_catalog_changed(db)
     await db.commit()
     await db.refresh(new_model)
 
@@ -79,27 +150,250 @@ async def add_model(
 
     return {"message": "Модель успешно добавлена"} 
 
-@router.post("/predict/{model_id}", response_model=PredictResponse)
+@router.post("/predict/{model_id}", response_model=PredictResponse, openapi_extra=PREDICT_REQUEST_BODY)
 async def predict(
     request: Request,
+    response: Response,
     model_id: int, 
-    texts: PredictRequest,
+    texts: PredictRequest = Depends(read_predict_request),
     current_user = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Makes a prediction using the specified model and input texts.
 
-    Returns a JSON with the prediction result.
+    Returns a JSON with the prediction result. Clients preferring
+    ``application/x-msgpack`` in ``Accept`` get it as msgpack instead, column-wise:
+    the distinct ``labels``, then little-endian uint16 ``label_ids`` and float32
+    ``scores`` with one entry per text; ``application/vnd.apache.arrow.stream``
+    gives an Arrow IPC stream with ``label`` and ``score`` columns. q-values are
+    honoured. The body may be msgpack as well.
+    Responds with 429 and ``Retry-After`` when the model's queue is full and with
+    504 when the ``X-Request-Timeout`` deadline passes; the work is dropped
+    as soon as the client disconnects. ``X-Priority: interactive|bulk`` selects
+    the scheduling class, which is otherwise inferred from the number of texts.
+    With ``X-Trace: 1`` the time the request spent in every stage (cache, queue,
+    batch, tokenization, forward pass, ...) is returned in a ``Server-Timing``
+    header and logged.
     Requires authentication to make predictions.
     """
     model_manager = request.app.state.model_manager
     
-    if model_id not in model_manager._model_pool:
-        raise HTTPException(status_code=404, detail="Model not loaded")
+    if not model_manager.has_model(model_id):
+        raise HTTPException(status_code=404, detail="Model not found")
 
+    timeout = request_timeout(request)
+    priority = request_priority(request)
     try:
-        result = await model_manager.predict(model_id, texts.texts)
+        with tracing.trace_request() if trace_requested(request) else nullcontext() as trace:
+            result = await cancel_on_disconnect(
+                request,
+                model_manager.predict(model_id, texts.texts, timeout, current_user.get("sub"), priority)
+            )
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+            logger.info(f"Trace of a prediction with model {model_id}: {trace.to_dict()}")
+        media_type = response_media_type(request)
+        if media_type == MSGPACK_MEDIA_TYPE:
+            return msgpack_response({"result": encode_columns(result)}, response.headers)
+        if media_type == ARROW_MEDIA_TYPE:
+            return arrow_response(arrow_batch(result), response.headers)
         return {"result": result}
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Модель перегружена, повторите запрос позже",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except DeadlineExceededError:
+        raise HTTPException(status_code=504, detail="Не удалось выполнить предсказание за отведённое время")
+    except ClientDisconnect:
+        # Nobody is left to read the response.
+        return Response(status_code=499)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction error: {e}")
+
+@router.post("/ensemble/predict", response_model=EnsemblePredictResponse)
+async def predict_ensemble(
+    request: Request,
+    body: EnsemblePredictRequest,
+    current_user = Depends(get_current_user)
+):
+    """
+    Runs the same texts through several models in one request.
+
+    The models run concurrently, each through its own queue like ``/predict``
+    (``X-Priority`` applies), and models sharing a tokenizer tokenize the texts
+    only once. Returns the predictions of every model side by side, keyed by model ID,
+    as JSON or in the msgpack format of ``/predict``; the Arrow IPC stream holds
+    one row per model and text, with a ``model_id`` column.
+    Requires authentication to make predictions.
+    """
+    model_manager = request.app.state.model_manager
+
+    unknown = [model_id for model_id in body.model_ids if not model_manager.has_model(model_id)]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Models not found: {unknown}")
+
+    timeout = request_timeout(request)
+    priority = request_priority(request)
+    try:
+        results = await cancel_on_disconnect(
+            request, model_manager.predict_ensemble(body.model_ids, body.texts, timeout, current_user.get("sub"), priority)
+        )
+        media_type = response_media_type(request)
+        if media_type == MSGPACK_MEDIA_TYPE:
+            return msgpack_response({
+                "results": {str(model_id): encode_columns(result) for model_id, result in results.items()}
+            })
+        if media_type == ARROW_MEDIA_TYPE:
+            return arrow_response(arrow_batch(
+                [prediction for result in results.values() for prediction in result],
+                [model_id for model_id, result in results.items() for _ in result],
+            ))
+        return {"results": results}
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Модель перегружена, повторите запрос позже",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except DeadlineExceededError:
+        raise HTTPException(status_code=504, detail="Не удалось выполнить предсказание за отведённое время")
+    except ClientDisconnect:
+        return Response(status_code=499)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction error: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Prediction error: {e}")
+
+@router.post("/predict/{model_id}/stream")
+async def predict_stream(
+    request: Request,
+    model_id: int,
+    current_user = Depends(get_current_user)
+):
+    """
+    Streams predictions for a newline-delimited body of any size.
+
+    The body is read as JSON Lines (``application/x-ndjson``: a string or
+    ``{"text": ...}`` per line) or as plain text with one text per line. Texts are
+    predicted in chunks as they arrive and every result is streamed back at once
+    as an NDJSON line ``{"index": ..., "label": ..., "score": ...}``. An unreadable
+    line ends the stream with ``{"error": ..., "line": ...}`` after the results of
+    the texts before it. Streams run in the bulk class unless ``X-Priority`` says otherwise.
+    Requires authentication to make predictions.
+    """
+    model_manager = request.app.state.model_manager
+
+    if not model_manager.has_model(model_id):
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    priority = request_priority(request) or BULK
+    ndjson = request.headers.get("content-type", "").startswith(("application/x-ndjson", "application/jsonl"))
+    texts = read_texts(request.stream(), ndjson)
+    return DuplexStreamingResponse(
+        stream_predictions(
+            model_manager, model_id, texts, config.STREAM_CHUNK_SIZE, current_user.get("sub"), priority
+        ),
+        media_type=NDJSON_MEDIA_TYPE
+    )
+
+@router.post("/models/{model_id}/compare-backends", response_model=List[BackendComparison])
+async def compare_backends(
+    request: Request,
+    model_id: int,
+    body: CompareBackendsRequest,
+    current_user = Depends(get_admin_user)
+):
+    """
+    Runs the texts through the model with every requested backend.
+
+    Returns the label agreement and score delta of each backend against PyTorch fp32
+    together with its throughput, to pick the cheapest acceptable backend.
+    Loads extra copies of the model, so it is only available to ``ML_ADMIN_USERS``.
+    """
+    model_manager = request.app.state.model_manager
+
+    if not model_manager.has_model(model_id):
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    try:
+        return await model_manager.compare_backends(model_id, body.texts, body.backends)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Comparison error: {e}")
+
+@router.get("/models/{model_id}/cascade/stats", response_model=CascadeStatsResponse)
+async def cascade_stats(
+    request: Request,
+    model_id: int,
+    current_user = Depends(get_current_user)
+):
+    """
+    Returns the thresholds of the model's cascade pre-classifier, how many texts it
+    answered itself and how often a sampled answer agreed with the transformer.
+
+    Requires authentication to view cascade statistics.
+    """
+    model_manager = request.app.state.model_manager
+
+    if not model_manager.has_model(model_id):
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    stats = model_manager.cascade_stats(model_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Cascade is not configured for this model")
+    return stats
+
+@router.post("/admin/profile", response_model=ProfileResponse)
+async def profile(
+    request: Request,
+    seconds: float = 10,
+    interval_ms: float = 10,
+    torch_ops: bool = False,
+    include_idle: bool = False,
+    format: str = "json",
+    current_user = Depends(get_admin_user)
+):
+    """
+    Profiles the worker serving the request for ``seconds`` and returns the result.
+
+    The Python stacks of all threads are sampled every ``interval_ms`` and returned
+    in the folded format of flame graph tools, together with garbage collector
+    pauses and event loop lag. With ``torch_ops`` the batches run meanwhile are
+    also profiled with ``torch.profiler`` (thread executor only). ``format=folded``
+    returns just the folded stacks as plain text, e.g. for ``flamegraph.pl``.
+    Threads that are only waiting are left out unless ``include_idle`` is set.
+    Requires a user listed in ``ML_ADMIN_USERS``.
+    """
+    if not 0 < seconds <= config.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400, detail=f"seconds должен быть в диапазоне (0, {config.PROFILE_MAX_SECONDS:g}]"
+        )
+    if interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="interval_ms должен быть положительным")
+    if format not in ("json", "folded"):
+        raise HTTPException(status_code=400, detail="format должен быть json или folded")
+
+    try:
+        report = await cancel_on_disconnect(
+            request, profiling.profile(seconds, interval_ms / 1000, torch_ops, include_idle)
+        )
+    except profiling.ProfilerBusyError:
+        raise HTTPException(status_code=409, detail="Профилирование уже запущено")
+    except ClientDisconnect:
+        return Response(status_code=499)
+
+    if format == "folded":
+        return PlainTextResponse(report["folded"])
+    return report
+
+@router.get("/cache/stats", response_model=CacheStatsResponse)
+async def cache_stats(
+    request: Request,
+    current_user = Depends(get_current_user)
+):
+    """
+    Returns hit/miss counters and memory usage of the prediction cache.
+
+    Requires authentication to view cache statistics.
+    """
+    return request.app.state.model_manager.cache_stats()
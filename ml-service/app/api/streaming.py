@@ -0,0 +1,156 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+from fastapi.responses import StreamingResponse
+from model_manager.batching import QueueFullError
+from model_manager.fair_queue import BULK
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class InputLineError(ValueError):
+    """A line of the request body that cannot be read as a text."""
+
+    def __init__(self, line: int, error: Exception):
+        super().__init__(f"Line {line}: {error}")
+        self.line = line
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    A streaming response whose body iterator keeps reading the request body.
+
+    The stock ``StreamingResponse`` waits for a disconnect by calling ``receive``
+    concurrently, which would swallow request body chunks; here a disconnect
+    surfaces through the request stream instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def parse_line(line: str, ndjson: bool) -> Optional[str]:
+    """
+    Extracts the text from one input line; blank lines are skipped.
+
+    NDJSON lines may be either a JSON string or an object with a ``text`` field.
+    """
+    if not line.strip():
+        return None
+    if not ndjson:
+        return line
+    value = json.loads(line)
+    if isinstance(value, dict):
+        value = value.get("text")
+    if not isinstance(value, str):
+        raise ValueError(f"Expected a string or an object with a 'text' field, got {line!r}")
+    return value
+
+
+async def read_texts(body: AsyncIterator[bytes], ndjson: bool) -> AsyncIterator[str]:
+    """
+    Yields texts from a newline-delimited request body as its chunks arrive.
+
+    Raises:
+        InputLineError: If a line is not valid UTF-8 or, for NDJSON, not a valid
+            text; ``line`` is its 1-based number in the body.
+    """
+    def parse(number: int, line: bytes) -> Optional[str]:
+        try:
+            return parse_line(line.decode("utf-8").rstrip("\r"), ndjson)
+        except ValueError as e:
+            raise InputLineError(number, e) from e
+
+    buffer = b""
+    number = 0
+    async for part in body:
+        buffer += part
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            text = parse(number, line)
+            if text is not None:
+                yield text
+
+    text = parse(number + 1, buffer)
+    if text is not None:
+        yield text
+
+
+async def predict_chunk(
+    model_manager, model_id: int, texts: List[str], user: Optional[str], priority: str
+) -> List[dict]:
+    """
+    Predicts a chunk, waiting for room whenever the model's queue is full.
+
+    A stream is not rejected halfway through; instead it stops reading the
+    request body until the queue drains, which throttles the client.
+    """
+    while True:
+        try:
+            return await model_manager.predict(model_id, texts, user=user, priority=priority)
+        except QueueFullError as e:
+            await asyncio.sleep(e.retry_after)
+
+
+async def stream_predictions(
+    model_manager,
+    model_id: int,
+    texts: AsyncIterator[str],
+    chunk_size: int,
+    user: Optional[str] = None,
+    priority: str = BULK,
+) -> AsyncIterator[str]:
+    """
+    Predicts texts in chunks as they arrive and yields one NDJSON line per text.
+
+    While a chunk is being predicted the next one is read from the input, so at
+    most two chunks are held in memory whatever the input size. An error stops
+    the stream with a final ``{"error": ...}`` line; when it is an unreadable
+    input line, the texts before it are still predicted and the error line
+    carries its number as ``line``. Streams are bulk work unless another
+    priority is given.
+    """
+    pending: Optional[Tuple[int, asyncio.Task]] = None
+    chunk: List[str] = []
+    index = 0
+
+    async def flush():
+        start, task = pending
+        for offset, prediction in enumerate(await task):
+            yield json.dumps({"index": start + offset, **prediction}, ensure_ascii=False) + "\n"
+
+    input_error: Optional[InputLineError] = None
+    try:
+        try:
+            async for text in texts:
+                chunk.append(text)
+                if len(chunk) < chunk_size:
+                    continue
+                if pending is not None:
+                    async for line in flush():
+                        yield line
+                pending = (index, asyncio.create_task(predict_chunk(model_manager, model_id, chunk, user, priority)))
+                index += len(chunk)
+                chunk = []
+        except InputLineError as e:
+            input_error = e
+
+        if pending is not None:
+            async for line in flush():
+                yield line
+            pending = None
+        if chunk:
+            pending = (index, asyncio.create_task(predict_chunk(model_manager, model_id, chunk, user, priority)))
+            async for line in flush():
+                yield line
+            pending = None
+        if input_error is not None:
+            yield json.dumps({"error": str(input_error), "line": input_error.line}, ensure_ascii=False) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+    finally:
+        if pending is not None:
+            pending[1].cancel()
@@ -2,6 +2,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 import os
+import config
 
 SECRET_KEY = os.environ['SECRET_KEY']
 ALGORITHM = "HS256"
@@ -24,4 +25,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return payload
\ No newline at end of file
+    return payload
+
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
+    """Allows only the users listed in ``ML_ADMIN_USERS``."""
+    if current_user.get("sub") not in config.ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    return current_user
\ No newline at end of file
@@ -0,0 +1,97 @@
+import os
+
+# Dynamic batching: texts from concurrent /predict calls are merged into one
+# forward pass of at most MAX_BATCH_SIZE texts, waiting no longer than
+# MAX_BATCH_WAIT_MS for the batch to fill up.
+MAX_BATCH_SIZE = int(os.environ.get("ML_MAX_BATCH_SIZE", 32))
+MAX_BATCH_WAIT_MS = float(os.environ.get("ML_MAX_BATCH_WAIT_MS", 5))
+
+# Blocking inference runs on a dedicated executor ("thread" or "process") with
+# INFERENCE_WORKERS workers; at most MAX_CONCURRENCY_PER_MODEL batches of the
+# same model run at the same time.
+INFERENCE_EXECUTOR = os.environ.get("ML_INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.environ.get("ML_INFERENCE_WORKERS", 4))
+MAX_CONCURRENCY_PER_MODEL = int(os.environ.get("ML_MAX_CONCURRENCY_PER_MODEL", 1))
+
+# Admission control: a model queues at most MAX_QUEUE_TEXTS texts (0 means no
+# limit) and rejects further requests with 429. A request may set its own
+# deadline in seconds with the X-Request-Timeout header; DEFAULT_REQUEST_TIMEOUT
+# applies otherwise (0 means none).
+MAX_QUEUE_TEXTS = int(os.environ.get("ML_MAX_QUEUE_TEXTS", 1024))
+DEFAULT_REQUEST_TIMEOUT = float(os.environ.get("ML_DEFAULT_REQUEST_TIMEOUT", 30))
+
+# Scheduling: interactive requests always run before bulk ones; a request without
+# an X-Priority header is interactive when it has at most INTERACTIVE_MAX_TEXTS
+# texts. Within a class users (the JWT sub) get a fair share of every model,
+# proportional to their weight from USER_WEIGHTS ("sub:weight,..."; 1 by default).
+INTERACTIVE_MAX_TEXTS = int(os.environ.get("ML_INTERACTIVE_MAX_TEXTS", 32))
+USER_WEIGHTS = {
+    user.strip(): float(weight)
+    for user, weight in (
+        item.rsplit(":", 1) for item in os.environ.get("ML_USER_WEIGHTS", "").split(",") if item.strip()
+    )
+}
+
+# Token limit for models whose ml_models.max_length is not set.
+DEFAULT_MAX_LENGTH = int(os.environ.get("ML_DEFAULT_MAX_LENGTH", 512))
+
+# Prediction cache in front of the models; a zero budget or TTL disables it.
+CACHE_MAX_MB = float(os.environ.get("ML_CACHE_MAX_MB", 64))
+CACHE_TTL_SECONDS = float(os.environ.get("ML_CACHE_TTL_SECONDS", 3600))
+
+# Near-duplicate reuse (opt-in): a cache miss whose normalized text differs from
+# a recently scored text of the same model in at most
+# NEAR_DUPLICATE_MAX_CHANGED_SHINGLES character shingles (8: any one character
+# edit, and some short inserted words) reuses its prediction. Every model keeps up to NEAR_DUPLICATE_MAX_ENTRIES
+# fingerprints (0 disables reuse); NEAR_DUPLICATE_SHADOW_RATE of the reuses are
+# checked against the model in the background.
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.environ.get("ML_NEAR_DUPLICATE_MAX_ENTRIES", 0))
+NEAR_DUPLICATE_MAX_CHANGED_SHINGLES = int(os.environ.get("ML_NEAR_DUPLICATE_MAX_CHANGED_SHINGLES", 8))
+NEAR_DUPLICATE_SHADOW_RATE = float(os.environ.get("ML_NEAR_DUPLICATE_SHADOW_RATE", 0.01))
+
+# Models are loaded on first use; when their weights exceed the budget the least
+# recently used ones are unloaded (0 means no limit). Pinned models, given as a
+# comma-separated list of ml_models ids, are loaded at startup and never unloaded.
+# With the process executor every worker process keeps its own copies, and the
+# budget applies to each of them.
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("ML_MODEL_MEMORY_BUDGET_MB", 0))
+PINNED_MODELS = [
+    int(model_id) for model_id in os.environ.get("ML_PINNED_MODELS", "").split(",") if model_id.strip()
+]
+
+# Cascade pre-classifier (ml_models.cascade_path): texts whose probability is at
+# most CASCADE_LOW or at least CASCADE_HIGH skip the transformer, unless the model
+# sets its own thresholds. CASCADE_SHADOW_RATE of those texts are still checked
+# against the transformer in the background to measure agreement.
+CASCADE_LOW = float(os.environ.get("ML_CASCADE_LOW", 0.05))
+CASCADE_HIGH = float(os.environ.get("ML_CASCADE_HIGH", 0.95))
+CASCADE_SHADOW_RATE = float(os.environ.get("ML_CASCADE_SHADOW_RATE", 0.01))
+
+# Number of texts the streaming /predict endpoint collects before running inference.
+STREAM_CHUNK_SIZE = int(os.environ.get("ML_STREAM_CHUNK_SIZE", 256))
+
+# Local store of models converted to safetensors; an empty value loads straight from the hub.
+ARTIFACT_DIR = os.environ.get("ML_ARTIFACT_DIR", "/artifacts")
+
+# Production serving (serve.py): models are loaded once and WORKERS processes are
+# forked from the loader. THREADS_PER_WORKER = 0 splits the available CPUs evenly;
+# PIN_CPUS binds every worker to its own CPU set.
+HOST = os.environ.get("ML_HOST", "0.0.0.0")
+PORT = int(os.environ.get("ML_PORT", 8001))
+WORKERS = int(os.environ.get("ML_WORKERS", 1))
+THREADS_PER_WORKER = int(os.environ.get("ML_THREADS_PER_WORKER", 0))
+PIN_CPUS = os.environ.get("ML_PIN_CPUS", "true").lower() in ("1", "true", "yes")
+
+# Profiling: JWT subs allowed to use the /admin endpoints (comma-separated) and
+# the longest profile a single /admin/profile call may take, in seconds.
+ADMIN_USERS = {user.strip() for user in os.environ.get("ML_ADMIN_USERS", "").split(",") if user.strip()}
+PROFILE_MAX_SECONDS = float(os.environ.get("ML_PROFILE_MAX_SECONDS", 60))
+
+# The model catalog is kept in memory and reloaded on Postgres notifications;
+# without one it is reloaded at the latest after this many seconds.
+CATALOG_TTL_SECONDS = float(os.environ.get("ML_CATALOG_TTL_SECONDS", 60))
+
+# Metrics of forked workers are aggregated through files in a fresh directory
+# that serve.py creates for every run under this one and removes on exit, unless
+# PROMETHEUS_MULTIPROC_DIR is set, which is then used as it is.
+METRICS_DIR = os.environ.get("ML_METRICS_DIR", "/tmp/ml-service-metrics")
@@ -8,6 +8,8 @@ host = os.environ['POSTGRES_HOST']
 port = os.environ['POSTGRES_PORT']
 
 SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{username}:{password}@{host}:{port}/postgres"
+# Plain asyncpg DSN for connections outside SQLAlchemy (LISTEN/NOTIFY).
+DATABASE_DSN = f"postgresql://{username}:{password}@{host}:{port}/postgres"
 
 engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
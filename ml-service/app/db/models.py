@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric
+from sqlalchemy import Column, Float, Integer, String, Numeric, text
 from db.database import Base
 
 class MLModel(Base):
@@ -7,4 +7,9 @@ class MLModel(Base):
     id = Column(Integer, primary_key=True, index=True)
     type = Column(String(100), nullable=False)
     name = Column(String(255), nullable=False)
-    price_per_char = Column(Numeric(10, 4), nullable=False)
\ No newline at end of file
+    price_per_char = Column(Numeric(10, 4), nullable=False)
+    max_length = Column(Integer)
+    backend = Column(String(50), nullable=False, server_default=text("'torch'"))
+    cascade_path = Column(String(500))
+    cascade_low = Column(Float)
+    cascade_high = Column(Float)
\ No newline at end of file
@@ -3,27 +3,67 @@ from contextlib import asynccontextmanager
 from typing import AsyncIterator
 from api.endpoints.routers import router as ml_router
 from db.database import engine, Base
+from db.catalog import ModelCatalog
 from model_manager.model_manager import ModelManager
 from db.database import get_db
-from db.database import AsyncSessionLocal
+from db.database import AsyncSessionLocal, DATABASE_DSN
+import config
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def create_model_manager() -> ModelManager:
+    return ModelManager(
+        device="auto",
+        max_batch_size=config.MAX_BATCH_SIZE,
+        max_wait_ms=config.MAX_BATCH_WAIT_MS,
+        executor=config.INFERENCE_EXECUTOR,
+        max_workers=config.INFERENCE_WORKERS,
+        max_concurrency_per_model=config.MAX_CONCURRENCY_PER_MODEL,
+        max_queue_texts=config.MAX_QUEUE_TEXTS,
+        interactive_max_texts=config.INTERACTIVE_MAX_TEXTS,
+        user_weights=config.USER_WEIGHTS,
+        default_max_length=config.DEFAULT_MAX_LENGTH,
+        cascade_low=config.CASCADE_LOW,
+        cascade_high=config.CASCADE_HIGH,
+        cascade_shadow_rate=config.CASCADE_SHADOW_RATE,
+        near_duplicate_max_entries=config.NEAR_DUPLICATE_MAX_ENTRIES,
+        near_duplicate_max_changed_shingles=config.NEAR_DUPLICATE_MAX_CHANGED_SHINGLES,
+        near_duplicate_shadow_rate=config.NEAR_DUPLICATE_SHADOW_RATE,
+        cache_max_bytes=int(config.CACHE_MAX_MB * 1024 * 1024),
+        cache_ttl_seconds=config.CACHE_TTL_SECONDS,
+        memory_budget_bytes=int(config.MODEL_MEMORY_BUDGET_MB * 1024 * 1024),
+        pinned_models=config.PINNED_MODELS,
+        artifact_dir=config.ARTIFACT_DIR,
+    )
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
-    app.state.model_manager = ModelManager(device="auto")
-    logger.info("ModelManager initialized")
+    # serve.py hands its workers a manager whose models were loaded in the parent.
+    if getattr(app.state, "model_manager", None) is None:
+        app.state.model_manager = create_model_manager()
+        logger.info("ModelManager initialized")
+
+        async with AsyncSessionLocal() as session:
+            try:
+                await app.state.model_manager.download_models(session)
+            except Exception as e:
+                logger.error(f"Model catalog loading failed: {e}")
 
-    async with AsyncSessionLocal() as session:
-        try:
+    async def refresh_models():
+        async with AsyncSessionLocal() as session:
             await app.state.model_manager.download_models(session)
-        except Exception as e:
-            logger.error(f"Model pre-loading failed: {e}")
-    
-    yield 
-    #await app.state.model_manager.cleanup()  # Assuming you have a cleanup method
+
+    # Every worker listens on its own, so each one picks up catalog changes.
+    app.state.catalog = ModelCatalog(
+        AsyncSessionLocal, DATABASE_DSN, config.CATALOG_TTL_SECONDS, on_change=refresh_models
+    )
+    await app.state.catalog.start()
+
+    yield
+    await app.state.catalog.close()
+    await app.state.model_manager.cleanup()
     logger.info("ModelManager cleaned up")
 
 app = FastAPI(lifespan=lifespan)
@@ -0,0 +1,72 @@
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_FILE = "model.safetensors"
+
+
+class ArtifactStore:
+    """
+    Local copies of model weights and tokenizer files.
+
+    Every model is converted once to safetensors next to its config and tokenizer.
+    Safetensors files are memory-mapped on load, so a cold start only maps pages
+    that are already in the page cache, and workers on the same node share them.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, model_name: str) -> str:
+        return os.path.join(self.root, model_name.replace("/", "--"))
+
+    def has(self, model_name: str) -> bool:
+        path = self.path(model_name)
+        return os.path.isfile(os.path.join(path, "config.json")) and any(
+            name.endswith(".safetensors") for name in os.listdir(path)
+        )
+
+    def source(self, model_name: str) -> str:
+        """
+        Returns the local directory of a stored model, or its hub name otherwise.
+        """
+        return self.path(model_name) if self.has(model_name) else model_name
+
+    def resolve(self, task: str, model_name: str) -> str:
+        """
+        Returns a local directory with the model, converting it on first use.
+
+        Falls back to the hub name when the model cannot be stored locally, so a
+        read-only or full disk only costs the cold start time.
+
+        Args:
+            task (str): The pipeline task of the model.
+            model_name (str): The hub name of the model.
+        """
+        if self.has(model_name):
+            return self.path(model_name)
+
+        try:
+            from transformers import pipeline
+
+            os.makedirs(self.root, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=self.root, prefix=".export-")
+            try:
+                model = pipeline(task=task, model=model_name, device="cpu")
+                model.model.save_pretrained(tmp, safe_serialization=True)
+                model.tokenizer.save_pretrained(tmp)
+                # Publish atomically so concurrent workers never see half a model.
+                os.replace(tmp, self.path(model_name))
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+            logger.info(f"Stored model {model_name} in {self.path(model_name)}")
+            return self.path(model_name)
+        except Exception as e:
+            if self.has(model_name):
+                # Another worker stored it first.
+                return self.path(model_name)
+            logger.error(f"Failed to store model {model_name} locally, loading it from the hub: {e}")
+            return model_name
@@ -0,0 +1,135 @@
+import logging
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Where ONNX exports of models that are not in the artifact store are kept.
+ONNX_CACHE_DIR = os.path.join(tempfile.gettempdir(), "onnx-exports")
+
+
+class InferenceBackend(ABC):
+    """
+    Builds a ready-to-call pipeline for a model.
+
+    Every backend returns a ``transformers`` pipeline, so the label/score output
+    has the same shape whatever runtime executes the forward pass.
+    """
+
+    name: str
+
+    @abstractmethod
+    def load(self, task: str, model_name: str, device: str):
+        pass
+
+
+class TorchBackend(InferenceBackend):
+    """Plain PyTorch fp32 weights."""
+
+    name = "torch"
+
+    def load(self, task: str, model_name: str, device: str):
+        from transformers import pipeline
+
+        return pipeline(task=task, model=model_name, device=device)
+
+
+class QuantizedTorchBackend(InferenceBackend):
+    """PyTorch with linear layers dynamically quantized to int8 (CPU only)."""
+
+    name = "torch-int8"
+
+    def load(self, task: str, model_name: str, device: str):
+        import torch
+        from transformers import pipeline
+
+        model = pipeline(task=task, model=model_name, device="cpu")
+        model.model = torch.quantization.quantize_dynamic(
+            model.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        return model
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    The model exported to ONNX and executed by ONNX Runtime on CPU.
+
+    The export is done once and kept next to the model in the artifact store,
+    or under ``ONNX_CACHE_DIR`` for models loaded from the hub.
+    """
+
+    name = "onnx"
+
+    @staticmethod
+    def export_path(model_name: str) -> str:
+        if os.path.isdir(model_name):
+            return os.path.join(model_name, "onnx")
+        return os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"))
+
+    def _export(self, model_name: str):
+        """
+        Returns the exported model and the directory it was loaded from,
+        exporting it on first use.
+        """
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+
+        path = self.export_path(model_name)
+        if os.path.isfile(os.path.join(path, "model.onnx")):
+            return ORTModelForSequenceClassification.from_pretrained(path), path
+
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".export-")
+            try:
+                model.save_pretrained(tmp)
+                AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp)
+                # Publish atomically so concurrent loads never see half an export.
+                os.replace(tmp, path)
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+            logger.info(f"Stored the ONNX export of {model_name} in {path}")
+        except Exception as e:
+            if not os.path.isfile(os.path.join(path, "model.onnx")):
+                logger.error(f"Failed to store the ONNX export of {model_name}, it is exported again on the next load: {e}")
+                return model, model_name
+        return model, path
+
+    def load(self, task: str, model_name: str, device: str):
+        try:
+            import optimum.onnxruntime  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("The 'onnx' backend requires optimum[onnxruntime]") from e
+        from transformers import AutoTokenizer, pipeline
+
+        if task not in ("text-classification", "sentiment-analysis"):
+            raise ValueError(f"The 'onnx' backend does not support task '{task}'")
+
+        model, path = self._export(model_name)
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        return pipeline(task=task, model=model, tokenizer=tokenizer)
+
+
+BACKENDS: Dict[str, InferenceBackend] = {
+    backend.name: backend
+    for backend in (TorchBackend(), QuantizedTorchBackend(), OnnxBackend())
+}
+
+DEFAULT_BACKEND = TorchBackend.name
+
+
+def get_backend(name: str) -> InferenceBackend:
+    """
+    Returns the backend registered under ``name``.
+
+    Raises:
+        ValueError: If there is no such backend.
+    """
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown backend '{name}', expected one of {sorted(BACKENDS)}")
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import math
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Set, Tuple
+from model_manager.fair_queue import BULK, INTERACTIVE, PRIORITIES, FairQueue
+from model_manager.metrics import DROPPED_TEXTS, QUEUE_DEPTH
+from model_manager import tracing
+
+logger = logging.getLogger(__name__)
+
+# Weight of the latest batch in the moving average of a model's throughput.
+THROUGHPUT_SMOOTHING = 0.2
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a model's queue cannot take more texts.
+
+    ``retry_after`` estimates in seconds when the queue will have drained.
+    """
+
+    def __init__(self, model_id: int, retry_after: int):
+        super().__init__(f"The queue of model {model_id} is full, retry in {retry_after} s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request's deadline passes before its predictions are ready."""
+
+
+@dataclass
+class PendingRequest:
+    texts: List[str]
+    future: asyncio.Future
+    deadline: Optional[float] = None
+    priority: str = INTERACTIVE
+    trace: Optional[tracing.RequestTrace] = None
+    enqueued_at: float = 0.0
+
+
+class BatchScheduler:
+    """
+    Merges texts from concurrent prediction requests into shared forward passes.
+
+    Every model gets its own queue and a background loop that collects pending
+    requests until either ``max_batch_size`` texts are gathered or ``max_wait_ms``
+    has passed since the first request of the batch arrived. The merged batch is
+    passed to ``runner`` and every caller receives only its own slice of the results.
+
+    At most ``max_concurrency`` batches per model are in flight at once; while all
+    slots are busy new requests keep accumulating into the next batch.
+
+    Requests are either interactive or bulk: queued interactive texts always go
+    first, bulk ones use the remaining capacity. Within a class users share the
+    model fairly according to their weights (see ``FairQueue``), and requests
+    larger than a batch are cut into batch-sized slices, so a huge request of one
+    user is interleaved with everyone else's instead of holding the model.
+    Requests without an explicit class are interactive when they have at most
+    ``interactive_max_texts`` texts.
+
+    Every class of a model queues at most ``max_queue_texts`` texts (0 means no
+    limit); beyond that requests are rejected right away with an estimate of when
+    to retry, based on the model's recent throughput. Requests whose deadline has
+    passed or whose caller stopped waiting are dropped before they reach the model.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[int, List[str]], Awaitable[List[Any]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5,
+        max_concurrency: int = 1,
+        max_queue_texts: int = 0,
+        interactive_max_texts: int = 32,
+        user_weights: Optional[Mapping[str, float]] = None,
+    ):
+        self._runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max_concurrency
+        self.max_queue_texts = max_queue_texts
+        self.interactive_max_texts = interactive_max_texts
+        self.user_weights = dict(user_weights or {})
+        self._queues: Dict[int, FairQueue] = {}
+        self._depths: Dict[Tuple[int, str], int] = {}
+        self._throughputs: Dict[int, float] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._running: Set[asyncio.Task] = set()
+
+    def resolve_priority(self, texts: List[str], priority: Optional[str] = None) -> str:
+        """
+        Returns the priority class of a request, inferring it from its size if not given.
+
+        Raises:
+            ValueError: If ``priority`` is not a known class.
+        """
+        if priority is None:
+            return INTERACTIVE if len(texts) <= self.interactive_max_texts else BULK
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {', '.join(PRIORITIES)}")
+        return priority
+
+    async def submit(
+        self,
+        model_id: int,
+        texts: List[str],
+        deadline: Optional[float] = None,
+        user: Optional[str] = None,
+        priority: Optional[str] = None,
+    ) -> List[Any]:
+        """
+        Enqueues texts for the given model and waits for their predictions.
+
+        Args:
+            model_id (int): The ID of the model to use for prediction.
+            texts (List[str]): The input texts.
+            deadline (Optional[float]): Event loop time after which the caller no
+                longer needs the predictions.
+            user (Optional[str]): Who the request is made for, the unit of fair sharing.
+            priority (Optional[str]): ``"interactive"`` or ``"bulk"``, inferred
+                from the number of texts by default.
+
+        Returns:
+            List[Any]: Predictions for ``texts``, in the same order.
+
+        Raises:
+            QueueFullError: If the queue of the request's class is full.
+            DeadlineExceededError: If the deadline passes before the predictions are ready.
+        """
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        priority = self.resolve_priority(texts, priority)
+        self.check_capacity(model_id, len(texts), priority)
+
+        queue = self._get_queue(model_id)
+        trace = tracing.current_trace()
+        futures = []
+        for start in range(0, len(texts), self.max_batch_size):
+            item = PendingRequest(
+                texts[start:start + self.max_batch_size], loop.create_future(), deadline, priority,
+                trace, loop.time()
+            )
+            self._enqueued(model_id, priority, len(item.texts))
+            queue.put(item, user, priority, len(item.texts))
+            futures.append(item.future)
+
+        results = asyncio.gather(*futures)
+        try:
+            if deadline is None:
+                parts = await results
+            else:
+                parts = await asyncio.wait_for(results, max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError(f"Deadline exceeded while predicting with model {model_id}") from None
+        except BaseException:
+            # One slice failed: the others are not needed anymore.
+            for future in futures:
+                future.cancel()
+            raise
+        return [prediction for part in parts for prediction in part]
+
+    def check_capacity(self, model_id: int, count: int, priority: str):
+        """
+        Rejects ``count`` texts of the given class if the model's queue cannot take them.
+
+        Raises:
+            QueueFullError: If the queue of the class is full.
+        """
+        depth = self._depths.get((model_id, priority), 0)
+        # A request larger than the whole queue is still accepted when the queue is empty.
+        if self.max_queue_texts and depth and depth + count > self.max_queue_texts:
+            DROPPED_TEXTS.labels(str(model_id), "queue_full").inc(count)
+            raise QueueFullError(model_id, self.retry_after(model_id, priority))
+
+    def retry_after(self, model_id: int, priority: str = BULK) -> int:
+        """
+        Estimates in whole seconds how long the model needs to work off the texts
+        queued ahead of a new request of the given class.
+        """
+        throughput = self._throughputs.get(model_id)
+        if not throughput:
+            return 1
+        ahead = PRIORITIES[:PRIORITIES.index(priority) + 1]
+        depth = sum(self._depths.get((model_id, p), 0) for p in ahead)
+        return max(1, math.ceil(depth / (throughput * self.max_concurrency)))
+
+    def _enqueued(self, model_id: int, priority: str, count: int):
+        key = (model_id, priority)
+        self._depths[key] = self._depths.get(key, 0) + count
+        QUEUE_DEPTH.labels(str(model_id), priority).inc(count)
+
+    def _dequeued(self, model_id: int, priority: str, count: int):
+        self._depths[(model_id, priority)] -= count
+        QUEUE_DEPTH.labels(str(model_id), priority).dec(count)
+
+    def _get_queue(self, model_id: int) -> FairQueue:
+        queue = self._queues.get(model_id)
+        if queue is None:
+            queue = self._queues[model_id] = FairQueue(self.user_weights)
+            self._workers[model_id] = asyncio.create_task(self._batch_loop(model_id, queue))
+        return queue
+
+    def _is_live(self, model_id: int, item: PendingRequest, now: float) -> bool:
+        """
+        Tells whether anyone still waits for the item, failing it if its deadline passed.
+        """
+        if item.future.done():
+            DROPPED_TEXTS.labels(str(model_id), "cancelled").inc(len(item.texts))
+            return False
+        if item.deadline is not None and item.deadline <= now:
+            DROPPED_TEXTS.labels(str(model_id), "deadline").inc(len(item.texts))
+            item.future.set_exception(
+                DeadlineExceededError(f"Deadline exceeded while queued for model {model_id}")
+            )
+            return False
+        return True
+
+    async def _next_item(self, model_id: int, queue: FairQueue, timeout: Optional[float] = None):
+        """
+        Takes the next live item off the queue, or returns None on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        end = None if timeout is None else loop.time() + timeout
+        while True:
+            if queue.empty():
+                if end is None:
+                    item = await queue.get()
+                else:
+                    remaining = end - loop.time()
+                    if remaining <= 0:
+                        return None
+                    try:
+                        item = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        return None
+            else:
+                item = queue.get_nowait()
+            self._dequeued(model_id, item.priority, len(item.texts))
+            if self._is_live(model_id, item, loop.time()):
+                return item
+
+    async def _batch_loop(self, model_id: int, queue: FairQueue):
+        # The loop outlives the request that started it.
+        tracing.detach()
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.max_concurrency)
+        carry: Optional[PendingRequest] = None
+
+        while True:
+            await slots.acquire()
+            if carry is not None and not self._is_live(model_id, carry, loop.time()):
+                carry = None
+            first = carry or await self._next_item(model_id, queue)
+            carry = None
+            batch = [first]
+            size = len(first.texts)
+            deadline = loop.time() + self.max_wait
+
+            while size < self.max_batch_size:
+                item = await self._next_item(model_id, queue, deadline - loop.time())
+                if item is None:
+                    break
+                if size + len(item.texts) > self.max_batch_size:
+                    # Does not fit: it opens the next batch instead.
+                    carry = item
+                    break
+                batch.append(item)
+                size += len(item.texts)
+
+            task = asyncio.create_task(self._run_batch(model_id, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _run_batch(self, model_id: int, batch: List[PendingRequest]):
+        batch = [item for item in batch if not item.future.done()]
+        if not batch:
+            return
+
+        loop = asyncio.get_running_loop()
+        merged = [text for item in batch for text in item.texts]
+        start = loop.time()
+        traces = []
+        for item in batch:
+            if item.trace is not None:
+                item.trace.add("queue", start - item.enqueued_at, texts=len(item.texts), priority=item.priority)
+                traces.append(item.trace)
+        try:
+            with tracing.batch_traces(traces):
+                results = await self._runner(model_id, merged)
+        except asyncio.CancelledError:
+            for item in batch:
+                item.future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Batch inference failed for model {model_id}: {e}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        elapsed = loop.time() - start
+        if elapsed > 0:
+            rate = len(merged) / elapsed
+            previous = self._throughputs.get(model_id)
+            self._throughputs[model_id] = rate if previous is None else (
+                THROUGHPUT_SMOOTHING * rate + (1 - THROUGHPUT_SMOOTHING) * previous
+            )
+
+        offset = 0
+        for item in batch:
+            end = offset + len(item.texts)
+            if not item.future.done():
+                item.future.set_result(results[offset:end])
+            offset = end
+
+    async def close(self):
+        """Stops all batching loops and fails requests that are still queued."""
+        tasks = [*self._workers.values(), *self._running]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for model_id, queue in self._queues.items():
+            while not queue.empty():
+                item = queue.get_nowait()
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError("Model manager is shutting down"))
+            for priority in PRIORITIES:
+                QUEUE_DEPTH.labels(str(model_id), priority).set(0)
+
+        self._workers.clear()
+        self._queues.clear()
+        self._depths.clear()
@@ -0,0 +1,97 @@
+from typing import Any, Dict, List, Sequence
+from model_manager.metrics import timed_stage
+
+# Tasks whose pipelines can be fed pre-tokenized batches.
+ENCODED_INPUT_TASKS = ("text-classification", "sentiment-analysis")
+
+
+def accepts_encoded(model, task: str) -> bool:
+    """
+    Tells whether a pipeline of ``task`` can run texts tokenized beforehand.
+
+    Such pipelines expose ``forward`` and ``postprocess`` separately and their
+    tokenizer can pad a batch of encodings.
+    """
+    tokenizer = getattr(model, "tokenizer", None)
+    return (
+        task in ENCODED_INPUT_TASKS
+        and hasattr(model, "forward")
+        and hasattr(model, "postprocess")
+        and hasattr(tokenizer, "pad")
+    )
+
+
+def tokenize(tokenizer, texts: List[str], max_length: int) -> List[Dict[str, List[int]]]:
+    """
+    Tokenizes texts without padding them, one dict of features per text.
+    """
+    with timed_stage("tokenize"):
+        encoded = tokenizer(texts, truncation=True, max_length=max_length)
+    return [{name: values[i] for name, values in encoded.items()} for i in range(len(texts))]
+
+
+def length_order(lengths: Sequence[int]) -> List[int]:
+    """
+    Returns the indices of ``lengths`` sorted from the shortest to the longest item.
+
+    Feeding texts in this order lets the pipeline cut them into batches of similar
+    length, so short comments are not padded up to the longest one in the batch.
+    """
+    return sorted(range(len(lengths)), key=lengths.__getitem__)
+
+
+def restore_order(results: List[Any], order: List[int]) -> List[Any]:
+    """
+    Puts results computed in ``order`` back into the original input order.
+    """
+    restored = [None] * len(results)
+    for position, index in enumerate(order):
+        restored[index] = results[position]
+    return restored
+
+
+def forward_features(model, features: List[Dict[str, List[int]]], batch_size: int) -> List[dict]:
+    """
+    Runs a pipeline's model over tokenized texts, skipping its tokenization.
+
+    The features are padded into batches of similar length. ``Pipeline.forward``
+    takes care of device placement and inference mode, and the pipeline's own
+    ``postprocess`` turns every row of logits into a label and score, so results
+    match calling the pipeline on the texts.
+    """
+    order = length_order([len(row["input_ids"]) for row in features])
+    predictions = []
+    for start in range(0, len(order), batch_size):
+        batch = [features[i] for i in order[start:start + batch_size]]
+        with timed_stage("tokenize"):
+            inputs = model.tokenizer.pad(
+                {name: [row[name] for row in batch] for name in batch[0]}, return_tensors="pt"
+            )
+        logits = model.forward(inputs)["logits"]
+        predictions.extend(model.postprocess({"logits": logits[i:i + 1]}) for i in range(len(logits)))
+    return restore_order(predictions, order)
+
+
+def bucketed_inference(model, texts: List[str], batch_size: int, max_length: int) -> List[Any]:
+    """
+    Runs ``model`` over texts grouped by token length and truncated to ``max_length``.
+
+    Every text is tokenized once. Pipelines that accept encoded input get the
+    features directly; other pipelines get the texts sorted by token length and
+    tokenize them again, since they cut their input into consecutive batches of
+    ``batch_size``. Both passes are timed as the ``tokenize`` stage. The results
+    are returned in the original order.
+    """
+    if not texts:
+        return []
+    features = tokenize(model.tokenizer, texts, max_length)
+    if accepts_encoded(model, getattr(model, "task", None)):
+        return forward_features(model, features, batch_size)
+    order = length_order([len(row["input_ids"]) for row in features])
+    results = model(
+        [texts[i] for i in order],
+        batch_size=batch_size,
+        truncation=True,
+        max_length=max_length,
+    )
+    return restore_order(results, order)
@@ -0,0 +1,107 @@
+import hashlib
+import re
+import sys
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Rough per-entry bookkeeping cost: the key tuple, the digest, the OrderedDict
+# node and the entry tuple itself.
+_ENTRY_OVERHEAD = 256
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a text before hashing so trivially different copies share an entry.
+
+    Only changes that do not affect tokenization are applied: unicode NFC form,
+    collapsed whitespace and stripped ends.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class PredictionCache:
+    """
+    Memory-budgeted LRU cache of predictions with a time-to-live.
+
+    Keys are ``(model_id, revision, sha256(normalized text))``, so a reloaded model
+    with a new revision never sees predictions made by the previous one.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl > 0
+
+    @staticmethod
+    def make_key(model_id: int, revision: str, text: str) -> Tuple[int, str, bytes]:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+        return model_id, revision, digest
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Tells whether a live entry exists, without counting a lookup."""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def put(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        size = _ENTRY_OVERHEAD + sys.getsizeof(value)
+        if isinstance(value, dict):
+            size += sum(sys.getsizeof(v) for v in value.values())
+        if size > self.max_bytes:
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self._size += size
+        while self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,108 @@
+import os
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class CascadeClassifier:
+    """
+    A cheap linear pre-classifier that answers the obvious texts of a model.
+
+    The bundle is produced offline by ``train_cascade.py``: a scikit-learn
+    pipeline of hashed word and character n-grams with a logistic regression,
+    fitted on the labels the transformer itself assigns. A text whose probability
+    of ``positive_label`` is at most ``low`` or at least ``high`` is answered by
+    the pre-classifier; everything in between goes to the transformer.
+    """
+
+    def __init__(self, bundle: Dict[str, Any], low: float, high: float):
+        self.model = bundle["model"]
+        self.positive_label = bundle["positive_label"]
+        classes = [str(label) for label in self.model.classes_]
+        if len(classes) != 2 or self.positive_label not in classes:
+            raise ValueError(f"A cascade needs a binary classifier with label '{self.positive_label}', got {classes}")
+        self.negative_label = classes[1 - classes.index(self.positive_label)]
+        self._positive_index = classes.index(self.positive_label)
+        self.low = low
+        self.high = high
+
+    @staticmethod
+    def bundle_path(path: str, root: Optional[str]) -> str:
+        """
+        Resolves the path of a bundle, which must lie inside the artifact directory.
+
+        Bundles are unpickled on load, which runs arbitrary code, so only files
+        the operator placed under ``root`` are accepted. Relative paths are
+        taken relative to ``root``.
+
+        Raises:
+            ValueError: If ``root`` is not set or the path leads outside of it.
+        """
+        if not root:
+            raise ValueError("Cascades can only be loaded from the artifact directory, which is not configured")
+        root = os.path.realpath(root)
+        resolved = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, resolved]) != root:
+            raise ValueError(f"Cascade bundles must be inside {root}")
+        return resolved
+
+    @classmethod
+    def load(cls, path: str, low: float, high: float, root: Optional[str]) -> "CascadeClassifier":
+        import joblib
+
+        return cls(joblib.load(cls.bundle_path(path, root)), low, high)
+
+    def predict(self, texts: List[str]) -> List[Optional[dict]]:
+        """
+        Returns a prediction for every confident text and None for the uncertain ones.
+        """
+        probabilities = self.model.predict_proba(texts)[:, self._positive_index]
+        results = []
+        for probability in probabilities:
+            if probability >= self.high:
+                results.append({"label": self.positive_label, "score": float(probability)})
+            elif probability <= self.low:
+                results.append({"label": self.negative_label, "score": float(1 - probability)})
+            else:
+                results.append(None)
+        return results
+
+
+class CascadeStats:
+    """
+    Counters of a model's cascade.
+
+    A ``shadow_rate`` fraction of the texts answered by the pre-classifier is
+    also sent to the transformer in the background; the share of those where
+    both agree on the label estimates the accuracy given up for the saved CPU.
+    """
+
+    def __init__(self, shadow_rate: float):
+        self.shadow_rate = shadow_rate
+        self.confident = 0
+        self.deferred = 0
+        self.shadow_checked = 0
+        self.shadow_agreed = 0
+
+    def record(self, confident: int, deferred: int):
+        self.confident += confident
+        self.deferred += deferred
+
+    def sample(self, predictions: List[Tuple[str, dict]]) -> List[Tuple[str, dict]]:
+        """
+        Picks the confident predictions to double-check with the transformer.
+        """
+        return [item for item in predictions if random.random() < self.shadow_rate]
+
+    def record_shadow(self, agreed: int, checked: int):
+        self.shadow_agreed += agreed
+        self.shadow_checked += checked
+
+    def snapshot(self) -> dict:
+        total = self.confident + self.deferred
+        return {
+            "confident": self.confident,
+            "deferred": self.deferred,
+            "confident_rate": self.confident / total if total else 0.0,
+            "shadow_checked": self.shadow_checked,
+            "shadow_agreement": self.shadow_agreed / self.shadow_checked if self.shadow_checked else None,
+        }
@@ -0,0 +1,54 @@
+import hashlib
+from typing import Dict, List, NamedTuple, Optional
+from model_manager.bucketing import accepts_encoded, forward_features, tokenize
+
+
+def tokenizer_key(model, task: str) -> Optional[str]:
+    """
+    Identifies the tokenizer of a pipeline, so models sharing one are grouped.
+
+    Fast tokenizers are identified by their full serialized definition, which
+    also matches copies of the same tokenizer stored under different names.
+    Returns None for pipelines that cannot take pre-tokenized input.
+    """
+    if not accepts_encoded(model, task):
+        return None
+    tokenizer = model.tokenizer
+
+    key = getattr(model, "_tokenizer_key", None)
+    if key is None:
+        backend = getattr(tokenizer, "backend_tokenizer", None)
+        if backend is not None:
+            definition = backend.to_str()
+        else:
+            definition = f"{type(tokenizer).__name__}:{tokenizer.name_or_path}:{len(tokenizer)}"
+        key = hashlib.sha256(definition.encode()).hexdigest()
+        model._tokenizer_key = key
+    return key
+
+
+class EncodedText(NamedTuple):
+    """
+    A text tokenized once for all models sharing its tokenizer.
+
+    Encoded texts are queued like plain ones; the batch runner pads them
+    together with the texts of the batch they end up in.
+    """
+
+    text: str
+    features: Dict[str, List[int]]
+    # tokenizer_key() of the tokenizer that produced ``features``.
+    tokenizer: str
+
+
+def encode(tokenizer, key: str, texts: List[str], max_length: int) -> List[EncodedText]:
+    """Tokenizes texts without padding them."""
+    return [
+        EncodedText(text, features, key)
+        for text, features in zip(texts, tokenize(tokenizer, texts, max_length))
+    ]
+
+
+def forward_encoded(model, rows: List[EncodedText], batch_size: int) -> List[dict]:
+    """Runs a pipeline's model over encoded texts, see ``forward_features``."""
+    return forward_features(model, [row.features for row in rows], batch_size)
@@ -0,0 +1,94 @@
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+from model_manager.backends import get_backend
+from model_manager.bucketing import bucketed_inference
+from model_manager.ensemble import EncodedText, forward_encoded
+from model_manager.metrics import instrument_pipeline, record_stages
+from model_manager.pool import WorkerModelPool
+from model_manager.profiling import torch_profiled
+
+# Pipelines owned by the current worker process (only used by the process pool).
+_worker_pipelines: Optional[WorkerModelPool] = None
+
+
+def init_worker(memory_budget_bytes: int):
+    """Sets up the pipeline pool of a new process pool worker."""
+    global _worker_pipelines
+    _worker_pipelines = WorkerModelPool(memory_budget_bytes)
+
+
+def run_batch(
+    model, texts: List[Union[str, EncodedText]], batch_size: int, max_length: int
+) -> Tuple[List[dict], Dict[str, float]]:
+    """
+    Runs a merged batch through an instrumented pipeline.
+
+    Texts already encoded for an ensemble skip tokenization; plain texts go
+    through the pipeline as usual. Returns the predictions together with the
+    time spent in every pipeline stage, so the caller can record them wherever
+    the executor runs the batch. While a profile with torch operators is running
+    the batch is also profiled with ``torch.profiler``.
+    """
+    encoded = [i for i, text in enumerate(texts) if isinstance(text, EncodedText)]
+    with record_stages() as timings, torch_profiled():
+        if not encoded:
+            results = bucketed_inference(model, texts, batch_size, max_length)
+        else:
+            plain = [i for i, text in enumerate(texts) if not isinstance(text, EncodedText)]
+            results = [None] * len(texts)
+            parts = (
+                (encoded, forward_encoded(model, [texts[i] for i in encoded], batch_size)),
+                (plain, bucketed_inference(model, [texts[i] for i in plain], batch_size, max_length) if plain else []),
+            )
+            for indices, predictions in parts:
+                for i, prediction in zip(indices, predictions):
+                    results[i] = prediction
+    return results, timings
+
+
+def run_in_worker(
+    model_id: int, backend: str, task: str, name: str, device: str, pinned: bool,
+    texts: List[str], batch_size: int, max_length: int
+) -> Tuple[List[dict], Dict[str, float]]:
+    """
+    Runs a pipeline inside a process pool worker, loading it on first use.
+
+    Pipelines cannot be pickled, so every worker process builds its own copy
+    from the backend, model task and name and keeps it in a ``WorkerModelPool``
+    under the same memory budget as the parent's pool.
+    """
+    global _worker_pipelines
+    if _worker_pipelines is None:
+        _worker_pipelines = WorkerModelPool()
+    model = _worker_pipelines.get(
+        model_id, (backend, task, name, device),
+        lambda: instrument_pipeline(get_backend(backend).load(task, name, device)),
+        pinned,
+    )
+    return run_batch(model, texts, batch_size, max_length)
+
+
+def create_executor(kind: str, max_workers: int, memory_budget_bytes: int = 0) -> Executor:
+    """
+    Creates the executor that runs blocking inference off the event loop.
+
+    Args:
+        kind (str): ``"thread"`` or ``"process"``.
+        max_workers (int): The number of worker threads or processes.
+        memory_budget_bytes (int): The model memory budget of every worker process,
+            0 means no limit. Threads share the caller's pool instead.
+
+    Raises:
+        ValueError: If ``kind`` is not supported.
+    """
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+    if kind == "process":
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(memory_budget_bytes,),
+        )
+    raise ValueError(f"Unknown inference executor '{kind}', expected 'thread' or 'process'")
@@ -0,0 +1,78 @@
+import asyncio
+import heapq
+import itertools
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# Served in this order: a bulk item only runs when no interactive item is waiting.
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+class FairQueue:
+    """
+    A queue with strict priority between classes and weighted fair sharing
+    between users within a class.
+
+    Within a class items are ordered by their virtual finish time, as in weighted
+    fair queueing: an item of ``cost`` texts queued by a user with weight ``w``
+    finishes ``cost / w`` after the later of the class's virtual clock and the
+    user's previous item. A user with many queued items therefore gets their
+    turn after every other waiting user, in proportion to the weights, while a
+    user who has been idle starts right at the current clock.
+    """
+
+    def __init__(self, weights: Optional[Mapping[str, float]] = None):
+        self._weights = dict(weights or {})
+        self._heaps: Dict[str, List[Tuple[float, int, Any]]] = {priority: [] for priority in PRIORITIES}
+        self._clocks: Dict[str, float] = dict.fromkeys(PRIORITIES, 0.0)
+        self._finish_tags: Dict[str, Dict[Optional[str], float]] = {priority: {} for priority in PRIORITIES}
+        self._order = itertools.count()
+        self._not_empty = asyncio.Event()
+
+    def weight(self, user: Optional[str]) -> float:
+        return self._weights.get(user, 1.0)
+
+    def put(self, item: Any, user: Optional[str], priority: str, cost: int):
+        """
+        Adds an item queued by ``user`` in the given priority class.
+        """
+        tags = self._finish_tags[priority]
+        start = max(self._clocks[priority], tags.get(user, 0.0))
+        finish = tags[user] = start + cost / self.weight(user)
+        heapq.heappush(self._heaps[priority], (finish, next(self._order), item))
+        self._not_empty.set()
+
+    def empty(self) -> bool:
+        return not any(self._heaps.values())
+
+    def __len__(self) -> int:
+        return sum(len(heap) for heap in self._heaps.values())
+
+    def get_nowait(self) -> Any:
+        """
+        Removes and returns the next item.
+
+        Raises:
+            asyncio.QueueEmpty: If no item is queued.
+        """
+        for priority in PRIORITIES:
+            heap = self._heaps[priority]
+            if heap:
+                finish, _, item = heapq.heappop(heap)
+                self._clocks[priority] = finish
+                if not heap:
+                    # Every user of the class is idle, their history no longer matters.
+                    self._finish_tags[priority].clear()
+                if self.empty():
+                    self._not_empty.clear()
+                return item
+        raise asyncio.QueueEmpty()
+
+    async def get(self) -> Any:
+        """
+        Removes and returns the next item, waiting until one is queued.
+        """
+        while self.empty():
+            await self._not_empty.wait()
+        return self.get_nowait()
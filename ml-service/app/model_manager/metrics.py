@@ -0,0 +1,173 @@
+"""
+Prometheus metrics of the inference hot path.
+
+When ``PROMETHEUS_MULTIPROC_DIR`` is set (serve.py does this for its forked
+workers) every process writes its values to that directory and ``/metrics``
+aggregates them, so a scrape of any worker covers the whole server.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+from prometheus_client import multiprocess
+
+# Pipeline methods timed as separate stages of a forward pass.
+STAGES = {"tokenize": "preprocess", "forward": "_forward", "postprocess": "postprocess"}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PREDICT_REQUESTS = Counter(
+    "ml_predict_requests", "Prediction calls per model and outcome", ["model_id", "outcome"]
+)
+PREDICTED_TEXTS = Counter(
+    "ml_predicted_texts", "Texts predicted per model, answered from the cache or by the model",
+    ["model_id", "source"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "ml_requests_in_flight", "Prediction calls being served", ["model_id"], multiprocess_mode="livesum"
+)
+QUEUE_DEPTH = Gauge(
+    "ml_queue_depth", "Texts waiting for a batch slot", ["model_id", "priority"], multiprocess_mode="livesum"
+)
+DROPPED_TEXTS = Counter(
+    "ml_dropped_texts", "Texts rejected by a full queue or dropped after their caller gave up",
+    ["model_id", "reason"]
+)
+CASCADE_TEXTS = Counter(
+    "ml_cascade_texts", "Texts answered by the cascade pre-classifier or deferred to the model",
+    ["model_id", "outcome"]
+)
+CASCADE_SHADOW_CHECKS = Counter(
+    "ml_cascade_shadow_checks", "Sampled cascade answers checked against the model", ["model_id", "result"]
+)
+NEAR_DUPLICATE_TEXTS = Counter(
+    "ml_near_duplicate_texts", "Cache misses that reused the prediction of a near duplicate or were computed",
+    ["model_id", "outcome"]
+)
+NEAR_DUPLICATE_CHECKS = Counter(
+    "ml_near_duplicate_checks", "Sampled near-duplicate reuses checked against the model", ["model_id", "result"]
+)
+NEAR_DUPLICATE_ENTRIES = Gauge(
+    "ml_near_duplicate_entries", "Texts in the near-duplicate index", ["model_id"],
+    multiprocess_mode="livesum"
+)
+BATCH_SIZE = Histogram(
+    "ml_batch_size", "Texts per merged forward pass", ["model_id"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+BATCH_SECONDS = Histogram(
+    "ml_batch_seconds", "Wall time of a merged batch, including the wait for an executor worker",
+    ["model_id"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "ml_inference_stage_seconds", "Time a batch spent in every pipeline stage",
+    ["model_id", "stage"], buckets=LATENCY_BUCKETS
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "ml_model_load_seconds", "Time to build a model pipeline", ["model_id", "backend", "outcome"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+# Workers share the weights loaded before fork, so the largest value is reported rather than the sum.
+MODEL_MEMORY_BYTES = Gauge(
+    "ml_model_memory_bytes", "Estimated weight size of a loaded model", ["model_id"],
+    multiprocess_mode="livemax"
+)
+POOL_MEMORY_BYTES = Gauge(
+    "ml_model_pool_memory_bytes", "Estimated weight size of all loaded models", multiprocess_mode="livemax"
+)
+POOL_MEMORY_BUDGET_BYTES = Gauge(
+    "ml_model_pool_memory_budget_bytes", "Memory budget of the model pool, 0 means no limit",
+    multiprocess_mode="livemax"
+)
+
+_stage_timings = threading.local()
+
+
+def instrument_pipeline(model):
+    """
+    Wraps the stage methods of a pipeline so their time is recorded per batch.
+
+    Objects without the methods (e.g. test stubs) are left untouched; wrapping
+    the same pipeline twice is a no-op.
+    """
+    for stage, attr in STAGES.items():
+        method = getattr(model, attr, None)
+        if method is None or getattr(method, "_timed_stage", None):
+            continue
+        setattr(model, attr, _timed(stage, method))
+    return model
+
+
+def _timed(stage: str, method):
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        timings = getattr(_stage_timings, "current", None)
+        if timings is None:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings[stage] += time.perf_counter() - start
+
+    wrapper._timed_stage = stage
+    return wrapper
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """
+    Adds the time spent in the block to ``stage`` of the batch being recorded.
+
+    Used for stage work done outside the pipeline methods, such as tokenizing
+    texts before they are handed to the model. Outside ``record_stages`` the
+    block runs untimed.
+    """
+    timings = getattr(_stage_timings, "current", None)
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] += time.perf_counter() - start
+
+
+@contextmanager
+def record_stages():
+    """
+    Collects the stage timings of instrumented pipelines called in this thread.
+
+    Pipelines call ``preprocess`` and ``postprocess`` once per text and
+    ``_forward`` once per internal batch; the yielded dict holds the totals.
+    """
+    timings = dict.fromkeys(STAGES, 0.0)
+    _stage_timings.current = timings
+    try:
+        yield timings
+    finally:
+        _stage_timings.current = None
+
+
+def observe_stages(model_id: int, timings: Dict[str, float]):
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.labels(str(model_id), stage).observe(seconds)
+
+
+def render() -> Tuple[bytes, str]:
+    """
+    Returns the current metrics in the Prometheus text format and its content type.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
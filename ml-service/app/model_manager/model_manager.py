@@ -1,9 +1,23 @@
-from model_manager.models import ModelManagerABC
+from model_manager.models import ModelManagerABC, ModelSpec
+from model_manager.batching import BatchScheduler, DeadlineExceededError, QueueFullError
+from model_manager.executor import create_executor, run_batch, run_in_worker
+from model_manager.bucketing import bucketed_inference
+from model_manager.cache import PredictionCache
+from model_manager.backends import BACKENDS, DEFAULT_BACKEND, get_backend
+from model_manager.pool import ModelPool
+from model_manager.artifacts import ArtifactStore
+from model_manager.cascade import CascadeClassifier, CascadeStats
+from model_manager.near_duplicates import DEFAULT_MAX_CHANGED_SHINGLES, NearDuplicateIndex, fingerprint
+from model_manager.ensemble import EncodedText, encode, tokenizer_key
+from model_manager.fair_queue import BULK
+from model_manager import metrics, tracing
 from db.models import MLModel
-from typing import List
+from typing import Callable, Dict, List, Optional
 from sqlalchemy import select
-from transformers import pipeline
 from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import random
+import time
 import torch
 import logging
 
@@ -11,12 +25,72 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ModelManager(ModelManagerABC):
-    def __init__(self, device="cpu"):
-        self._model_pool = {}
+    def __init__(
+        self,
+        device="cpu",
+        max_batch_size=32,
+        max_wait_ms=5,
+        executor="thread",
+        max_workers=4,
+        max_concurrency_per_model=1,
+        max_queue_texts=0,
+        interactive_max_texts=32,
+        user_weights=None,
+        default_max_length=512,
+        cascade_low=0.05,
+        cascade_high=0.95,
+        cascade_shadow_rate=0.01,
+        near_duplicate_max_entries=0,
+        near_duplicate_max_changed_shingles=DEFAULT_MAX_CHANGED_SHINGLES,
+        near_duplicate_shadow_rate=0.01,
+        cache_max_bytes=64 * 1024 * 1024,
+        cache_ttl_seconds=3600,
+        memory_budget_bytes=0,
+        pinned_models=(),
+        artifact_dir=None,
+    ):
+        self._model_pool = ModelPool(self._load_model, memory_budget_bytes, pinned_models)
+        self._artifacts = ArtifactStore(artifact_dir) if artifact_dir else None
+        self._model_specs = {}
+        self.catalog_loaded = False
+        self._model_revisions = {}
+        self._reloads = {}
+        self._cascades = {}
+        self._shadow_checks = set()
+        self._near_duplicates = {}
+        # Warm-up outcome of catalog models in process mode: None once a worker
+        # built the model, the error message if it failed.
+        self._worker_loads = {}
+        self._comparison_lock = asyncio.Lock()
+        self._cache = PredictionCache(cache_max_bytes, cache_ttl_seconds)
         self.device = device
         if device == "auto":
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        
+        self.max_batch_size = max_batch_size
+        self.default_max_length = default_max_length
+        self.cascade_low = cascade_low
+        self.cascade_high = cascade_high
+        self.cascade_shadow_rate = cascade_shadow_rate
+        self.near_duplicate_max_entries = near_duplicate_max_entries
+        self.near_duplicate_max_changed_shingles = near_duplicate_max_changed_shingles
+        self.near_duplicate_shadow_rate = near_duplicate_shadow_rate
+        self.executor_kind = executor
+        self.max_workers = max_workers
+        self.max_wait_ms = max_wait_ms
+        self.max_concurrency_per_model = max_concurrency_per_model
+        self.max_queue_texts = max_queue_texts
+        self.interactive_max_texts = interactive_max_texts
+        self.user_weights = user_weights or {}
+        self._create_runtime()
+
+    def _create_runtime(self):
+        self._executor = create_executor(self.executor_kind, self.max_workers, self._model_pool.memory_budget)
+        self._scheduler = BatchScheduler(
+            self._run_inference, self.max_batch_size, self.max_wait_ms,
+            self.max_concurrency_per_model, self.max_queue_texts,
+            self.interactive_max_texts, self.user_weights
+        )
+
     async def get_available_models(self, db) -> List[MLModel]:
         """
         Retrieves a list of available machine learning models from the database.
@@ -41,52 +115,796 @@ class ModelManager(ModelManagerABC):
 
     async def download_models(self, db: AsyncSession):
         """
-        Downloads and loads all available models from the database into memory.
+        Refreshes the catalog of available models from the database.
+
+        The refresh is incremental: new models are only added to the catalog and
+        loaded lazily on their first request, removed ones are unloaded, and loaded
+        models whose row changed are rebuilt in the background. Traffic keeps using
+        the old instance until the new one is warm and atomically swapped in.
+        Pinned models are loaded right away so they are resident before traffic arrives.
 
         Args:
             db (AsyncSession): The asynchronous database session.
 
         Raises:
-            Exception: If there is an error while fetching models from the database or loading models into memory.
+            Exception: If there is an error while fetching models from the database.
         """
         try:
-            stmt = select(MLModel.id, MLModel.name, MLModel.type)
+            stmt = select(
+                MLModel.id, MLModel.name, MLModel.type, MLModel.max_length, MLModel.backend,
+                MLModel.cascade_path, MLModel.cascade_low, MLModel.cascade_high
+            )
             result = await db.execute(stmt)
             rows = result.all() 
-
-            for row in rows:
-                model_id, model_name, model_type = row
-                try:
-                    logger.info(f"Loading model {model_name} (ID: {model_id}) for task '{model_type}' on device '{self.device}'")
-                    self._model_pool[model_id] = pipeline(
-                        task=model_type,
-                        model=model_name,
-                        device=self.device
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to load model {model_name}: {e}")
         except Exception as e:
             logger.error(f"Database error while downloading models: {e}")
             raise
 
-    async def predict(self, model_id: int, data: List[str]):
+        specs = {
+            model_id: ModelSpec(
+                type=model_type,
+                name=model_name,
+                max_length=max_length or self.default_max_length,
+                backend=backend or DEFAULT_BACKEND,
+                cascade_path=cascade_path,
+                cascade_low=self.cascade_low if cascade_low is None else cascade_low,
+                cascade_high=self.cascade_high if cascade_high is None else cascade_high,
+            )
+            for model_id, model_name, model_type, max_length, backend, cascade_path, cascade_low, cascade_high in rows
+        }
+
+        for model_id in self._model_specs.keys() - specs.keys():
+            logger.info(f"Model {model_id} was removed from the catalog")
+            del self._model_specs[model_id]
+            self._model_revisions.pop(model_id, None)
+            self._cascades.pop(model_id, None)
+            self._near_duplicates.pop(model_id, None)
+            self._worker_loads.pop(model_id, None)
+            reload = self._reloads.pop(model_id, None)
+            if reload is not None:
+                # Otherwise the rebuilt model would be put back into the pool.
+                reload[1].cancel()
+            self._model_pool.evict(model_id)
+
+        for model_id, spec in specs.items():
+            # Compare against the spec being loaded in the background, if any.
+            target, _ = self._reloads.get(model_id, (self._model_specs.get(model_id), None))
+            if target == spec:
+                continue
+            if model_id in self._model_pool and target.same_pipeline(spec) and model_id not in self._reloads:
+                # Only the cascade changed, the loaded pipeline stays.
+                self._model_specs[model_id] = spec
+                self._set_revision(model_id, spec, self._model_pool.peek(model_id))
+            elif model_id in self._model_pool:
+                self._start_reload(model_id, spec)
+            else:
+                self._model_specs[model_id] = spec
+                self._model_revisions.pop(model_id, None)
+                self._worker_loads.pop(model_id, None)
+
+        self.catalog_loaded = True
+        pinned = self._model_pool.pinned & self._model_specs.keys()
+        if self.executor_kind == "process":
+            pinned -= {model_id for model_id, error in self._worker_loads.items() if error is None}
+        if pinned:
+            await self.preload(list(pinned))
+
+    async def _build_model(self, model_id: int, spec: ModelSpec):
+        """
+        Builds the pipeline of a catalog model with the given backend settings.
+        """
+        logger.info(f"Loading model {spec.name} (ID: {model_id}) for task '{spec.type}' with backend '{spec.backend}' on device '{self.device}'")
+        start = time.perf_counter()
+        try:
+            # Building a pipeline blocks for seconds, keep it off the event loop.
+            source = spec.name
+            if self._artifacts is not None:
+                source = await asyncio.to_thread(self._artifacts.resolve, spec.type, spec.name)
+            model = await asyncio.to_thread(
+                get_backend(spec.backend).load, spec.type, source, self.device
+            )
+        except Exception as e:
+            metrics.MODEL_LOAD_SECONDS.labels(str(model_id), spec.backend, "error").observe(time.perf_counter() - start)
+            logger.error(f"Failed to load model {spec.name}: {e}")
+            raise
+        metrics.MODEL_LOAD_SECONDS.labels(str(model_id), spec.backend, "success").observe(time.perf_counter() - start)
+        return metrics.instrument_pipeline(model)
+
+    def _set_revision(self, model_id: int, spec: ModelSpec, model=None):
+        # Without a loaded model the revision falls back to the model name.
+        # Other backends or truncation limits score differently, so they get their own cache entries.
+        config = getattr(getattr(model, "model", None), "config", None)
+        commit = getattr(config, "_commit_hash", None) or spec.name
+        revision = f"{commit}:{spec.backend}:{spec.max_length}"
+        if spec.cascade_path:
+            # Cached answers may come from the pre-classifier.
+            revision += f":{spec.cascade_path}:{spec.cascade_low}:{spec.cascade_high}"
+        self._model_revisions[model_id] = revision
+
+    async def _ensure_revision(self, model_id: int):
+        """
+        Makes sure the cache revision of a catalog model is known.
+
+        With thread inference the revision comes from the loaded pipeline, so the
+        model is loaded here. Worker processes load their own copies, so the
+        parent derives the revision from the catalog instead of building a
+        pipeline it would never run.
+        """
+        if model_id in self._model_revisions:
+            return
+        if self.executor_kind == "process":
+            self._set_revision(model_id, self._model_specs[model_id])
+            return
+        with tracing.span("load"):
+            await self._model_pool.get(model_id)
+
+    async def _load_model(self, model_id: int):
+        """
+        Loads a catalog model on its first request.
+        """
+        spec = self._model_specs[model_id]
+        model = await self._build_model(model_id, spec)
+        self._set_revision(model_id, spec, model)
+        return model
+
+    def _start_reload(self, model_id: int, spec: ModelSpec):
+        previous = self._reloads.get(model_id)
+        if previous is not None:
+            previous[1].cancel()
+        self._reloads[model_id] = (spec, asyncio.create_task(self._reload_model(model_id, spec)))
+
+    async def _reload_model(self, model_id: int, spec: ModelSpec):
+        """
+        Builds and warms up a new instance of a loaded model, then swaps it in.
+        """
+        try:
+            model = await self._build_model(model_id, spec)
+            await asyncio.to_thread(
+                bucketed_inference, model, ["warm-up"], 1, spec.max_length
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Reload of model {model_id} failed, keeping the previous instance: {e}")
+            return
+        finally:
+            if self._reloads.get(model_id, (None, None))[1] is asyncio.current_task():
+                del self._reloads[model_id]
+
+        if not self.has_model(model_id):
+            return
+        self._model_specs[model_id] = spec
+        self._set_revision(model_id, spec, model)
+        self._model_pool.put(model_id, model)
+        logger.info(f"Model {model_id} reloaded and swapped in")
+
+    async def preload(self, model_ids: Optional[List[int]] = None) -> List[int]:
+        """
+        Loads catalog models right away instead of on their first request.
+
+        The models are loaded in parallel. With process inference the parent
+        never runs a model, so instead of building it here a warm-up batch has
+        a worker process build its copy; other workers still build theirs on
+        first use.
+
+        Args:
+            model_ids (Optional[List[int]]): The models to load, the whole catalog by default.
+
+        Returns:
+            List[int]: The IDs of the models that were loaded successfully.
+        """
+        model_ids = model_ids or list(self._model_specs)
+        load = self._load_in_worker if self.executor_kind == "process" else self._model_pool.get
+        results = await asyncio.gather(
+            *(load(model_id) for model_id in model_ids),
+            return_exceptions=True
+        )
+        loaded = []
+        for model_id, result in zip(model_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to preload model {model_id}: {result}")
+            else:
+                loaded.append(model_id)
+        return loaded
+
+    async def _load_in_worker(self, model_id: int):
+        spec = self._model_specs[model_id]
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, run_in_worker, *self._worker_args(model_id, spec), ["warm-up"], 1, spec.max_length
+            )
+        except Exception as e:
+            self._worker_loads[model_id] = str(e)
+            raise
+        self._worker_loads[model_id] = None
+        self._set_revision(model_id, spec)
+
+    def _worker_args(self, model_id: int, spec: ModelSpec) -> tuple:
+        # Identifies the pipeline a process pool worker builds for the model.
+        return (
+            model_id, spec.backend, spec.type, self._source(spec), self.device,
+            model_id in self._model_pool.pinned
+        )
+
+    def _source(self, spec: ModelSpec) -> str:
+        # Workers of the process pool load from the artifact store when the model is there.
+        return self._artifacts.source(spec.name) if self._artifacts is not None else spec.name
+
+    def model_states(self) -> dict:
+        """
+        Returns the load state of every catalog model and whether the service is ready.
+
+        The service is ready once the catalog is loaded and all pinned models are
+        resident; other models are loaded on their first request.
+        """
+        models = {
+            model_id: {
+                "name": spec.name,
+                "state": self._model_state(model_id),
+                "pinned": model_id in self._model_pool.pinned,
+                "error": self._model_error(model_id),
+            }
+            for model_id, spec in self._model_specs.items()
+        }
+        ready = self.catalog_loaded and all(
+            model["state"] == "ready" for model in models.values() if model["pinned"]
+        )
+        return {"ready": ready, "models": models}
+
+    def _model_state(self, model_id: int) -> str:
+        if self.executor_kind != "process":
+            return self._model_pool.state(model_id)
+        if model_id not in self._worker_loads:
+            return "not_loaded"
+        return "failed" if self._worker_loads[model_id] is not None else "ready"
+
+    def _model_error(self, model_id: int) -> Optional[str]:
+        if self.executor_kind != "process":
+            return self._model_pool.error(model_id)
+        return self._worker_loads.get(model_id)
+
+    def share_memory(self):
+        """
+        Moves the weights of all loaded PyTorch models into shared memory.
+
+        Called in the serving parent before forking workers, so every worker
+        reads the same physical pages instead of copying them on write.
+        """
+        for model_id in self._model_pool.keys():
+            module = getattr(self._model_pool.peek(model_id), "model", None)
+            if hasattr(module, "share_memory"):
+                module.share_memory()
+
+    def reset_after_fork(self):
+        """
+        Recreates the inference executor and batch scheduler in a forked worker.
+
+        Threads and event loop objects of the parent do not survive ``fork``;
+        the loaded models and the catalog are inherited as they are.
+        """
+        self._create_runtime()
+        self._reloads = {}
+
+    def register_model(self, model_id: int, spec: ModelSpec, model=None):
+        """
+        Adds a model to the catalog without going through the database.
+
+        Used by benchmarks and offline tools. When ``model`` is given it is served
+        as is instead of being built from ``spec``.
+        """
+        spec = spec._replace(
+            cascade_low=self.cascade_low if spec.cascade_low is None else spec.cascade_low,
+            cascade_high=self.cascade_high if spec.cascade_high is None else spec.cascade_high,
+        )
+        self._model_specs[model_id] = spec
+        self._model_revisions.pop(model_id, None)
+        if model is not None:
+            self._set_revision(model_id, spec, model)
+            self._model_pool.put(model_id, metrics.instrument_pipeline(model))
+
+    def has_model(self, model_id: int) -> bool:
+        """
+        Tells whether the model is in the catalog, whether or not it is loaded yet.
+        """
+        return model_id in self._model_specs
+
+    def loaded_model_ids(self) -> List[int]:
+        return self._model_pool.keys()
+
+    async def predict(
+        self,
+        model_id: int,
+        data: List[str],
+        timeout: Optional[float] = None,
+        user: Optional[str] = None,
+        priority: Optional[str] = None,
+        encoded: Optional[Dict[str, EncodedText]] = None,
+    ):
         """
         Makes a prediction using the specified model and input data.
 
+        Predictions are looked up in the prediction cache first and duplicate texts
+        are only computed once. The remaining texts from concurrent calls are merged
+        into shared forward passes by the batch scheduler; the caller only receives
+        predictions for its own texts. Interactive requests are served before bulk
+        ones and users of the same class share the model fairly.
+
         Args:
             model_id (int): The ID of the model to use for prediction.
             data (List[str]): The input data to predict.
+            timeout (Optional[float]): Seconds after which the result is no longer
+                needed; queued texts are dropped once it passes.
+            user (Optional[str]): Who the request is made for, the unit of fair sharing.
+            priority (Optional[str]): ``"interactive"`` or ``"bulk"``, inferred from
+                the number of texts by default.
+            encoded (Optional[Dict[str, EncodedText]]): Texts already tokenized
+                for the model's tokenizer, queued instead of the plain texts.
 
         Returns:
             The prediction result.
 
         Raises:
+            QueueFullError: If the model's queue is full; retry after ``retry_after`` seconds.
+            DeadlineExceededError: If the timeout passes before the predictions are ready.
             Exception: If the model is not available or there is an error while making the prediction.
         """
+        label = str(model_id)
+        deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
         try:
-            model = self._model_pool[model_id]
-            return model(data)
+            if not self.has_model(model_id):
+                raise KeyError(f"Model {model_id} is not available")
+            # Classify by the size of the whole request, before cache hits shrink it.
+            priority = self._scheduler.resolve_priority(data, priority)
+
+            with metrics.REQUESTS_IN_FLIGHT.labels(label).track_inprogress():
+                await self._ensure_revision(model_id)
+                revision = self._model_revisions[model_id]
+                results = [None] * len(data)
+                missing = {}
+                with tracing.span("cache") as details:
+                    for i, text in enumerate(data):
+                        key = self._cache.make_key(model_id, revision, text)
+                        cached = self._cache.get(key)
+                        if cached is not None:
+                            results[i] = cached
+                        else:
+                            missing.setdefault(key, []).append(i)
+                    details["hits"] = len(data) - sum(len(indices) for indices in missing.values())
+
+                if missing:
+                    unique_texts = [data[indices[0]] for indices in missing.values()]
+                    predictions = await self._predict_uncached(
+                        model_id, unique_texts, deadline, user, priority, encoded
+                    )
+                    for (key, indices), prediction in zip(missing.items(), predictions):
+                        self._cache.put(key, prediction)
+                        for i in indices:
+                            results[i] = prediction
+            computed = sum(len(indices) for indices in missing.values())
+            metrics.PREDICTED_TEXTS.labels(label, "cache").inc(len(data) - computed)
+            metrics.PREDICTED_TEXTS.labels(label, "model").inc(computed)
+            metrics.PREDICT_REQUESTS.labels(label, "success").inc()
+            return results
+        except QueueFullError:
+            metrics.PREDICT_REQUESTS.labels(label, "rejected").inc()
+            raise
+        except DeadlineExceededError:
+            metrics.PREDICT_REQUESTS.labels(label, "deadline_exceeded").inc()
+            raise
         except Exception as e:
+            metrics.PREDICT_REQUESTS.labels(label, "error").inc()
             logger.error(f"Failed to predict with model {model_id}: {e}")
             raise
-        
\ No newline at end of file
+
+    async def _predict_uncached(
+        self, model_id: int, texts: List[str], deadline: Optional[float], user: Optional[str], priority: str,
+        encoded: Optional[Dict[str, EncodedText]] = None,
+    ) -> List[dict]:
+        """
+        Predicts texts missing from the cache, reusing predictions of near duplicates.
+
+        Texts differing from a recently scored text by no more than the allowed
+        number of shingles get its prediction; a sample of those reuses is
+        double-checked in the background. The rest are predicted and added to the index.
+        """
+        index = self._near_duplicate_index(model_id)
+        if index is None:
+            return await self._predict_with_cascade(model_id, texts, deadline, user, priority, encoded)
+
+        label = str(model_id)
+        with tracing.span("near_duplicate") as details:
+            fingerprints = await asyncio.to_thread(lambda: [fingerprint(text) for text in texts])
+            results = [None] * len(texts)
+            for i, text_fingerprint in enumerate(fingerprints):
+                if text_fingerprint is not None:
+                    results[i] = index.lookup(text_fingerprint)
+            details["reused"] = sum(prediction is not None for prediction in results)
+        remaining = [i for i, prediction in enumerate(results) if prediction is None]
+        reused = [(texts[i], results[i]) for i, prediction in enumerate(results) if prediction is not None]
+        metrics.NEAR_DUPLICATE_TEXTS.labels(label, "reused").inc(len(reused))
+        metrics.NEAR_DUPLICATE_TEXTS.labels(label, "computed").inc(len(remaining))
+
+        if remaining:
+            predictions = await self._predict_with_cascade(
+                model_id, [texts[i] for i in remaining], deadline, user, priority, encoded
+            )
+            for i, prediction in zip(remaining, predictions):
+                results[i] = prediction
+                if fingerprints[i] is not None:
+                    index.add(fingerprints[i], prediction)
+            metrics.NEAR_DUPLICATE_ENTRIES.labels(label).set(len(index))
+
+        sampled = [item for item in reused if random.random() < self.near_duplicate_shadow_rate]
+        if sampled:
+            def record(agreed: int, checked: int):
+                metrics.NEAR_DUPLICATE_CHECKS.labels(label, "agree").inc(agreed)
+                metrics.NEAR_DUPLICATE_CHECKS.labels(label, "disagree").inc(checked - agreed)
+
+            self._start_shadow_check(model_id, sampled, record)
+        return results
+
+    def _near_duplicate_index(self, model_id: int) -> Optional[NearDuplicateIndex]:
+        """
+        Returns the near-duplicate index of the model's current revision, if enabled.
+        """
+        if not self.near_duplicate_max_entries:
+            return None
+        revision = self._model_revisions[model_id]
+        entry = self._near_duplicates.get(model_id)
+        if entry is None or entry[0] != revision:
+            # Predictions of another revision must not be reused.
+            entry = self._near_duplicates[model_id] = (
+                revision, NearDuplicateIndex(
+                    self.near_duplicate_max_entries, self.near_duplicate_max_changed_shingles
+                )
+            )
+        return entry[1]
+
+    async def _predict_with_cascade(
+        self, model_id: int, texts: List[str], deadline: Optional[float], user: Optional[str], priority: str,
+        encoded: Optional[Dict[str, EncodedText]] = None,
+    ) -> List[dict]:
+        """
+        Predicts texts through the model's cascade if it has one.
+
+        Texts the pre-classifier is confident about are answered right away and
+        only the uncertain ones are queued for the transformer; a sample of the
+        confident answers is double-checked in the background.
+        """
+        cascade, stats = await self._get_cascade(model_id)
+        if cascade is None:
+            return await self._scheduler.submit(model_id, self._queued(texts, encoded), deadline, user, priority)
+
+        with tracing.span("cascade") as details:
+            results = await asyncio.to_thread(cascade.predict, texts)
+            details["confident"] = sum(prediction is not None for prediction in results)
+        deferred = [i for i, prediction in enumerate(results) if prediction is None]
+        confident = [(texts[i], prediction) for i, prediction in enumerate(results) if prediction is not None]
+        stats.record(len(confident), len(deferred))
+        metrics.CASCADE_TEXTS.labels(str(model_id), "confident").inc(len(confident))
+        metrics.CASCADE_TEXTS.labels(str(model_id), "deferred").inc(len(deferred))
+
+        if deferred:
+            predictions = await self._scheduler.submit(
+                model_id, self._queued([texts[i] for i in deferred], encoded), deadline, user, priority
+            )
+            for i, prediction in zip(deferred, predictions):
+                results[i] = prediction
+
+        sampled = stats.sample(confident)
+        if sampled:
+            def record(agreed: int, checked: int):
+                stats.record_shadow(agreed, checked)
+                metrics.CASCADE_SHADOW_CHECKS.labels(str(model_id), "agree").inc(agreed)
+                metrics.CASCADE_SHADOW_CHECKS.labels(str(model_id), "disagree").inc(checked - agreed)
+
+            self._start_shadow_check(model_id, sampled, record)
+        return results
+
+    @staticmethod
+    def _queued(texts: List[str], encoded: Optional[Dict[str, EncodedText]]) -> list:
+        # Texts tokenized for an ensemble are queued in their encoded form.
+        if not encoded:
+            return texts
+        return [encoded.get(text, text) for text in texts]
+
+    async def _get_cascade(self, model_id: int):
+        """
+        Returns the pre-classifier of a model and its statistics, loading it on first use.
+
+        A bundle that fails to load is logged and the model is served without a
+        cascade until its settings change.
+        """
+        spec = self._model_specs[model_id]
+        if not spec.cascade_path:
+            return None, None
+        settings = (spec.cascade_path, spec.cascade_low, spec.cascade_high)
+        entry = self._cascades.get(model_id)
+        if entry is None or entry[0] != settings:
+            try:
+                cascade = await asyncio.to_thread(
+                    CascadeClassifier.load, *settings, self._artifacts.root if self._artifacts else None
+                )
+                logger.info(f"Loaded cascade {spec.cascade_path} for model {model_id}")
+            except Exception as e:
+                logger.error(f"Failed to load cascade {spec.cascade_path} for model {model_id}: {e}")
+                cascade = None
+            entry = self._cascades[model_id] = (settings, cascade, CascadeStats(self.cascade_shadow_rate))
+        return entry[1], entry[2]
+
+    def _start_shadow_check(self, model_id: int, sampled: List[tuple], record: Callable[[int, int], None]):
+        task = asyncio.create_task(self._shadow_check(model_id, sampled, record))
+        self._shadow_checks.add(task)
+        task.add_done_callback(self._shadow_checks.discard)
+
+    async def _shadow_check(self, model_id: int, sampled: List[tuple], record: Callable[[int, int], None]):
+        """
+        Runs texts answered without the transformer through it as bulk work and
+        passes the number of agreeing labels and of checked texts to ``record``.
+        """
+        tracing.detach()
+        try:
+            predictions = await self._scheduler.submit(model_id, [text for text, _ in sampled], priority=BULK)
+        except Exception as e:
+            logger.warning(f"Shadow check of model {model_id} skipped: {e}")
+            return
+        agreed = sum(
+            prediction["label"] == answer["label"] for (_, answer), prediction in zip(sampled, predictions)
+        )
+        record(agreed, len(sampled))
+
+    def cascade_stats(self, model_id: int) -> Optional[dict]:
+        """
+        Returns the thresholds and counters of a model's cascade, or None if it has none.
+        """
+        spec = self._model_specs[model_id]
+        if not spec.cascade_path:
+            return None
+        entry = self._cascades.get(model_id)
+        if entry is None or entry[0] != (spec.cascade_path, spec.cascade_low, spec.cascade_high):
+            # Not used since its settings changed.
+            entry = (None, None, CascadeStats(self.cascade_shadow_rate))
+        loaded = entry[1] is not None
+        stats = entry[2]
+        return {
+            "path": spec.cascade_path,
+            "low": spec.cascade_low,
+            "high": spec.cascade_high,
+            "loaded": loaded,
+            **stats.snapshot(),
+        }
+
+    async def _run_inference(self, model_id: int, texts: List[str]) -> List[dict]:
+        """
+        Runs a single forward pass over an already merged batch of texts on the
+        inference executor, so the event loop stays free for other requests.
+
+        Texts are truncated to the model's ``max_length`` and fed to the pipeline
+        sorted by token length, so every internal batch holds texts of similar
+        length; the results are returned in the original order.
+        """
+        loop = asyncio.get_running_loop()
+        spec = self._model_specs[model_id]
+        start = time.perf_counter()
+        if self.executor_kind == "process":
+            texts = [text.text if isinstance(text, EncodedText) else text for text in texts]
+            results, timings = await loop.run_in_executor(
+                self._executor, run_in_worker,
+                *self._worker_args(model_id, spec), texts, self.max_batch_size, spec.max_length
+            )
+        else:
+            model = await self._model_pool.get(model_id)
+            if any(isinstance(text, EncodedText) for text in texts):
+                # A reload may have swapped in a model with another tokenizer.
+                key = tokenizer_key(model, spec.type)
+                texts = [
+                    text.text if isinstance(text, EncodedText) and text.tokenizer != key else text
+                    for text in texts
+                ]
+            results, timings = await loop.run_in_executor(
+                self._executor, run_batch,
+                model, texts, self.max_batch_size, spec.max_length
+            )
+
+        label = str(model_id)
+        elapsed = time.perf_counter() - start
+        metrics.BATCH_SIZE.labels(label).observe(len(texts))
+        metrics.BATCH_SECONDS.labels(label).observe(elapsed)
+        metrics.observe_stages(model_id, timings)
+        tracing.record_batch(len(texts), elapsed, timings)
+        return results
+
+    async def predict_ensemble(
+        self,
+        model_ids: List[int],
+        data: List[str],
+        timeout: Optional[float] = None,
+        user: Optional[str] = None,
+        priority: Optional[str] = None,
+    ) -> Dict[int, List[dict]]:
+        """
+        Predicts the same texts with several models at once.
+
+        Every model goes through ``predict``, so the prediction cache, cascades,
+        queue limits, priorities, fair sharing and deadlines apply per model as
+        for single requests. Models whose pipelines share a tokenizer and
+        truncation limit get the texts tokenized once, in batch-sized chunks,
+        and queue them in encoded form instead of each tokenizing them again.
+
+        Args:
+            model_ids (List[int]): The IDs of the models to use.
+            data (List[str]): The input texts.
+            timeout (Optional[float]): Seconds after which the result is no longer needed.
+            user (Optional[str]): Who the request is made for, the unit of fair sharing.
+            priority (Optional[str]): ``"interactive"`` or ``"bulk"``, inferred from
+                the number of texts by default.
+
+        Returns:
+            Dict[int, List[dict]]: Predictions of every model, in the order of ``data``.
+
+        Raises:
+            KeyError: If one of the models is not available.
+            QueueFullError: If the queue of one of the models is full.
+            DeadlineExceededError: If the timeout passes before all predictions are ready.
+        """
+        model_ids = list(dict.fromkeys(model_ids))
+        for model_id in model_ids:
+            if not self.has_model(model_id):
+                raise KeyError(f"Model {model_id} is not available")
+        priority = self._scheduler.resolve_priority(data, priority)
+        # Reject before tokenizing anything for a model that cannot take the texts.
+        for model_id in model_ids:
+            self._scheduler.check_capacity(model_id, len(data), priority)
+
+        if timeout is None:
+            return await self._predict_ensemble(model_ids, data, None, user, priority)
+        try:
+            return await asyncio.wait_for(self._predict_ensemble(model_ids, data, timeout, user, priority), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError("Deadline exceeded while predicting with the ensemble") from None
+
+    async def _predict_ensemble(
+        self, model_ids: List[int], data: List[str], timeout: Optional[float], user: Optional[str], priority: str
+    ) -> Dict[int, List[dict]]:
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        encoded = {}
+        if self.executor_kind == "thread":
+            # The pipelines live in the workers with process inference, there are
+            # no tokenizers to share in the parent.
+            models = await asyncio.gather(*(self._model_pool.get(model_id) for model_id in model_ids))
+            groups = {}
+            for model_id, model in zip(model_ids, models):
+                spec = self._model_specs[model_id]
+                key = tokenizer_key(model, spec.type)
+                if key is not None:
+                    groups.setdefault((key, spec.max_length), []).append((model_id, model))
+            for (key, max_length), members in groups.items():
+                if len(members) > 1:
+                    shared = await self._encode_shared(members, data, key, max_length)
+                    encoded.update((model_id, shared) for model_id, _ in members)
+
+        # Queued slices are dropped once the time left after tokenization is up.
+        remaining = None if deadline is None else max(deadline - loop.time(), 0)
+        outputs = await asyncio.gather(*(
+            self.predict(model_id, data, remaining, user, priority, encoded.get(model_id))
+            for model_id in model_ids
+        ))
+        return dict(zip(model_ids, outputs))
+
+    async def _encode_shared(
+        self, members: List[tuple], data: List[str], key: str, max_length: int
+    ) -> Dict[str, EncodedText]:
+        """
+        Tokenizes the texts that any of the models sharing a tokenizer will compute.
+
+        Texts every model has cached are skipped. The texts are tokenized on the
+        inference executor one batch-sized chunk at a time, so a huge request
+        never occupies a worker for long.
+        """
+        texts = {}
+        for model_id, _ in members:
+            await self._ensure_revision(model_id)
+            revision = self._model_revisions[model_id]
+            for text in data:
+                if self._cache.make_key(model_id, revision, text) not in self._cache:
+                    texts.setdefault(text)
+
+        loop = asyncio.get_running_loop()
+        tokenizer = members[0][1].tokenizer
+        texts = list(texts)
+        encoded = {}
+        for start in range(0, len(texts), self.max_batch_size):
+            rows = await loop.run_in_executor(
+                self._executor, encode, tokenizer, key, texts[start:start + self.max_batch_size], max_length
+            )
+            encoded.update((row.text, row) for row in rows)
+        return encoded
+
+    async def compare_backends(
+        self, model_id: int, data: List[str], backends: Optional[List[str]] = None
+    ) -> List[dict]:
+        """
+        Runs the same texts through several backends of a model and compares them
+        against the PyTorch fp32 reference.
+
+        Backends other than the one the model is served with are loaded only for
+        the duration of the comparison, one at a time, and comparisons run one
+        after another, so at most one extra copy of a model is in memory.
+
+        Args:
+            model_id (int): The ID of the model to compare.
+            data (List[str]): The input texts.
+            backends (Optional[List[str]]): The backends to compare, all by default.
+
+        Returns:
+            List[dict]: Per backend: label agreement with fp32, mean and max score
+            delta on agreeing labels, throughput, or the error if it failed to run.
+        """
+        spec = self._model_specs[model_id]
+        names = list(dict.fromkeys([DEFAULT_BACKEND, *(backends or BACKENDS)]))
+
+        outputs = {}
+        async with self._comparison_lock:
+            for name in names:
+                model = None
+                try:
+                    if name == spec.backend and self.executor_kind == "thread":
+                        model = await self._model_pool.get(model_id)
+                    else:
+                        model = await asyncio.to_thread(
+                            get_backend(name).load, spec.type, self._source(spec), self.device
+                        )
+                    start = time.perf_counter()
+                    predictions = await asyncio.to_thread(
+                        bucketed_inference, model, data, self.max_batch_size, spec.max_length
+                    )
+                    outputs[name] = (predictions, time.perf_counter() - start)
+                except Exception as e:
+                    logger.error(f"Backend '{name}' failed for model {model_id}: {e}")
+                    outputs[name] = e
+                finally:
+                    # Release the extra copy before the next backend is loaded.
+                    del model
+
+        reference = outputs[DEFAULT_BACKEND]
+        if isinstance(reference, Exception):
+            raise reference
+
+        report = []
+        for name, output in outputs.items():
+            if isinstance(output, Exception):
+                report.append({"backend": name, "error": str(output)})
+                continue
+
+            predictions, elapsed = output
+            agreeing = [
+                abs(prediction["score"] - expected["score"])
+                for prediction, expected in zip(predictions, reference[0])
+                if prediction["label"] == expected["label"]
+            ]
+            report.append({
+                "backend": name,
+                "label_agreement": len(agreeing) / len(data) if data else 1.0,
+                "mean_score_delta": sum(agreeing) / len(agreeing) if agreeing else 0.0,
+                "max_score_delta": max(agreeing, default=0.0),
+                "texts_per_second": len(data) / elapsed if elapsed else 0.0,
+            })
+        return report
+
+    def cache_stats(self) -> dict:
+        """
+        Returns hit/miss counters and memory usage of the prediction cache.
+        """
+        return self._cache.stats()
+
+    async def cleanup(self):
+        """
+        Stops the background batching loops and shuts down the inference executor.
+        """
+        for _, task in self._reloads.values():
+            task.cancel()
+        for task in self._shadow_checks:
+            task.cancel()
+        await self._scheduler.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,21 @@
 from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+
+
+class ModelSpec(NamedTuple):
+    """A row of the ``ml_models`` table needed to build and run a pipeline."""
+    type: str
+    name: str
+    max_length: int
+    backend: str
+    cascade_path: Optional[str] = None
+    cascade_low: Optional[float] = None
+    cascade_high: Optional[float] = None
+
+    def same_pipeline(self, other: "ModelSpec") -> bool:
+        """Tells whether both specs build the same pipeline, whatever their cascades."""
+        return self[:4] == other[:4]
+
 
 class ModelManagerABC(ABC):
     @abstractmethod
@@ -11,4 +28,4 @@ class ModelManagerABC(ABC):
 
     @abstractmethod
     async def predict(self, model_id, data):
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,128 @@
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional, Set, Tuple
+
+SHINGLE_SIZE = 4
+# Below this many shingles a single changed character rewrites most of the text.
+MIN_SHINGLES = 8
+# A single inserted, deleted or replaced character changes at most this many
+# shingles. A short inserted word can already fit the same bound, so a larger
+# one lets edits that change the meaning through.
+DEFAULT_MAX_CHANGED_SHINGLES = 2 * SHINGLE_SIZE
+
+_URL = re.compile(r"https?://\S+|www\.\S+")
+_MENTION = re.compile(r"@\w+")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_for_fingerprint(text: str) -> str:
+    """
+    Strips what spam waves usually mutate: case, punctuation, emoji, links and @usernames.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _MENTION.sub(" ", _URL.sub(" ", text))
+    return _NON_WORD.sub(" ", text).strip()
+
+
+class Fingerprint(NamedTuple):
+    # 64-bit hashes of the text's distinct character shingles, in ascending order.
+    shingles: Tuple[int, ...]
+    # The normalized text, so exact repeats are recognized without comparing shingles.
+    text: str
+
+
+def shingle_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little")
+
+
+def fingerprint(text: str) -> Optional[Fingerprint]:
+    """
+    Returns the hashed character shingles of a text together with the normalized
+    text, or None if the text is too short to be compared reliably.
+    """
+    normalized = normalize_for_fingerprint(text)
+    shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    return Fingerprint(tuple(sorted(shingle_hash(shingle) for shingle in shingles)), normalized)
+
+
+class NearDuplicateIndex:
+    """
+    Recently scored texts of a model, searchable by shingle overlap.
+
+    A stored text is reused for a new one if the two normalized texts differ in
+    at most ``max_changed_shingles`` shingles. The default admits any single
+    inserted, deleted or replaced character and some slightly larger edits,
+    such as an inserted short word; replacing a word with an insult changes far
+    more shingles, however long the text.
+
+    Every text is indexed under its ``max_changed_shingles + 1`` smallest shingle
+    hashes. Two texts that each have at most that many shingles the other lacks
+    both hold the smallest hash of their common shingles among those, so the
+    buckets of a lookup contain every text that can pass the check without a
+    scan. At most ``max_entries`` texts are kept, the least recently used ones
+    are evicted first.
+    """
+
+    def __init__(self, max_entries: int, max_changed_shingles: int = DEFAULT_MAX_CHANGED_SHINGLES):
+        self.max_entries = max_entries
+        self.max_changed_shingles = max_changed_shingles
+        # Normalized text -> (shingle hashes, bucket keys, value)
+        self._entries: "OrderedDict[str, Tuple[FrozenSet[int], Tuple[int, ...], Any]]" = OrderedDict()
+        self._buckets: Dict[int, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _keys(self, fingerprint: Fingerprint) -> Tuple[int, ...]:
+        return fingerprint.shingles[:self.max_changed_shingles + 1]
+
+    def lookup(self, fingerprint: Fingerprint) -> Optional[Any]:
+        """
+        Returns the value of the stored text closest to this one, if the two
+        differ in at most ``max_changed_shingles`` shingles.
+        """
+        entry = self._entries.get(fingerprint.text)
+        if entry is not None:
+            self._entries.move_to_end(fingerprint.text)
+            return entry[2]
+
+        shingles = frozenset(fingerprint.shingles)
+        best = None
+        for key in self._keys(fingerprint):
+            for candidate in self._buckets.get(key, ()):
+                candidate_shingles = self._entries[candidate][0]
+                if abs(len(candidate_shingles) - len(shingles)) > self.max_changed_shingles:
+                    continue
+                changed = len(shingles ^ candidate_shingles)
+                if changed <= self.max_changed_shingles and (best is None or changed < best[0]):
+                    best = (changed, candidate)
+        if best is None:
+            return None
+        self._entries.move_to_end(best[1])
+        return self._entries[best[1]][2]
+
+    def add(self, fingerprint: Fingerprint, value: Any):
+        text = fingerprint.text
+        if text in self._entries:
+            shingles, keys, _ = self._entries[text]
+            self._entries[text] = (shingles, keys, value)
+            self._entries.move_to_end(text)
+            return
+        keys = self._keys(fingerprint)
+        self._entries[text] = (frozenset(fingerprint.shingles), keys, value)
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(text)
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, text: str):
+        _, keys, _ = self._entries.pop(text)
+        for key in keys:
+            bucket = self._buckets[key]
+            bucket.discard(text)
+            if not bucket:
+                del self._buckets[key]
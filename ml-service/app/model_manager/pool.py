@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from model_manager.metrics import MODEL_MEMORY_BYTES, POOL_MEMORY_BUDGET_BYTES, POOL_MEMORY_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_model_bytes(model) -> int:
+    """
+    Estimates how much memory the weights of a loaded pipeline occupy.
+
+    PyTorch models are measured through their state dict, which also covers the
+    packed weights of dynamically quantized layers; ONNX Runtime sessions are
+    measured by the size of the exported model file.
+    """
+    inner = getattr(model, "model", model)
+    state_dict = getattr(inner, "state_dict", None)
+    if callable(state_dict):
+        total = 0
+        for value in state_dict().values():
+            tensors = value if isinstance(value, (tuple, list)) else (value,)
+            for tensor in tensors:
+                if hasattr(tensor, "element_size"):
+                    total += tensor.numel() * tensor.element_size()
+        return total
+
+    model_path = getattr(inner, "model_path", None)
+    if model_path and os.path.exists(model_path):
+        return os.path.getsize(model_path)
+    return 0
+
+
+class ModelPool:
+    """
+    Loaded pipelines with on-demand loading and least-recently-used eviction.
+
+    A model is loaded on its first request; concurrent first requests share a
+    single load. When the estimated size of all loaded models exceeds
+    ``memory_budget_bytes``, the least recently used models are unloaded, except
+    for pinned ones. A budget of 0 means no limit.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[int], Awaitable[Any]],
+        memory_budget_bytes: int = 0,
+        pinned: Iterable[int] = (),
+    ):
+        self._loader = loader
+        self.memory_budget = memory_budget_bytes
+        self._models: "OrderedDict[int, Any]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._loading: Dict[int, asyncio.Task] = {}
+        self._failed: Dict[int, str] = {}
+        self._pinned: Set[int] = set(pinned)
+        POOL_MEMORY_BUDGET_BYTES.set(memory_budget_bytes)
+
+    def __contains__(self, model_id: int) -> bool:
+        return model_id in self._models
+
+    def keys(self) -> List[int]:
+        return list(self._models)
+
+    def peek(self, model_id: int) -> Optional[Any]:
+        """
+        Returns the model if it is loaded, without loading it or touching its LRU position.
+        """
+        return self._models.get(model_id)
+
+    def state(self, model_id: int) -> str:
+        """
+        Returns ``"ready"``, ``"loading"``, ``"failed"`` or ``"not_loaded"``.
+        """
+        if model_id in self._models:
+            return "ready"
+        if model_id in self._loading:
+            return "loading"
+        if model_id in self._failed:
+            return "failed"
+        return "not_loaded"
+
+    def error(self, model_id: int) -> Optional[str]:
+        return self._failed.get(model_id)
+
+    @property
+    def pinned(self) -> Set[int]:
+        return set(self._pinned)
+
+    def memory_usage(self) -> int:
+        return sum(self._sizes.values())
+
+    async def get(self, model_id: int) -> Any:
+        """
+        Returns the loaded model, loading it first if needed.
+        """
+        model = self._models.get(model_id)
+        if model is not None:
+            self._models.move_to_end(model_id)
+            return model
+
+        task = self._loading.get(model_id)
+        if task is None:
+            task = self._loading[model_id] = asyncio.create_task(self._load(model_id))
+            task.add_done_callback(lambda _: self._loading.pop(model_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, model_id: int) -> Any:
+        try:
+            model = await self._loader(model_id)
+        except Exception as e:
+            self._failed[model_id] = str(e)
+            raise
+        self.put(model_id, model)
+        return model
+
+    def put(self, model_id: int, model: Any):
+        """
+        Stores a loaded model, replacing the previous instance, and enforces the budget.
+        """
+        self._models[model_id] = model
+        self._models.move_to_end(model_id)
+        self._failed.pop(model_id, None)
+        self._sizes[model_id] = estimate_model_bytes(model)
+        MODEL_MEMORY_BYTES.labels(str(model_id)).set(self._sizes[model_id])
+        self._enforce_budget(keep=model_id)
+        POOL_MEMORY_BYTES.set(self.memory_usage())
+
+    def evict(self, model_id: int):
+        if self._models.pop(model_id, None) is not None:
+            self._sizes.pop(model_id, None)
+            MODEL_MEMORY_BYTES.labels(str(model_id)).set(0)
+            POOL_MEMORY_BYTES.set(self.memory_usage())
+            logger.info(f"Model {model_id} unloaded")
+
+    def pin(self, model_id: int):
+        self._pinned.add(model_id)
+
+    def unpin(self, model_id: int):
+        self._pinned.discard(model_id)
+        self._enforce_budget()
+
+    def _enforce_budget(self, keep: Optional[int] = None):
+        if not self.memory_budget:
+            return
+        for model_id in list(self._models):
+            if self.memory_usage() <= self.memory_budget:
+                break
+            if model_id != keep and model_id not in self._pinned:
+                self.evict(model_id)
+        if self.memory_usage() > self.memory_budget:
+            logger.warning(
+                f"Loaded models use {self.memory_usage()} bytes, over the budget of "
+                f"{self.memory_budget} bytes, but the rest are pinned or in use"
+            )
+
+
+class WorkerModelPool:
+    """
+    The synchronous counterpart of ``ModelPool`` kept by every process pool worker.
+
+    Workers build their own pipelines, so the parent's pool does not see them.
+    Each worker applies the same memory budget and least-recently-used eviction
+    to its copies. An entry is rebuilt when the pipeline it was built for (the
+    backend, task, source and device) changes.
+    """
+
+    def __init__(self, memory_budget_bytes: int = 0):
+        self.memory_budget = memory_budget_bytes
+        self._models: "OrderedDict[int, Tuple[Hashable, Any]]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._pinned: Set[int] = set()
+
+    def __contains__(self, model_id: int) -> bool:
+        return model_id in self._models
+
+    def get(self, model_id: int, key: Hashable, loader: Callable[[], Any], pinned: bool = False) -> Any:
+        """
+        Returns the model built for ``key``, calling ``loader`` to build it if needed.
+        """
+        if pinned:
+            self._pinned.add(model_id)
+        else:
+            self._pinned.discard(model_id)
+
+        entry = self._models.get(model_id)
+        if entry is not None and entry[0] == key:
+            self._models.move_to_end(model_id)
+            return entry[1]
+
+        # Free the outdated copy before building its replacement.
+        self.evict(model_id)
+        model = loader()
+        self._models[model_id] = (key, model)
+        self._sizes[model_id] = estimate_model_bytes(model)
+        self._enforce_budget(keep=model_id)
+        return model
+
+    def evict(self, model_id: int):
+        if self._models.pop(model_id, None) is not None:
+            self._sizes.pop(model_id, None)
+            logger.info(f"Model {model_id} unloaded from worker {os.getpid()}")
+
+    def memory_usage(self) -> int:
+        return sum(self._sizes.values())
+
+    def _enforce_budget(self, keep: int):
+        if not self.memory_budget:
+            return
+        for model_id in list(self._models):
+            if self.memory_usage() <= self.memory_budget:
+                break
+            if model_id != keep and model_id not in self._pinned:
+                self.evict(model_id)
@@ -0,0 +1,260 @@
+"""
+On-demand profiling of a running worker.
+
+A profile samples the Python stacks of every thread at a fixed interval and
+folds them into the ``frame;frame;frame count`` format read by flamegraph.pl,
+speedscope and most other flame graph tools. Alongside the samples it records
+garbage collector pauses, how late the event loop wakes up (a busy or blocked
+loop wakes up late) and, optionally, the torch operators of every batch run in
+the meantime.
+
+Only one profile runs per process at a time and it only sees the process it
+runs in: with ``serve.py --workers N`` a profile covers the worker that
+received the request.
+"""
+import asyncio
+import gc
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Leaf frames of threads that are waiting rather than working; samples ending
+# in them are dropped unless idle threads are requested.
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads from a background thread.
+
+    ``sys._current_frames`` is read every ``interval`` seconds, so the cost is
+    paid by the sampler and the profiled code runs unmodified.
+    """
+
+    def __init__(self, interval: float, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if not stack or (not self.include_idle and _is_idle(stack[0])):
+                    continue
+                frames = [names.get(ident, str(ident))] + [_frame_name(code) for code in reversed(stack)]
+                self.stacks[";".join(frames)] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def _is_idle(code) -> bool:
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def _frame_name(code) -> str:
+    # ';' separates frames and ' ' the count in the folded format.
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class GcMonitor:
+    """
+    Measures collector pauses through ``gc.callbacks``.
+
+    The collector holds the GIL, so the sampler cannot observe it directly.
+    """
+
+    def __init__(self):
+        self.collections: Dict[int, int] = Counter()
+        self.pause_seconds = 0.0
+        self.max_pause_seconds = 0.0
+        self._started: Dict[int, float] = {}
+
+    def _callback(self, phase: str, info: dict):
+        ident = threading.get_ident()
+        if phase == "start":
+            self._started[ident] = time.perf_counter()
+            return
+        started = self._started.pop(ident, None)
+        if started is None:
+            return
+        pause = time.perf_counter() - started
+        self.collections[info["generation"]] += 1
+        self.pause_seconds += pause
+        self.max_pause_seconds = max(self.max_pause_seconds, pause)
+
+    def start(self):
+        gc.callbacks.append(self._callback)
+
+    def stop(self):
+        gc.callbacks.remove(self._callback)
+
+    def snapshot(self) -> dict:
+        return {
+            "collections": {str(generation): count for generation, count in sorted(self.collections.items())},
+            "pause_seconds": self.pause_seconds,
+            "max_pause_seconds": self.max_pause_seconds,
+        }
+
+
+class TorchOpRecorder:
+    """
+    Accumulates the operator statistics of batches profiled with ``torch.profiler``.
+
+    Only one batch is profiled at a time; batches running concurrently with it
+    are counted as skipped.
+    """
+
+    def __init__(self):
+        self.ops: Dict[str, List[float]] = {}
+        self.batches = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self):
+        if not self._lock.acquire(blocking=False):
+            self.skipped += 1
+            yield
+            return
+        try:
+            import torch
+            from torch.profiler import ProfilerActivity, profile
+
+            activities = [ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(ProfilerActivity.CUDA)
+            with profile(activities=activities) as prof:
+                yield
+            self._add(prof.key_averages())
+        finally:
+            self._lock.release()
+
+    def _add(self, events):
+        self.batches += 1
+        for event in events:
+            device = getattr(event, "self_device_time_total", None)
+            if device is None:
+                device = getattr(event, "self_cuda_time_total", 0)
+            totals = self.ops.setdefault(event.key, [0, 0.0, 0.0, 0.0])
+            totals[0] += event.count
+            totals[1] += event.self_cpu_time_total
+            totals[2] += event.cpu_time_total
+            totals[3] += device
+
+    def snapshot(self, limit: int = 50) -> dict:
+        # The profiler reports microseconds.
+        ops = sorted(self.ops.items(), key=lambda item: item[1][1] + item[1][3], reverse=True)[:limit]
+        return {
+            "batches": self.batches,
+            "skipped_batches": self.skipped,
+            "ops": [
+                {
+                    "name": name,
+                    "calls": int(calls),
+                    "self_cpu_seconds": self_cpu / 1e6,
+                    "cpu_seconds": cpu / 1e6,
+                    "self_device_seconds": device / 1e6,
+                }
+                for name, (calls, self_cpu, cpu, device) in ops
+            ],
+        }
+
+
+_active_lock = threading.Lock()
+_torch_recorder: Optional[TorchOpRecorder] = None
+
+
+@contextmanager
+def torch_profiled():
+    """
+    Profiles the enclosed batch with ``torch.profiler`` while a profile that
+    asked for torch operators is running; does nothing otherwise.
+    """
+    recorder = _torch_recorder
+    if recorder is None:
+        yield
+        return
+    with recorder.profile():
+        yield
+
+
+async def profile(seconds: float, interval: float, torch_ops: bool = False, include_idle: bool = False) -> dict:
+    """
+    Profiles the current process for ``seconds`` and returns the report.
+
+    While it waits, the coroutine wakes up every ``interval`` seconds to measure
+    how late the event loop lets it run.
+
+    Raises:
+        ProfilerBusyError: If another profile is running in this process.
+    """
+    global _torch_recorder
+
+    if not _active_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+    loop = asyncio.get_running_loop()
+    sampler = SamplingProfiler(interval, include_idle)
+    gc_monitor = GcMonitor()
+    recorder = TorchOpRecorder() if torch_ops else None
+    lags = []
+    started = loop.time()
+    try:
+        _torch_recorder = recorder
+        gc_monitor.start()
+        sampler.start()
+        end = started + seconds
+        while (now := loop.time()) < end:
+            expected = now + min(interval, end - now)
+            await asyncio.sleep(expected - now)
+            lags.append(max(loop.time() - expected, 0.0))
+    finally:
+        sampler.stop()
+        gc_monitor.stop()
+        _torch_recorder = None
+        _active_lock.release()
+
+    return {
+        "duration_seconds": loop.time() - started,
+        "interval_seconds": interval,
+        "samples": sampler.samples,
+        "folded": sampler.folded(),
+        "gc": gc_monitor.snapshot(),
+        "event_loop": {
+            "max_lag_seconds": max(lags, default=0.0),
+            "mean_lag_seconds": sum(lags) / len(lags) if lags else 0.0,
+        },
+        "torch": recorder.snapshot() if recorder is not None else None,
+    }
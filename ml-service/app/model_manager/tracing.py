@@ -0,0 +1,117 @@
+"""
+Stage timings of individual prediction requests.
+
+A request opts in by running under ``trace_request()``; the model manager and
+the batch scheduler then add a span for every stage the request goes through.
+Without an active trace ``span`` and ``record_batch`` do nothing, so untraced
+requests only pay for a context variable lookup.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence
+
+
+class RequestTrace:
+    """The spans recorded for one request, in the order they finished."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[dict] = []
+
+    def add(self, name: str, seconds: float, **details):
+        self.spans.append({"name": name, "seconds": seconds, **details})
+
+    def total_seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """
+        Formats the spans as a ``Server-Timing`` header value, with the details
+        of every span as its description.
+        """
+        entries = []
+        for span in self.spans:
+            entry = f"{span['name']};dur={span['seconds'] * 1000:.3f}"
+            details = " ".join(f"{key}={value}" for key, value in span.items() if key not in ("name", "seconds"))
+            if details:
+                entry += f';desc="{details}"'
+            entries.append(entry)
+        entries.append(f"total;dur={self.total_seconds() * 1000:.3f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> dict:
+        return {"total_seconds": self.total_seconds(), "spans": self.spans}
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+_batch: ContextVar[Sequence[RequestTrace]] = ContextVar("batch_traces", default=())
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+@contextmanager
+def trace_request() -> Iterator[RequestTrace]:
+    """
+    Traces the enclosed code and the tasks it starts.
+    """
+    trace = RequestTrace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def detach():
+    """
+    Stops tracing in the current task.
+
+    Tasks inherit the trace of the request that started them; long-lived or
+    background tasks call this so their work is not attributed to that request.
+    """
+    _current.set(None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[dict]:
+    """
+    Records the duration of the enclosed code as a span of the current trace.
+
+    Details added to the yielded dict are attached to the span.
+    """
+    details: Dict[str, object] = {}
+    trace = _current.get()
+    if trace is None:
+        yield details
+        return
+    start = time.perf_counter()
+    try:
+        yield details
+    finally:
+        trace.add(name, time.perf_counter() - start, **details)
+
+
+@contextmanager
+def batch_traces(traces: Sequence[RequestTrace]):
+    """
+    Marks the traces of the requests in the batch that the enclosed code runs.
+    """
+    token = _batch.set(traces)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+
+
+def record_batch(texts: int, seconds: float, stages: Dict[str, float]):
+    """
+    Adds the wall time and stage timings of a merged batch to the traces of
+    every request in it.
+    """
+    for trace in _batch.get():
+        trace.add("batch", seconds, texts=texts)
+        for stage, stage_seconds in stages.items():
+            trace.add(stage, stage_seconds)
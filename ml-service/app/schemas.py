@@ -1,11 +1,16 @@
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 
 class ModelResponse(BaseModel):
     id: int
     name: str
     type: str
     price_per_char: float
+    max_length: Optional[int] = None
+    backend: str = "torch"
+    cascade_path: Optional[str] = None
+    cascade_low: Optional[float] = None
+    cascade_high: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -14,6 +19,11 @@ class AddModelRequest(BaseModel):
     type: str
     name: str
     price_per_char: float
+    max_length: Optional[int] = None
+    backend: str = "torch"
+    cascade_path: Optional[str] = None
+    cascade_low: Optional[float] = None
+    cascade_high: Optional[float] = None
 
 class PredictRequest(BaseModel):
     texts: List[str]
@@ -28,6 +38,97 @@ class PredictResponse(BaseModel):
     result: List[PredictResponseItem]
 
 
+class EnsemblePredictRequest(BaseModel):
+    model_ids: List[int]
+    texts: List[str]
+
+
+class EnsemblePredictResponse(BaseModel):
+    results: Dict[int, List[PredictResponseItem]]
+
+
+class CompareBackendsRequest(BaseModel):
+    texts: List[str]
+    backends: Optional[List[str]] = None
+
+
+class BackendComparison(BaseModel):
+    backend: str
+    label_agreement: Optional[float] = None
+    mean_score_delta: Optional[float] = None
+    max_score_delta: Optional[float] = None
+    texts_per_second: Optional[float] = None
+    error: Optional[str] = None
+
+
+class CacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    hit_rate: float
+    entries: int
+    size_bytes: int
+    max_bytes: int
+
+
+class CascadeStatsResponse(BaseModel):
+    path: str
+    low: float
+    high: float
+    loaded: bool
+    confident: int
+    deferred: int
+    confident_rate: float
+    shadow_checked: int
+    shadow_agreement: Optional[float] = None
+
+
+class GcStats(BaseModel):
+    collections: Dict[str, int]
+    pause_seconds: float
+    max_pause_seconds: float
+
+
+class EventLoopStats(BaseModel):
+    max_lag_seconds: float
+    mean_lag_seconds: float
+
+
+class TorchOpStats(BaseModel):
+    name: str
+    calls: int
+    self_cpu_seconds: float
+    cpu_seconds: float
+    self_device_seconds: float
+
+
+class TorchProfile(BaseModel):
+    batches: int
+    skipped_batches: int
+    ops: List[TorchOpStats]
+
+
+class ProfileResponse(BaseModel):
+    duration_seconds: float
+    interval_seconds: float
+    samples: int
+    folded: str
+    gc: GcStats
+    event_loop: EventLoopStats
+    torch: Optional[TorchProfile] = None
+
+
+class ModelState(BaseModel):
+    name: str
+    state: str
+    pinned: bool
+    error: Optional[str] = None
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    models: Dict[int, ModelState]
+
+
 class LoadModelsResponse(BaseModel):
     message: str
     loaded_model_ids: List[int]
\ No newline at end of file
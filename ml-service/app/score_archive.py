@@ -0,0 +1,338 @@
+"""
+Scores a large file of texts offline, without the HTTP services.
+
+The input is read in chunks of ``--chunk-size`` rows. Every chunk is scored by
+one of ``--workers`` forked processes, each with its own ``ModelManager`` over
+the model loaded once in the parent, and written as a Parquet part file:
+
+    python score_archive.py comments.parquet --text-column body --id-column comment_id --output scores/
+
+``scores/`` then holds ``part-NNNNNN.parquet`` files with the columns ``row``
+(position of the row in the input), the id column if given, ``label`` and
+``score``; ``_SUCCESS`` marks a finished run. Parts are written atomically, so
+an interrupted run started again with the same arguments skips the chunks
+that are already done.
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, List, Optional, Tuple
+
+# db.database reads these at import time; the scorer never connects.
+for variable, value in (
+    ("POSTGRES_USER", "offline"), ("POSTGRES_PASSWORD", "offline"),
+    ("POSTGRES_HOST", "localhost"), ("POSTGRES_PORT", "5432"),
+):
+    os.environ.setdefault(variable, value)
+
+import pyarrow as pa  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+import torch  # noqa: E402
+
+import config  # noqa: E402
+from model_manager.backends import DEFAULT_BACKEND  # noqa: E402
+from model_manager.bucketing import length_order, restore_order  # noqa: E402
+from model_manager.fair_queue import BULK  # noqa: E402
+from model_manager.model_manager import ModelManager  # noqa: E402
+from model_manager.models import ModelSpec  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MODEL_ID = 1
+MANIFEST_FILE = "_manifest.json"
+SUCCESS_FILE = "_SUCCESS"
+# Settings that change which row ends up in which part or how it is scored.
+MANIFEST_FIELDS = (
+    "input", "text_column", "id_column", "chunk_size", "model", "task", "backend", "max_length",
+    "cascade", "cascade_low", "cascade_high", "near_duplicate_max_entries",
+)
+
+Row = Tuple[str, object]
+
+# Longest CSV field accepted; the csv module stops at 128 KiB by default.
+CSV_FIELD_SIZE_LIMIT = 2 ** 31 - 1
+
+# Built in the parent before the workers are forked.
+_manager: Optional[ModelManager] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def check_columns(path: str, text_column: str, id_column: Optional[str]):
+    """
+    Makes sure the input has the text and id columns before anything is scored.
+
+    JSON Lines files are checked on their first object; later objects without
+    the text field are rejected by ``read_rows``.
+
+    Raises:
+        SystemExit: If a column is missing.
+    """
+    if path.endswith(".parquet"):
+        columns = pq.ParquetFile(path).schema_arrow.names
+    elif path.endswith(".csv"):
+        csv.field_size_limit(CSV_FIELD_SIZE_LIMIT)
+        with open(path, encoding="utf-8", newline="") as source:
+            columns = csv.DictReader(source).fieldnames or []
+    elif path.endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as source:
+            first = next((json.loads(line) for line in source if line.strip()), None)
+        if not isinstance(first, dict):
+            # A file of plain JSON strings has no columns to check.
+            return
+        columns = list(first)
+    else:
+        raise SystemExit(f"Unsupported input format of {path}, expected .csv, .jsonl or .parquet")
+
+    for column in (text_column, id_column):
+        if column and column not in columns:
+            raise SystemExit(f"{path} has no column '{column}', found: {', '.join(map(str, columns))}")
+
+
+def as_text(value, where: str) -> str:
+    """
+    Turns the text field of a row into the string that is scored.
+
+    Missing values become empty strings, so every input row gets an output row,
+    and numbers are scored as written.
+
+    Raises:
+        SystemExit: If the value is a list, an object or another non-scalar.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    raise SystemExit(f"{where}: the text is a {type(value).__name__}, not a string: {str(value)[:200]}")
+
+
+def read_rows(path: str, text_column: str, id_column: Optional[str]) -> Iterator[Row]:
+    """
+    Streams ``(text, id)`` pairs from a CSV, JSON Lines or Parquet file.
+
+    Raises:
+        SystemExit: If a row has no text field or a text that cannot be scored,
+            naming its line (row for Parquet) before any later row is read.
+    """
+    if path.endswith(".parquet"):
+        columns = [text_column] + ([id_column] if id_column else [])
+        position = 0
+        for batch in pq.ParquetFile(path).iter_batches(columns=columns):
+            texts = batch.column(text_column).to_pylist()
+            ids = batch.column(id_column).to_pylist() if id_column else itertools.repeat(None)
+            for text, row_id in zip(texts, ids):
+                yield as_text(text, f"{path}: row {position}"), row_id
+                position += 1
+        return
+
+    with open(path, encoding="utf-8", newline="") as source:
+        if path.endswith(".csv"):
+            csv.field_size_limit(CSV_FIELD_SIZE_LIMIT)
+            for row in csv.DictReader(source):
+                yield row.get(text_column) or "", row.get(id_column) if id_column else None
+            return
+        if path.endswith((".jsonl", ".ndjson")):
+            for number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                where = f"{path}: line {number}"
+                try:
+                    value = json.loads(line)
+                except ValueError as e:
+                    raise SystemExit(f"{where}: {e}")
+                if isinstance(value, dict):
+                    if text_column not in value:
+                        raise SystemExit(f"{where}: the object has no field '{text_column}': {line.strip()[:200]}")
+                    yield as_text(value[text_column], where), value.get(id_column) if id_column else None
+                else:
+                    yield as_text(value, where), None
+            return
+    raise SystemExit(f"Unsupported input format of {path}, expected .csv, .jsonl or .parquet")
+
+
+def chunks(rows: Iterator[Row], size: int) -> Iterator[List[Row]]:
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def part_path(output: str, index: int) -> str:
+    return os.path.join(output, f"part-{index:06d}.parquet")
+
+
+def _init_worker(threads: int):
+    global _loop
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already fixed by the parent; nothing to do.
+        pass
+    _manager.reset_after_fork()
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+
+
+def score_chunk(index: int, first_row: int, chunk: List[Row], output: str, id_column: Optional[str]) -> int:
+    """
+    Scores one chunk in a worker and writes it as a part file.
+
+    The texts go to the model sorted by length, so the scheduler's batches hold
+    texts of similar length across the whole chunk rather than within each batch.
+    """
+    texts = [text for text, _ in chunk]
+    order = length_order([len(text) for text in texts])
+    predictions = _loop.run_until_complete(
+        _manager.predict(MODEL_ID, [texts[i] for i in order], priority=BULK)
+    )
+    predictions = restore_order(predictions, order)
+
+    columns = {"row": pa.array(range(first_row, first_row + len(chunk)), type=pa.int64())}
+    if id_column:
+        columns[id_column] = pa.array([row_id for _, row_id in chunk])
+    columns["label"] = pa.array([prediction["label"] for prediction in predictions]).dictionary_encode()
+    columns["score"] = pa.array([prediction["score"] for prediction in predictions], type=pa.float32())
+
+    path = part_path(output, index)
+    tmp = f"{path}.tmp"
+    pq.write_table(pa.table(columns), tmp)
+    os.replace(tmp, path)
+    return len(chunk)
+
+
+def check_manifest(args) -> set:
+    """
+    Records the settings of the run in the output directory and returns the
+    indices of the parts that are already written.
+
+    Raises:
+        SystemExit: If the directory holds a run with different settings.
+    """
+    os.makedirs(args.output, exist_ok=True)
+    manifest = {field: getattr(args, field) for field in MANIFEST_FIELDS}
+    manifest["input"] = os.path.abspath(args.input)
+    path = os.path.join(args.output, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path) as source:
+            previous = json.load(source)
+        if previous != manifest:
+            changed = sorted(field for field in manifest if previous.get(field) != manifest[field])
+            raise SystemExit(f"{args.output} holds a run with different settings ({', '.join(changed)})")
+    else:
+        with open(path, "w") as target:
+            json.dump(manifest, target, indent=2)
+
+    done = set()
+    for name in os.listdir(args.output):
+        if name.startswith("part-") and name.endswith(".parquet"):
+            done.add(int(name[len("part-"):-len(".parquet")]))
+    return done
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV, JSON Lines or Parquet file with the texts")
+    parser.add_argument("--output", required=True, help="directory for the Parquet parts")
+    parser.add_argument("--text-column", default="text", help="column or field with the text")
+    parser.add_argument("--id-column", help="column or field copied to the output to join the scores back")
+    parser.add_argument("--model", default="martin-ha/toxic-comment-model")
+    parser.add_argument("--task", default="text-classification")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--max-length", type=int, default=config.DEFAULT_MAX_LENGTH)
+    parser.add_argument("--cascade", help="cascade bundle in --artifact-dir to answer confident texts without the model")
+    parser.add_argument("--cascade-low", type=float, default=config.CASCADE_LOW)
+    parser.add_argument("--cascade-high", type=float, default=config.CASCADE_HIGH)
+    parser.add_argument(
+        "--near-duplicate-max-entries", type=int, default=0,
+        help="reuse predictions of near duplicates within a worker, 0 scores every text"
+    )
+    parser.add_argument("--artifact-dir", default=config.ARTIFACT_DIR)
+    parser.add_argument("--chunk-size", type=int, default=4096, help="rows per part file")
+    parser.add_argument("--batch-size", type=int, default=config.MAX_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--threads-per-worker", type=int, default=0,
+        help="intra-op threads per worker, 0 splits the available CPUs evenly"
+    )
+    return parser.parse_args()
+
+
+def main():
+    global _manager
+
+    args = parse_args()
+    check_columns(args.input, args.text_column, args.id_column)
+    done = check_manifest(args)
+    if done:
+        logger.info(f"Resuming: {len(done)} parts already written")
+
+    available = len(os.sched_getaffinity(0))
+    threads = args.threads_per_worker or max(1, available // args.workers)
+    # Keep the parent single-threaded: an OpenMP pool started before fork
+    # deadlocks in the children.
+    torch.set_num_threads(1)
+    _manager = ModelManager(
+        device=args.device,
+        max_batch_size=args.batch_size,
+        max_wait_ms=0,
+        executor="thread",
+        max_workers=1,
+        default_max_length=args.max_length,
+        cascade_low=args.cascade_low,
+        cascade_high=args.cascade_high,
+        cascade_shadow_rate=0,
+        near_duplicate_max_entries=args.near_duplicate_max_entries,
+        near_duplicate_shadow_rate=0,
+        artifact_dir=args.artifact_dir,
+    )
+    _manager.register_model(MODEL_ID, ModelSpec(
+        args.task, args.model, args.max_length, args.backend, args.cascade, args.cascade_low, args.cascade_high
+    ))
+    if not asyncio.run(_manager.preload([MODEL_ID])):
+        raise SystemExit(f"Failed to load {args.model}")
+    _manager.share_memory()
+
+    start = time.perf_counter()
+    scored = 0
+    pending = set()
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+        initargs=(threads,),
+    ) as pool:
+        rows = read_rows(args.input, args.text_column, args.id_column)
+        for index, chunk in enumerate(chunks(rows, args.chunk_size)):
+            if index in done:
+                continue
+            # Bounded read-ahead keeps memory flat on inputs of any size.
+            if len(pending) >= 2 * args.workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    scored += future.result()
+                logger.info(f"Scored {scored} rows, {scored / (time.perf_counter() - start):.0f} rows/s")
+            pending.add(pool.submit(
+                score_chunk, index, index * args.chunk_size, chunk, args.output, args.id_column
+            ))
+        for future in pending:
+            scored += future.result()
+
+    open(os.path.join(args.output, SUCCESS_FILE), "w").close()
+    logger.info(f"Scored {scored} rows in {time.perf_counter() - start:.1f} s, parts in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
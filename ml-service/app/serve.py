@@ -0,0 +1,175 @@
+"""
+Production entry point of ml-service.
+
+Loads the models once in a parent process, moves their weights to shared memory
+and forks N uvicorn workers that accept connections on the same socket. Every
+worker gets an explicit intra-op thread count and its own set of CPUs, so the
+workers together saturate the box without oversubscribing threads.
+
+    python serve.py --workers 4 --threads-per-worker 2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+from typing import Dict, List, Optional
+
+import config
+
+# Must be set before prometheus_client is imported, so every process records
+# its metrics in files that /metrics of any worker aggregates. A directory set
+# by the operator is left as it is; only the per-run directory created here is
+# ever removed.
+_metrics_dir: Optional[str] = None
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+else:
+    os.makedirs(config.METRICS_DIR, exist_ok=True)
+    _metrics_dir = tempfile.mkdtemp(dir=config.METRICS_DIR, prefix="run-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = _metrics_dir
+
+import torch  # noqa: E402
+import uvicorn  # noqa: E402
+from prometheus_client import multiprocess  # noqa: E402
+
+from db.database import AsyncSessionLocal, engine  # noqa: E402
+from main import app, create_model_manager  # noqa: E402
+from model_manager.model_manager import ModelManager  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve ml-service with pre-forked inference workers")
+    parser.add_argument("--host", default=config.HOST)
+    parser.add_argument("--port", type=int, default=config.PORT)
+    parser.add_argument("--workers", type=int, default=config.WORKERS)
+    parser.add_argument(
+        "--threads-per-worker", type=int, default=config.THREADS_PER_WORKER,
+        help="intra-op threads per worker, 0 splits the available CPUs evenly"
+    )
+    parser.add_argument(
+        "--no-pin-cpus", dest="pin_cpus", action="store_false", default=config.PIN_CPUS,
+        help="do not bind workers to disjoint CPU sets"
+    )
+    return parser.parse_args()
+
+
+def cpu_sets(workers: int, threads: int) -> List[List[int]]:
+    """
+    Splits the CPUs this process may run on into one disjoint set per worker.
+
+    Workers wrap around when there are fewer CPUs than ``workers * threads``.
+    """
+    cpus = sorted(os.sched_getaffinity(0))
+    return [
+        [cpus[(i * threads + j) % len(cpus)] for j in range(threads)]
+        for i in range(workers)
+    ]
+
+
+async def load_models(manager: ModelManager):
+    async with AsyncSessionLocal() as session:
+        await manager.download_models(session)
+    loaded = await manager.preload()
+    manager.share_memory()
+    # Pooled connections belong to this event loop; none may outlive it into the workers.
+    await engine.dispose()
+    logger.info(f"Loaded models {loaded} in the parent process")
+
+
+def run_worker(index: int, sock: socket.socket, manager: ModelManager, cpus: List[int], threads: int):
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already fixed by the parent; nothing to do.
+        pass
+
+    # Forget any pooled connection inherited from the parent without closing
+    # its socket, which the parent and the other workers may still share.
+    engine.sync_engine.dispose(close=False)
+    manager.reset_after_fork()
+    app.state.model_manager = manager
+    logger.info(f"Worker {index} (pid {os.getpid()}) started with {threads} threads on CPUs {cpus or 'all'}")
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def main():
+    args = parse_args()
+    available = len(os.sched_getaffinity(0))
+    threads = args.threads_per_worker or max(1, available // args.workers)
+    cpus = cpu_sets(args.workers, threads) if args.pin_cpus else [[] for _ in range(args.workers)]
+
+    # Keep the parent single-threaded: an OpenMP pool started before fork
+    # deadlocks in the children.
+    torch.set_num_threads(1)
+    manager = create_model_manager()
+    asyncio.run(load_models(manager))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(index, sock, manager, cpus[index], threads)
+            except Exception as e:
+                logger.error(f"Worker {index} crashed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(args.workers):
+        spawn(index)
+    logger.info(f"Serving on {args.host}:{args.port} with {args.workers} workers")
+
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = children.pop(pid, None)
+            # Drop the live gauges of the exited worker; its counters are kept.
+            multiprocess.mark_process_dead(pid)
+            if index is not None and not stopping:
+                logger.warning(f"Worker {index} exited with status {status}, restarting it")
+                spawn(index)
+    finally:
+        if _metrics_dir is not None:
+            shutil.rmtree(_metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Trains the cascade pre-classifier of a model offline.
+
+The texts are labelled by the transformer itself, so the linear model learns to
+imitate the model it stands in front of rather than some other ground truth.
+A held-out part of the texts is used to report, for a range of thresholds, how
+many texts the pre-classifier would answer and how often it agrees with the
+transformer on them.
+
+    python train_cascade.py comments.csv --text-column comment --output /artifacts/toxic-cascade.joblib
+
+The bundle is then set as ``ml_models.cascade_path`` together with the chosen
+``cascade_low`` / ``cascade_high`` thresholds.
+"""
+import argparse
+import csv
+import json
+import logging
+import random
+from typing import List
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline, make_union
+
+from model_manager.backends import DEFAULT_BACKEND, get_backend
+from model_manager.bucketing import bucketed_inference
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def read_texts(path: str, text_column: str) -> List[str]:
+    """
+    Reads texts from a CSV file, JSON Lines or plain text with one text per line.
+    """
+    with open(path, encoding="utf-8", newline="") as source:
+        if path.endswith(".csv"):
+            return [row[text_column] for row in csv.DictReader(source) if row.get(text_column)]
+        if path.endswith((".jsonl", ".ndjson")):
+            texts = []
+            for line in source:
+                if line.strip():
+                    value = json.loads(line)
+                    texts.append(value[text_column] if isinstance(value, dict) else value)
+            return texts
+        return [line.rstrip("\n") for line in source if line.strip()]
+
+
+def label_texts(args, texts: List[str]) -> List[str]:
+    model = get_backend(args.backend).load(args.task, args.model, args.device)
+    labels = []
+    for start in range(0, len(texts), args.chunk_size):
+        chunk = texts[start:start + args.chunk_size]
+        labels.extend(prediction["label"] for prediction in bucketed_inference(
+            model, chunk, args.batch_size, args.max_length
+        ))
+        logger.info(f"Labelled {len(labels)}/{len(texts)} texts")
+    return labels
+
+
+def build_classifier(n_features: int):
+    """
+    Hashed word unigrams/bigrams and character n-grams into a logistic regression.
+
+    Hashing keeps the bundle small and needs no vocabulary, and character n-grams
+    survive the misspellings and obfuscation typical for toxic comments.
+    """
+    return make_pipeline(
+        make_union(
+            HashingVectorizer(ngram_range=(1, 2), n_features=n_features, alternate_sign=False),
+            HashingVectorizer(analyzer="char_wb", ngram_range=(2, 5), n_features=n_features, alternate_sign=False),
+        ),
+        LogisticRegression(solver="saga", max_iter=1000, C=4.0),
+    )
+
+
+def threshold_report(probabilities: np.ndarray, expected: np.ndarray, positive: str, negative: str):
+    """
+    Returns coverage and agreement with the transformer for symmetric threshold pairs.
+    """
+    report = []
+    for margin in (0.01, 0.02, 0.05, 0.1, 0.15, 0.2, 0.3):
+        low, high = margin, 1 - margin
+        confident = (probabilities <= low) | (probabilities >= high)
+        predicted = np.where(probabilities >= high, positive, negative)
+        agreement = float((predicted[confident] == expected[confident]).mean()) if confident.any() else None
+        report.append({"low": low, "high": high, "coverage": float(confident.mean()), "agreement": agreement})
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV, JSON Lines or plain text file with the training texts")
+    parser.add_argument("--output", required=True, help="where to write the joblib bundle")
+    parser.add_argument("--text-column", default="text", help="column or field with the text in CSV/JSONL input")
+    parser.add_argument("--model", default="martin-ha/toxic-comment-model")
+    parser.add_argument("--task", default="text-classification")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--positive-label", default="toxic")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--n-features", type=int, default=2 ** 20)
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of texts used for the threshold report")
+    parser.add_argument("--limit", type=int, help="use at most this many texts")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    texts = read_texts(args.input, args.text_column)
+    random.Random(args.seed).shuffle(texts)
+    if args.limit:
+        texts = texts[:args.limit]
+    logger.info(f"Labelling {len(texts)} texts with {args.model}")
+    labels = np.array(label_texts(args, texts))
+
+    classes = sorted(set(labels))
+    if len(classes) != 2 or args.positive_label not in classes:
+        raise SystemExit(f"The transformer must assign two labels including '{args.positive_label}', got {classes}")
+    negative_label = classes[1 - classes.index(args.positive_label)]
+
+    split = int(len(texts) * (1 - args.holdout))
+    classifier = build_classifier(args.n_features)
+    classifier.fit(texts[:split], labels[:split])
+
+    report = []
+    if split < len(texts):
+        positive_index = list(classifier.classes_).index(args.positive_label)
+        probabilities = classifier.predict_proba(texts[split:])[:, positive_index]
+        report = threshold_report(probabilities, labels[split:], args.positive_label, negative_label)
+        for row in report:
+            agreement = "n/a" if row["agreement"] is None else f"{row['agreement']:.2%}"
+            logger.info(
+                f"low={row['low']:.2f} high={row['high']:.2f}: "
+                f"{row['coverage']:.1%} of texts skip the transformer, agreement {agreement}"
+            )
+
+    # Refit on everything now that the thresholds have been evaluated.
+    classifier.fit(texts, labels)
+    joblib.dump({
+        "model": classifier,
+        "positive_label": args.positive_label,
+        "source_model": args.model,
+        "thresholds": report,
+    }, args.output)
+    logger.info(f"Saved the cascade to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
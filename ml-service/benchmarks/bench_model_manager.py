@@ -0,0 +1,275 @@
+"""
+Micro-benchmarks of ModelManager.predict.
+
+Drives ModelManager directly (no HTTP, no database) with either a deterministic
+stub pipeline, whose cost only depends on the padded batch shape, or a real
+local model. Every combination of batch size, text-length distribution, device
+and thread count is a scenario; for each one the throughput, p50/p95/p99 request
+latency and peak RSS are reported. Every scenario runs in a fresh process that
+loads its own model, so its peak RSS does not carry over earlier scenarios.
+
+    python bench_model_manager.py --pipeline stub --output results.json
+    python bench_model_manager.py --pipeline local --model ./tiny-model --threads 1 4
+    python bench_model_manager.py --baseline baseline.json --tolerance 0.15
+
+With ``--baseline`` the run fails (exit code 1) when any scenario's throughput
+drops or p95 latency grows by more than the tolerance.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+# db.database reads these at import time; the benchmark never connects.
+for variable, value in (
+    ("POSTGRES_USER", "benchmark"), ("POSTGRES_PASSWORD", "benchmark"),
+    ("POSTGRES_HOST", "localhost"), ("POSTGRES_PORT", "5432"),
+):
+    os.environ.setdefault(variable, value)
+
+import torch  # noqa: E402
+
+from model_manager.model_manager import ModelManager  # noqa: E402
+from model_manager.models import ModelSpec  # noqa: E402
+
+MODEL_ID = 1
+WORDS = ["you", "are", "such", "a", "nice", "terrible", "person", "lol", "what", "ever", "idiot", "thanks"]
+
+
+class StubTokenizer:
+    def __call__(self, texts, truncation=True, max_length=512, **kwargs):
+        return {"input_ids": [text.split()[:max_length] for text in texts]}
+
+
+class StubPipeline:
+    """
+    A deterministic stand-in for a text-classification pipeline.
+
+    Every internal batch costs ``per_token_us`` per padded token, so the numbers
+    reflect scheduling, batching and padding rather than the model.
+    """
+
+    def __init__(self, per_token_us: float):
+        self.tokenizer = StubTokenizer()
+        self.model = SimpleNamespace(config=SimpleNamespace(_commit_hash="stub"))
+        self.per_token = per_token_us / 1e6
+
+    def __call__(self, texts, batch_size=1, truncation=True, max_length=512, **kwargs):
+        results = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(texts[start:start + batch_size], max_length=max_length)["input_ids"]
+            time.sleep(len(batch) * max(map(len, batch)) * self.per_token)
+            results.extend(
+                {"label": "toxic" if len(ids) % 2 else "non-toxic", "score": 0.5 + len(ids) % 50 / 100}
+                for ids in batch
+            )
+        return results
+
+
+def generate_texts(distribution: str, count: int, rng: random.Random) -> List[str]:
+    """
+    Generates unique texts with a word count drawn from the given distribution.
+    """
+    def length():
+        if distribution == "short":
+            return rng.randint(1, 12)
+        if distribution == "long":
+            return rng.randint(200, 400)
+        # "mixed": mostly short comments with a heavy tail of long pastes.
+        return min(int(rng.lognormvariate(2.5, 1.2)) + 1, 1000)
+
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(length())) + f" #{i}"
+        for i in range(count)
+    ]
+
+
+class RssSampler:
+    """Samples the resident set size in the background and keeps the peak."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current() -> int:
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            # Peak of the process in KiB on Linux, the best available without
+            # /proc; the scenario is the only thing its process ran.
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def load_model(args, device: str):
+    if args.pipeline == "stub":
+        return StubPipeline(args.per_token_us)
+    from model_manager.backends import get_backend
+
+    return get_backend(args.backend).load("text-classification", args.model, device)
+
+
+async def run_scenario(args, model, batch_size: int, distribution: str, device: str) -> Dict:
+    manager = ModelManager(
+        device=device,
+        max_batch_size=batch_size,
+        max_wait_ms=args.max_wait_ms,
+        cache_max_bytes=0,
+    )
+    manager.register_model(
+        MODEL_ID,
+        ModelSpec(type="text-classification", name=args.model, max_length=args.max_length, backend=args.backend),
+        model,
+    )
+
+    rng = random.Random(args.seed)
+    requests = [
+        generate_texts(distribution, args.texts_per_request, rng)
+        for _ in range(args.requests)
+    ]
+    await manager.predict(MODEL_ID, requests[0][:1])  # warm-up
+
+    latencies = []
+    queue = iter(requests)
+
+    async def client():
+        for texts in queue:
+            start = time.perf_counter()
+            await manager.predict(MODEL_ID, texts)
+            latencies.append(time.perf_counter() - start)
+
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    await manager.cleanup()
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "texts_per_second": args.requests * args.texts_per_request / elapsed,
+        "requests_per_second": args.requests / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "peak_rss_mb": rss.peak / 2 ** 20,
+    }
+
+
+def run_isolated(args, device: str, threads: int, batch_size: int, distribution: str) -> Dict:
+    """
+    Loads the model and runs one scenario; called in the scenario's own process.
+    """
+    torch.set_num_threads(threads)
+    model = load_model(args, device)
+    return asyncio.run(run_scenario(args, model, batch_size, distribution, device))
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """
+    Returns a description of every scenario that regressed against the baseline.
+    """
+    previous = {scenario["name"]: scenario for scenario in baseline}
+    regressions = []
+    for scenario in results:
+        before = previous.get(scenario["name"])
+        if before is None:
+            continue
+        throughput = scenario["texts_per_second"] / before["texts_per_second"] - 1
+        p95 = scenario["p95_ms"] / before["p95_ms"] - 1
+        if throughput < -tolerance:
+            regressions.append(f"{scenario['name']}: throughput {throughput:+.1%}")
+        if p95 > tolerance:
+            regressions.append(f"{scenario['name']}: p95 latency {p95:+.1%}")
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pipeline", choices=["stub", "local"], default="stub")
+    parser.add_argument("--model", default="martin-ha/toxic-comment-model", help="local path or hub name for --pipeline local")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--distributions", nargs="+", choices=["short", "long", "mixed"], default=["short", "mixed"])
+    parser.add_argument("--devices", nargs="+", default=["cpu"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[torch.get_num_threads()])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--texts-per-request", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--per-token-us", type=float, default=2.0, help="cost of the stub pipeline")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    context = multiprocessing.get_context("spawn")
+    scenarios = itertools.product(args.devices, args.threads, args.batch_sizes, args.distributions)
+    for device, threads, batch_size, distribution in scenarios:
+        name = f"{args.pipeline}/{device}/t{threads}/b{batch_size}/{distribution}"
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as process:
+            metrics = process.submit(run_isolated, args, device, threads, batch_size, distribution).result()
+        results.append({
+            "name": name,
+            "pipeline": args.pipeline,
+            "device": device,
+            "threads": threads,
+            "batch_size": batch_size,
+            "distribution": distribution,
+            **metrics,
+        })
+        print(
+            f"{name:40} {metrics['texts_per_second']:10.1f} texts/s  "
+            f"p50 {metrics['p50_ms']:8.1f} ms  p95 {metrics['p95_ms']:8.1f} ms  "
+            f"p99 {metrics['p99_ms']:8.1f} ms  rss {metrics['peak_rss_mb']:8.1f} MB"
+        )
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"scenarios": results}, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline)["scenarios"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+# db.database reads these at import time; the tests never connect.
+for variable, value in (
+    ("POSTGRES_USER", "test"), ("POSTGRES_PASSWORD", "test"),
+    ("POSTGRES_HOST", "localhost"), ("POSTGRES_PORT", "5432"),
+):
+    os.environ.setdefault(variable, value)
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from model_manager.batching import BatchScheduler, DeadlineExceededError, QueueFullError
+
+
+class Runner:
+    """Echoes its texts; while ``gate`` is cleared every batch waits for it."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = asyncio.Event()
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self, model_id, texts):
+        self.batches.append(list(texts))
+        self.started.set()
+        await self.gate.wait()
+        return [f"{model_id}:{text}" for text in texts]
+
+
+async def blocked(scheduler, runner, texts):
+    """Submits texts and returns once their batch is running, with the runner held."""
+    runner.gate.clear()
+    runner.started.clear()
+    task = asyncio.create_task(scheduler.submit(1, texts))
+    await runner.started.wait()
+    return task
+
+
+def test_slices_requests_and_keeps_their_order():
+    async def main():
+        runner = Runner()
+        scheduler = BatchScheduler(runner, max_batch_size=4, max_wait_ms=1)
+        texts = [str(i) for i in range(10)]
+        try:
+            predictions = await scheduler.submit(1, texts)
+        finally:
+            await scheduler.close()
+        assert predictions == [f"1:{text}" for text in texts]
+        assert max(len(batch) for batch in runner.batches) <= 4
+        assert [text for batch in runner.batches for text in batch] == texts
+
+    asyncio.run(main())
+
+
+def test_merges_concurrent_requests_into_one_batch():
+    async def main():
+        runner = Runner()
+        scheduler = BatchScheduler(runner, max_batch_size=8, max_wait_ms=50)
+        try:
+            results = await asyncio.gather(*(scheduler.submit(1, [str(i)]) for i in range(3)))
+        finally:
+            await scheduler.close()
+        assert results == [["1:0"], ["1:1"], ["1:2"]]
+        assert runner.batches == [["0", "1", "2"]]
+
+    asyncio.run(main())
+
+
+def test_deadline_passing_while_predicting():
+    async def main():
+        runner = Runner()
+        runner.gate.clear()
+        scheduler = BatchScheduler(runner, max_wait_ms=1)
+        loop = asyncio.get_running_loop()
+        try:
+            with pytest.raises(DeadlineExceededError):
+                await scheduler.submit(1, ["a"], deadline=loop.time() + 0.05)
+        finally:
+            await scheduler.close()
+
+    asyncio.run(main())
+
+
+def test_expired_and_cancelled_requests_never_reach_the_model():
+    async def main():
+        runner = Runner()
+        scheduler = BatchScheduler(runner, max_batch_size=1, max_wait_ms=1)
+        loop = asyncio.get_running_loop()
+        try:
+            first = await blocked(scheduler, runner, ["first"])
+            expired = asyncio.create_task(scheduler.submit(1, ["expired"], deadline=loop.time() + 0.01))
+            cancelled = asyncio.create_task(scheduler.submit(1, ["cancelled"]))
+            await asyncio.sleep(0.05)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+            runner.gate.set()
+
+            assert await first == ["1:first"]
+            with pytest.raises(DeadlineExceededError):
+                await expired
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+            assert await scheduler.submit(1, ["last"]) == ["1:last"]
+        finally:
+            await scheduler.close()
+        assert runner.batches == [["first"], ["last"]]
+
+    asyncio.run(main())
+
+
+def test_rejects_requests_beyond_the_queue_limit():
+    async def main():
+        runner = Runner()
+        scheduler = BatchScheduler(runner, max_batch_size=2, max_wait_ms=1, max_queue_texts=2)
+        try:
+            running = await blocked(scheduler, runner, ["running"])
+            queued = asyncio.create_task(scheduler.submit(1, ["a", "b"]))
+            await asyncio.sleep(0)
+            with pytest.raises(QueueFullError) as error:
+                await scheduler.submit(1, ["c"])
+            assert error.value.retry_after >= 1
+            # The bulk class has a queue of its own.
+            bulk = asyncio.create_task(scheduler.submit(1, ["d"], priority="bulk"))
+            runner.gate.set()
+            assert await asyncio.gather(running, queued, bulk) == [["1:running"], ["1:a", "1:b"], ["1:d"]]
+        finally:
+            await scheduler.close()
+
+    asyncio.run(main())
+
+
+def test_runner_errors_reach_every_caller_of_the_batch():
+    async def failing(model_id, texts):
+        raise RuntimeError("model crashed")
+
+    async def main():
+        scheduler = BatchScheduler(failing, max_wait_ms=20)
+        try:
+            results = await asyncio.gather(
+                scheduler.submit(1, ["a"]), scheduler.submit(1, ["b"]), return_exceptions=True
+            )
+        finally:
+            await scheduler.close()
+        assert [str(result) for result in results] == ["model crashed", "model crashed"]
+
+    asyncio.run(main())
+
+
+def test_priority_is_inferred_from_the_request_size():
+    scheduler = BatchScheduler(Runner(), interactive_max_texts=2)
+    assert scheduler.resolve_priority(["a", "b"]) == "interactive"
+    assert scheduler.resolve_priority(["a", "b", "c"]) == "bulk"
+    assert scheduler.resolve_priority(["a"], "bulk") == "bulk"
+    with pytest.raises(ValueError):
+        scheduler.resolve_priority(["a"], "urgent")
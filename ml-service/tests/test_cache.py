@@ -0,0 +1,71 @@
+import sys
+
+import pytest
+
+from model_manager import cache as cache_module
+from model_manager.cache import PredictionCache, normalize_text
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+def entry_size(value):
+    return cache_module._ENTRY_OVERHEAD + sys.getsizeof(value)
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PredictionCache(max_bytes=10_000, ttl_seconds=60)
+    cache.put("key", "value")
+    clock.now += 60
+    assert cache.get("key") == "value"
+    clock.now += 1
+    assert "key" not in cache
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_the_least_recently_used_entry(clock):
+    value = "x" * 10
+    cache = PredictionCache(max_bytes=2 * entry_size(value), ttl_seconds=60)
+    cache.put("a", value)
+    cache.put("b", value)
+    assert cache.get("a") == value
+    cache.put("c", value)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.stats()["size_bytes"] == 2 * entry_size(value)
+
+
+def test_skips_values_larger_than_the_budget(clock):
+    cache = PredictionCache(max_bytes=entry_size("x"), ttl_seconds=60)
+    cache.put("small", "x")
+    cache.put("large", "x" * 100)
+    assert "small" in cache
+    assert "large" not in cache
+
+
+def test_disabled_cache_stores_nothing(clock):
+    for cache in (PredictionCache(max_bytes=0, ttl_seconds=60), PredictionCache(max_bytes=10_000, ttl_seconds=0)):
+        cache.put("key", "value")
+        assert cache.get("key") is None
+
+
+def test_keys_ignore_whitespace_and_depend_on_the_revision():
+    assert normalize_text("  a\t b\n") == "a b"
+    key = PredictionCache.make_key(1, "r1", "good  movie ")
+    assert key == PredictionCache.make_key(1, "r1", "good movie")
+    assert key != PredictionCache.make_key(1, "r2", "good movie")
+    assert key != PredictionCache.make_key(2, "r1", "good movie")
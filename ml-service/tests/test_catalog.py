@@ -0,0 +1,121 @@
+import asyncio
+from decimal import Decimal
+
+from db.catalog import ModelCatalog
+from db.models import MLModel
+
+
+class Result:
+    def __init__(self, models):
+        self._models = models
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._models
+
+
+class Database:
+    """Stands in for the session factory, serving the current ``models`` rows."""
+
+    def __init__(self, *models):
+        self.models = list(models)
+        self.queries = 0
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement):
+        self.queries += 1
+        return Result([
+            MLModel(**{column.key: getattr(model, column.key) for column in MLModel.__table__.columns})
+            for model in self.models
+        ])
+
+
+def model(model_id, name, price="0.01"):
+    return MLModel(id=model_id, type="sentiment", name=name, price_per_char=Decimal(price), backend="torch")
+
+
+def catalog_of(database, **kwargs):
+    changes = []
+
+    async def on_change():
+        changes.append([m.name for m in await catalog.models()])
+
+    catalog = ModelCatalog(database, "postgresql://unused", on_change=on_change, **kwargs)
+    return catalog, changes
+
+
+def notify(catalog):
+    catalog._on_notify(None, 0, "ml_models_changed", "")
+
+
+def test_notification_reloads_the_catalog_once():
+    async def main():
+        database = Database(model(1, "first"))
+        catalog, changes = catalog_of(database)
+        await catalog.refresh()
+        assert (await catalog.get(1)).name == "first"
+
+        database.models = [model(1, "renamed"), model(2, "second")]
+        for _ in range(3):
+            notify(catalog)
+        await catalog._pending_refresh
+        assert database.queries == 2
+        assert [m.name for m in await catalog.models()] == ["renamed", "second"]
+        assert changes == [["renamed", "second"]]
+
+        # A notification about an unchanged table does not report a change.
+        notify(catalog)
+        await catalog._pending_refresh
+        assert changes == [["renamed", "second"]]
+        await catalog.close()
+
+    asyncio.run(main())
+
+
+def test_stale_catalog_and_unknown_models_trigger_a_reload():
+    async def main():
+        database = Database(model(1, "first"))
+        catalog, _ = catalog_of(database, ttl_seconds=0)
+        await catalog.refresh()
+        database.models.append(model(2, "second"))
+        assert (await catalog.get(2)).name == "second"
+        await catalog.close()
+
+        catalog, _ = catalog_of(database, ttl_seconds=60)
+        await catalog.refresh()
+        queries = database.queries
+        assert await catalog.get(1) is not None
+        assert database.queries == queries
+        catalog._loaded_at -= 2
+        assert await catalog.get(3) is None
+        assert database.queries == queries + 1
+
+    asyncio.run(main())
+
+
+def test_failed_refresh_keeps_the_previous_catalog():
+    async def main():
+        database = Database(model(1, "first"))
+        catalog, changes = catalog_of(database)
+        await catalog.refresh()
+
+        async def broken(statement):
+            raise ConnectionError("database down")
+
+        database.execute = broken
+        notify(catalog)
+        await catalog._pending_refresh
+        assert [m.name for m in await catalog.models()] == ["first"]
+        assert changes == []
+
+    asyncio.run(main())
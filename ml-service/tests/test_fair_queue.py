@@ -0,0 +1,66 @@
+import asyncio
+
+from model_manager.fair_queue import BULK, INTERACTIVE, FairQueue
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_interactive_items_run_before_bulk_ones():
+    queue = FairQueue()
+    queue.put("bulk-1", "alice", BULK, 1)
+    queue.put("bulk-2", "bob", BULK, 1)
+    queue.put("interactive", "carol", INTERACTIVE, 1)
+    assert drain(queue) == ["interactive", "bulk-1", "bulk-2"]
+
+
+def test_users_take_turns_within_a_class():
+    queue = FairQueue()
+    for i in range(3):
+        queue.put(f"alice-{i}", "alice", BULK, 1)
+    queue.put("bob-0", "bob", BULK, 1)
+    assert drain(queue) == ["alice-0", "bob-0", "alice-1", "alice-2"]
+
+
+def test_costs_and_weights_share_the_class():
+    queue = FairQueue({"alice": 2.0})
+    for i in range(4):
+        queue.put(f"alice-{i}", "alice", BULK, 1)
+    for i in range(2):
+        queue.put(f"bob-{i}", "bob", BULK, 1)
+    assert drain(queue) == ["alice-0", "alice-1", "bob-0", "alice-2", "alice-3", "bob-1"]
+
+    queue = FairQueue()
+    queue.put("big", "alice", BULK, 10)
+    queue.put("small-1", "bob", BULK, 1)
+    queue.put("small-2", "bob", BULK, 1)
+    assert drain(queue) == ["small-1", "small-2", "big"]
+
+
+def test_idle_users_start_at_the_current_clock():
+    queue = FairQueue()
+    for i in range(3):
+        queue.put(f"alice-{i}", "alice", BULK, 1)
+    assert queue.get_nowait() == "alice-0"
+    assert queue.get_nowait() == "alice-1"
+    # Bob was idle, yet gets no credit for the turns Alice already had.
+    queue.put("bob-0", "bob", BULK, 1)
+    queue.put("bob-1", "bob", BULK, 1)
+    assert drain(queue) == ["alice-2", "bob-0", "bob-1"]
+
+
+def test_get_waits_for_an_item():
+    async def main():
+        queue = FairQueue()
+        getter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        assert not getter.done()
+        queue.put("item", None, INTERACTIVE, 1)
+        assert await asyncio.wait_for(getter, 1) == "item"
+        assert len(queue) == 0
+
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+import pytest
+
+from model_manager.near_duplicates import NearDuplicateIndex, fingerprint
+
+COMMENT = "I think the answer is over here, thanks for asking"
+
+
+def indexed(*texts, max_entries=100):
+    index = NearDuplicateIndex(max_entries)
+    for i, text in enumerate(texts):
+        index.add(fingerprint(text), i)
+    return index
+
+
+@pytest.mark.parametrize("variant", [
+    COMMENT,
+    "i THINK the answer is over here!!! Thanks for asking :)",
+    "I think the answer is over here, thanks for asking https://spam.example/x @someone",
+    "I think the answer is over herr, thanks for asking",
+    "I think the answer is over heree, thanks for asking",
+    "I think the answer is over her, thanks for asking",
+    # A short inserted word can change as few shingles as one replaced character.
+    "I think the answer is not over here, thanks for asking",
+])
+def test_reuses_normalized_repeats_and_single_character_edits(variant):
+    assert indexed(COMMENT).lookup(fingerprint(variant)) == 0
+
+
+@pytest.mark.parametrize("variant", [
+    "I think the answer is over here, idiot, for asking",
+    "I think the answer is over herr, thanks for askinh",
+    "I think the answer is never here, thanks for asking",
+    "thanks for asking",
+])
+def test_rejects_larger_edits(variant):
+    assert indexed(COMMENT).lookup(fingerprint(variant)) is None
+
+
+def test_finds_every_single_character_replacement():
+    index = indexed(COMMENT)
+    normalized = fingerprint(COMMENT).text
+    for position in range(len(normalized)):
+        variant = normalized[:position] + "#" + normalized[position + 1:]
+        assert index.lookup(fingerprint(variant)) == 0, variant
+
+
+def test_prefers_the_closest_text():
+    index = indexed(COMMENT, "I think the answer is over herr, thanks for asking")
+    assert index.lookup(fingerprint("I think the answer is over herr, thanks for askin")) == 1
+
+
+def test_short_texts_are_not_fingerprinted():
+    assert fingerprint("you suck") is None
+
+
+def test_evicts_least_recently_used_text():
+    other = "Completely unrelated remark about the weather today"
+    index = indexed(COMMENT, other, max_entries=2)
+    index.lookup(fingerprint(COMMENT))
+    index.add(fingerprint("A third comment that pushes one of them out"), 2)
+
+    assert len(index) == 2
+    assert index.lookup(fingerprint(COMMENT)) == 0
+    assert index.lookup(fingerprint(other)) is None
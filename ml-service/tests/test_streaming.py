@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import pytest
+
+from api.streaming import InputLineError, parse_line, read_texts, stream_predictions
+from model_manager.batching import QueueFullError
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+def read(*parts, ndjson=True):
+    async def main():
+        return [text async for text in read_texts(chunks(*parts), ndjson)]
+
+    return asyncio.run(main())
+
+
+def test_parse_line():
+    assert parse_line('"a text"', ndjson=True) == "a text"
+    assert parse_line('{"text": "a text", "id": 3}', ndjson=True) == "a text"
+    assert parse_line('{"text": 3}', ndjson=False) == '{"text": 3}'
+    assert parse_line("  ", ndjson=True) is None
+    for line in ('{"text": 3}', '{"id": 3}', "[1]", "not json"):
+        with pytest.raises(ValueError):
+            parse_line(line, ndjson=True)
+
+
+def test_reads_lines_split_across_chunks():
+    texts = read(b'"first"\n{"te', b'xt": "sec', b'ond"}\r\n\n"th', "ird ü".encode()[:-1], "ü".encode()[1:] + b'"')
+    assert texts == ["first", "second", "third ü"]
+    assert read(b"plain\ntext\n", ndjson=False) == ["plain", "text"]
+
+
+@pytest.mark.parametrize("body, line", [
+    ([b'"a"\n\n', b'{"text": 1}\n"b"\n'], 3),
+    ([b'"a"\n"b"\n', b'"unterminated'], 3),
+    ([b"ok\n\xff\n"], 2),
+])
+def test_reports_the_number_of_a_bad_line(body, line):
+    with pytest.raises(InputLineError) as error:
+        read(*body, ndjson=not body[0].startswith(b"ok"))
+    assert error.value.line == line
+    assert str(error.value).startswith(f"Line {line}: ")
+
+
+class Manager:
+    def __init__(self, full_once=False):
+        self.chunks = []
+        self.full_once = full_once
+
+    async def predict(self, model_id, texts, user=None, priority=None):
+        if self.full_once:
+            self.full_once = False
+            raise QueueFullError(model_id, 0)
+        self.chunks.append(list(texts))
+        return [{"label": text.upper()} for text in texts]
+
+
+def stream(manager, texts, chunk_size=2):
+    async def source():
+        for text in texts:
+            if isinstance(text, Exception):
+                raise text
+            yield text
+
+    async def main():
+        return [
+            json.loads(line)
+            async for line in stream_predictions(manager, 1, source(), chunk_size)
+        ]
+
+    return asyncio.run(main())
+
+
+def test_streams_one_line_per_text_in_chunks():
+    manager = Manager(full_once=True)
+    lines = stream(manager, ["a", "b", "c", "d", "e"])
+    assert lines == [{"index": i, "label": text} for i, text in enumerate("ABCDE")]
+    assert manager.chunks == [["a", "b"], ["c", "d"], ["e"]]
+
+
+def test_a_bad_line_ends_the_stream_after_the_texts_before_it():
+    lines = stream(Manager(), ["a", "b", "c", InputLineError(4, ValueError("bad"))])
+    assert lines[:3] == [{"index": i, "label": text} for i, text in enumerate("ABC")]
+    assert lines[3] == {"error": "Line 4: bad", "line": 4}
@@ -1,49 +1,35 @@
 # billing_manager.py
+from typing import Optional
 from services.wallet_client import WalletClient
 from services.ml_client import MlClient
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from db.models import MLModel, SessionLog
+from db.catalog import ModelCatalog
 from fastapi import HTTPException
-from datetime import datetime
+from session_log import SessionEntry, SessionRecorder
 
 
 class BillingManager:
-    def __init__(self, db: AsyncSession, wallet_client: WalletClient, ml_client: MlClient):
-        self.db = db
+    def __init__(
+        self, catalog: ModelCatalog, wallet_client: WalletClient, ml_client: MlClient, sessions: SessionRecorder
+    ):
+        self.catalog = catalog
         self.wallet_client = wallet_client
         self.ml_client = ml_client
+        self.sessions = sessions
 
-    async def log_session_start(self, user_id: int, model_id: int, word_count: int) -> int:
-        session = SessionLog(
-            user_id=user_id,
-            model_id=model_id,
-            start_at=datetime.utcnow(),
-            status="started",
-            total_words_for_classification=word_count
-        )
-        self.db.add(session)
-        await self.db.flush()
-        return session.id
+    async def log_session_start(self, user_id: int, model_id: int, word_count: int) -> SessionEntry:
+        return await self.sessions.start(user_id, model_id, word_count)
     
-    async def log_session_end(self, session_id: int, status: str):
-        stmt = select(SessionLog).where(SessionLog.id == session_id)
-        result = await self.db.execute(stmt)
-        session = result.scalars().first()
-
-        if session:
-            session.end_at = datetime.utcnow()
-            session.status = status
-            await self.db.commit()
+    async def log_session_end(self, session: SessionEntry, status: str):
+        await self.sessions.end(session, status)
 
     async def calculate_cost(self, data: list[str], model_id: int) -> float:
         """
         Рассчитывает стоимость на основе количества символов и цены модели.
+
+        Цена берётся из каталога моделей в памяти, без запроса к базе.
         """
         try:
-            stmt = select(MLModel).where(MLModel.id == model_id)
-            result = await self.db.execute(stmt)
-            model = result.scalars().first()
+            model = await self.catalog.get(model_id)
 
             if not model:
                 raise HTTPException(status_code=404, detail="Модель не найдена")
@@ -52,31 +38,35 @@ class BillingManager:
             cost = total_chars * float(model.price_per_char)
             return round(cost, 4)
 
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Ошибка расчёта стоимости: {e}")
 
-    async def make_payment(self, user_id: int, amount: float) -> None:
+    async def make_payment(self, token: str, user_id: int, amount: float) -> Optional[int]:
         """
-        Проверяет баланс и списывает средства через topup с отрицательной суммой.
+        Списывает средства одним запросом к кошельку и возвращает id списания.
+
+        Если средств не хватает, кошелёк ничего не списывает и возвращается 400.
+        При нулевой стоимости ничего не списывается и возвращается None.
         """
+        if amount <= 0:
+            return None
         try:
-            balance = await self.wallet_client.check_balance(user_id)
-            if balance < amount:
-                raise HTTPException(status_code=400, detail="Недостаточно средств")
-            
-            # Списываем через пополнение с отрицательной суммой
-            await self.wallet_client.topup(user_id, -amount)
+            return await self.wallet_client.debit(token, user_id, amount)
 
         except HTTPException:
             raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Ошибка при списании средств: {e}")
 
-    async def refund(self, user_id: int, amount: float) -> None:
+    async def refund(self, token: str, user_id: int, debit_id: Optional[int]) -> None:
         """
-        Возвращает деньги пользователю через пополнение.
+        Возвращает пользователю деньги списания debit_id.
         """
+        if debit_id is None:
+            return
         try:
-            await self.wallet_client.topup(user_id, amount)
+            await self.wallet_client.refund(token, user_id, debit_id)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Ошибка при возврате средств: {e}")
\ No newline at end of file
@@ -0,0 +1,32 @@
+import os
+
+# Адреса сервисов, к которым ходит transaction-service.
+ML_SERVICE_URL = os.environ.get("ML_SERVICE_URL", "http://ml-service:8001")
+WALLET_SERVICE_URL = os.environ.get("WALLET_SERVICE_URL", "http://wallet-service:8002")
+
+# Пул соединений: на каждый сервис один httpx.AsyncClient на всё время жизни
+# приложения, не больше HTTP_MAX_CONNECTIONS соединений, из них до
+# HTTP_MAX_KEEPALIVE держатся открытыми HTTP_KEEPALIVE_EXPIRY секунд.
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP2 = os.environ.get("HTTP2", "false").lower() in ("1", "true", "yes")
+
+# Таймауты в секундах: на установку соединения и на ответ кошелька и ml-service.
+# ML_TIMEOUT также передаётся ml-service как дедлайн запроса.
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 2))
+WALLET_TIMEOUT = float(os.environ.get("WALLET_TIMEOUT", 5))
+ML_TIMEOUT = float(os.environ.get("ML_TIMEOUT", 60))
+
+# Каталог моделей держится в памяти и перечитывается по уведомлениям Postgres;
+# если уведомление не пришло — не позже чем через CATALOG_TTL_SECONDS секунд.
+CATALOG_TTL_SECONDS = float(os.environ.get("CATALOG_TTL_SECONDS", 60))
+
+# Журнал сессий анализа. По умолчанию старт и завершение сессии — по одному
+# запросу к базе; с SESSION_LOG_WRITE_BEHIND завершённые сессии копятся в
+# очереди (до SESSION_LOG_MAX_PENDING) и вставляются пачками до
+# SESSION_LOG_BATCH_SIZE строк не реже раза в SESSION_LOG_FLUSH_MS миллисекунд.
+SESSION_LOG_WRITE_BEHIND = os.environ.get("SESSION_LOG_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+SESSION_LOG_BATCH_SIZE = int(os.environ.get("SESSION_LOG_BATCH_SIZE", 500))
+SESSION_LOG_FLUSH_MS = float(os.environ.get("SESSION_LOG_FLUSH_MS", 200))
+SESSION_LOG_MAX_PENDING = int(os.environ.get("SESSION_LOG_MAX_PENDING", 10000))
@@ -0,0 +1,175 @@
+# This module is duplicated verbatim in ml-service/app/db/catalog.py and
+# transaction-service/app/db/catalog.py, because each service image ships only
+# its own app directory. Keep the two copies identical; db.models.MLModel of
+# either service works with it.
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import asyncpg
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import MLModel
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel notified whenever ml_models changes, by the trigger of
+# init.sql and by notify_catalog_changed().
+CATALOG_CHANNEL = "ml_models_changed"
+# Delay before reconnecting the listener after its connection was lost.
+LISTEN_RETRY_SECONDS = 5
+# An unknown model triggers a refresh at most this often.
+MISS_REFRESH_SECONDS = 1
+
+
+async def notify_catalog_changed(db: AsyncSession):
+    """
+    Tells every catalog listening on Postgres that ``ml_models`` changed.
+
+    The notification is delivered when the session's transaction commits, so
+    listeners never see it before the change itself. Databases created from
+    init.sql notify through a trigger as well; Postgres folds identical
+    notifications of one transaction into one.
+    """
+    await db.execute(text("SELECT pg_notify(:channel, '')"), {"channel": CATALOG_CHANNEL})
+
+
+class ModelCatalog:
+    """
+    An in-memory copy of the ``ml_models`` table.
+
+    The catalog is loaded at startup and reloaded whenever a notification arrives
+    on ``CATALOG_CHANNEL``, which a dedicated asyncpg connection listens to. If
+    that connection is down, or a notification is missed, the copy is still
+    reloaded once it is older than ``ttl_seconds``. ``on_change`` is awaited
+    after every reload that changed the catalog.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        dsn: str,
+        ttl_seconds: float = 60,
+        on_change: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self._session_factory = session_factory
+        self.dsn = dsn
+        self.ttl_seconds = ttl_seconds
+        self._on_change = on_change
+        self._models: Dict[int, MLModel] = {}
+        self._signature = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+        self._pending_refresh: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """
+        Loads the catalog and starts listening for changes.
+
+        A failed initial load is logged; the next lookup retries it.
+        """
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Model catalog loading failed: {e}")
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        for task in (self._listener, self._pending_refresh):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *(task for task in (self._listener, self._pending_refresh) if task is not None),
+            return_exceptions=True
+        )
+        self._listener = self._pending_refresh = None
+
+    async def refresh(self, max_age: Optional[float] = None):
+        """
+        Reloads the catalog from the database.
+
+        With ``max_age`` the reload is skipped if the catalog was reloaded that
+        recently, e.g. by a concurrent caller that held the lock first.
+        """
+        changed = False
+        async with self._lock:
+            if max_age is not None and self._age() <= max_age:
+                return
+            async with self._session_factory() as session:
+                result = await session.execute(select(MLModel).order_by(MLModel.id))
+                models = {model.id: model for model in result.scalars().all()}
+            signature = [
+                tuple(getattr(model, column.key) for column in MLModel.__table__.columns)
+                for model in models.values()
+            ]
+            changed = self._loaded_at is not None and signature != self._signature
+            self._models = models
+            self._signature = signature
+            self._loaded_at = time.monotonic()
+        if changed and self._on_change is not None:
+            try:
+                await self._on_change()
+            except Exception as e:
+                logger.error(f"Applying a model catalog change failed: {e}")
+
+    def _age(self) -> float:
+        return float("inf") if self._loaded_at is None else time.monotonic() - self._loaded_at
+
+    async def _ensure_fresh(self):
+        if self._age() > self.ttl_seconds:
+            await self.refresh(max_age=self.ttl_seconds)
+
+    async def models(self) -> List[MLModel]:
+        """Returns all models of the catalog, ordered by ID."""
+        await self._ensure_fresh()
+        return list(self._models.values())
+
+    async def get(self, model_id: int) -> Optional[MLModel]:
+        """
+        Returns a model of the catalog, or None if there is no such model.
+
+        An unknown ID reloads the catalog first, in case the notification about
+        the new model has not arrived yet.
+        """
+        await self._ensure_fresh()
+        model = self._models.get(model_id)
+        if model is None and self._age() > MISS_REFRESH_SECONDS:
+            await self.refresh(max_age=MISS_REFRESH_SECONDS)
+            model = self._models.get(model_id)
+        return model
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        # Several notifications arriving at once are served by one reload.
+        if self._pending_refresh is None or self._pending_refresh.done():
+            self._pending_refresh = asyncio.create_task(self._refresh_logged())
+
+    async def _refresh_logged(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Model catalog refresh failed: {e}")
+
+    async def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(CATALOG_CHANNEL, self._on_notify)
+                # Changes made while nobody was listening.
+                if self._loaded_at is not None:
+                    await self._refresh_logged()
+                await lost.wait()
+                logger.warning("Model catalog listener lost its connection")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Model catalog listener failed: {e}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(LISTEN_RETRY_SECONDS)
@@ -8,6 +8,8 @@ host = os.environ['POSTGRES_HOST']
 port = os.environ['POSTGRES_PORT']
 
 SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{username}:{password}@{host}:{port}/postgres"
+# DSN для asyncpg напрямую, мимо SQLAlchemy (LISTEN/NOTIFY).
+DATABASE_DSN = f"postgresql://{username}:{password}@{host}:{port}/postgres"
 
 engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
@@ -15,4 +17,7 @@ Base = declarative_base()
 
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+# Одиночные операторы без BEGIN/COMMIT: каждый уходит в базу одним запросом.
+autocommit_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
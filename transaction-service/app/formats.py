@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+from typing import Iterator, List
+from fastapi import HTTPException
+from services.ml_client import Predictions
+
+CSV_MEDIA_TYPE = "text/csv"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Принимаемые типы из Accept и формат, в котором отдаётся результат.
+MEDIA_TYPES = {
+    CSV_MEDIA_TYPE: "csv",
+    "text/*": "csv",
+    "*/*": "csv",
+    NDJSON_MEDIA_TYPE: "jsonl",
+    "application/jsonl": "jsonl",
+    "application/x-jsonlines": "jsonl",
+    PARQUET_MEDIA_TYPE: "parquet",
+    "application/x-parquet": "parquet",
+}
+FORMATS = {
+    "csv": (CSV_MEDIA_TYPE, "analysis_results.csv"),
+    "jsonl": (NDJSON_MEDIA_TYPE, "analysis_results.jsonl"),
+    "parquet": (PARQUET_MEDIA_TYPE, "analysis_results.parquet"),
+}
+
+# Сколько байт набирать перед отправкой очередного куска ответа.
+CHUNK_BYTES = 64 * 1024
+
+
+def negotiate_format(accept: str) -> str:
+    """
+    Выбрать формат ответа по заголовку Accept с учётом q-значений.
+
+    Без заголовка отдаётся CSV; если ни один из типов не поддерживается — 406.
+    """
+    if not accept.strip():
+        return "csv"
+    candidates = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0 and media_type.lower() in MEDIA_TYPES:
+            candidates.append((-quality, position, MEDIA_TYPES[media_type.lower()]))
+    if not candidates:
+        raise HTTPException(
+            status_code=406,
+            detail=f"Поддерживаемые форматы: {CSV_MEDIA_TYPE}, {NDJSON_MEDIA_TYPE}, {PARQUET_MEDIA_TYPE}"
+        )
+    return min(candidates)[2]
+
+
+def stream_csv(texts: List[str], predictions: Predictions) -> Iterator[bytes]:
+    """Сериализовать результат в CSV построчно, отдавая его кусками."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["texts", "label", "score"])
+    for text, (label, score) in zip(texts, predictions.rows()):
+        writer.writerow([text, label, score])
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def stream_jsonl(texts: List[str], predictions: Predictions) -> Iterator[bytes]:
+    """Сериализовать результат в JSON Lines построчно, отдавая его кусками."""
+    lines = []
+    size = 0
+    for text, (label, score) in zip(texts, predictions.rows()):
+        # str() даёт кратчайшую запись float32, как и в CSV.
+        line = json.dumps({"texts": text, "label": label, "score": float(str(score))}, ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(lines).encode()
+            lines.clear()
+            size = 0
+    yield "".join(lines).encode()
+
+
+def parquet_bytes(texts: List[str], predictions: Predictions) -> bytes:
+    """
+    Собрать результат в Parquet.
+
+    Parquet пишет метаданные в конце файла, поэтому построчно его не отдать;
+    файл собирается в памяти, без временных файлов на диске.
+    """
+    df = predictions.to_frame()
+    df.insert(0, "texts", texts)
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
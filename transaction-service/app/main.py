@@ -1,26 +1,73 @@
-from fastapi import FastAPI, Depends, HTTPException, APIRouter
-import tempfile
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Depends, HTTPException, APIRouter, Request
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from services.wallet_client import WalletClient
 from services.ml_client import MlClient
+from services.http import create_client
 from ml import PredictionService
 from billing import BillingManager
 import logging
 from datetime import datetime
 import os
 from auth import get_current_user, oauth2_scheme
-from db.database import get_db
+from db.catalog import ModelCatalog
+from db.database import AsyncSessionLocal, DATABASE_DSN, autocommit_engine, get_db
 from db.models import SessionLog, MLModel
 from schemas import AnalyzeRequest, HistoryItem
+from session_log import BufferedSessionRecorder, SessionRecorder
 from sqlalchemy import select
-import pandas as pd
+import formats
+import config
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Один пул соединений на каждый сервис на всё время жизни приложения.
+    ml_http = create_client(config.ML_SERVICE_URL, config.ML_TIMEOUT)
+    wallet_http = create_client(config.WALLET_SERVICE_URL, config.WALLET_TIMEOUT)
+    app.state.ml_client = MlClient(ml_http, request_timeout=config.ML_TIMEOUT)
+    app.state.wallet_client = WalletClient(wallet_http)
+    if config.SESSION_LOG_WRITE_BEHIND:
+        app.state.sessions = BufferedSessionRecorder(
+            autocommit_engine,
+            max_batch=config.SESSION_LOG_BATCH_SIZE,
+            flush_interval=config.SESSION_LOG_FLUSH_MS / 1000,
+            max_pending=config.SESSION_LOG_MAX_PENDING,
+        )
+    else:
+        app.state.sessions = SessionRecorder(autocommit_engine)
+    app.state.catalog = ModelCatalog(AsyncSessionLocal, DATABASE_DSN, config.CATALOG_TTL_SECONDS)
+    await app.state.catalog.start()
+    try:
+        yield
+    finally:
+        await app.state.catalog.close()
+        await app.state.sessions.close()
+        await ml_http.aclose()
+        await wallet_http.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+
+def get_ml_client(request: Request) -> MlClient:
+    return request.app.state.ml_client
+
+
+def get_wallet_client(request: Request) -> WalletClient:
+    return request.app.state.wallet_client
+
+
+def get_sessions(request: Request) -> SessionRecorder:
+    return request.app.state.sessions
+
+
+def get_catalog(request: Request) -> ModelCatalog:
+    return request.app.state.catalog
 
 @app.get("/history", response_model=list[HistoryItem])
 async def get_history(
@@ -60,45 +107,38 @@ async def get_history(
 @app.post("/analyze")
 async def analyze_text(
     request: AnalyzeRequest,
+    http_request: Request,
     user: dict = Depends(get_current_user),
     token = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
+    catalog: ModelCatalog = Depends(get_catalog),
+    wallet_client: WalletClient = Depends(get_wallet_client),
+    ml_client: MlClient = Depends(get_ml_client),
+    sessions: SessionRecorder = Depends(get_sessions)
 ):
     
     # Используем существующую логику анализа
     texts, model_id = request.texts, request.model_id
     user_id = int(user.get("sub"))
+    # Формат выбираем до оплаты, чтобы не списывать деньги за ответ, который нельзя отдать.
+    output_format = formats.negotiate_format(http_request.headers.get("accept", ""))
     
-    wallet_client = WalletClient(token=token)
-    ml_client = MlClient(token=token)
-    prediction_service = PredictionService(db, wallet_client, ml_client)
+    prediction_service = PredictionService(catalog, wallet_client, ml_client, sessions)
 
     try:
-        result = await prediction_service.analyze_text(texts, model_id, user_id)
-
-        filtered_result = [
-            {
-                "texts": text,
-                "label": prediction.get("label", "Unknown"),
-                "score": prediction.get("score", 0.0)
-            }
-            for text, prediction in zip(texts, result["result"])
-        ]
-        
-        df = pd.DataFrame(filtered_result)
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
-            file_path = tmp.name
-            df.to_csv(file_path, index=False)
-            
-            return FileResponse(
-                file_path,
-                media_type="text/csv",
-                filename="analysis_results.csv",
-                headers={"Content-Disposition": "attachment; filename=analysis_results.csv"}
+        result = await prediction_service.analyze_text(texts, model_id, user_id, token)
+        predictions = result["result"]
+        media_type, filename = formats.FORMATS[output_format]
+        headers = {"Content-Disposition": f"attachment; filename={filename}"}
+
+        if output_format == "parquet":
+            return Response(
+                formats.parquet_bytes(texts, predictions), media_type=media_type, headers=headers
             )
+        stream = formats.stream_csv if output_format == "csv" else formats.stream_jsonl
+        return StreamingResponse(stream(texts, predictions), media_type=media_type, headers=headers)
 
-            
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,23 +1,72 @@
+import asyncio
+import logging
+from typing import Optional
 from fastapi import HTTPException
 from billing import BillingManager
 
+logger = logging.getLogger(__name__)
+
 class PredictionService:
-    def __init__(self, db, wallet_client, ml_client):
-        self.db = db
-        self.billing = BillingManager(db, wallet_client, ml_client)
+    def __init__(self, catalog, wallet_client, ml_client, sessions):
+        self.billing = BillingManager(catalog, wallet_client, ml_client, sessions)
         self.ml_client = ml_client
 
-    async def analyze_text(self, texts: list[str], model_id: int, user_id: int):
+    async def analyze_text(self, texts: list[str], model_id: int, user_id: int, token: str):
+        """
+        Проанализировать тексты и списать за них деньги.
+
+        Старт сессии пишется параллельно с расчётом стоимости (по каталогу
+        моделей в памяти) и списанием. Предикт запускается только после
+        успешного списания, так что неизвестная модель или пустой кошелёк
+        не тратят инференс; если не удался предикт, деньги возвращаются.
+        Ошибки журнала сессий и возврата только логируются: клиент получает
+        результат оплаченного предикта или исходную ошибку предикта.
+        """
         char_count = sum(len(text) for text in texts)
-        cost = await self.billing.calculate_cost(texts, model_id)
-        session_id = await self.billing.log_session_start(user_id, model_id, char_count)
+        session_start = asyncio.ensure_future(self.billing.log_session_start(user_id, model_id, char_count))
+
+        try:
+            cost = await self.billing.calculate_cost(texts, model_id)
+            debit_id = await self.billing.make_payment(token, user_id, cost)
+        except BaseException as e:
+            await self._end_session(session_start, "failed")
+            raise self._analysis_error(e)
 
         try:
-            await self.billing.make_payment(user_id, cost)
-            result = await self.ml_client.predict(model_id, texts)
-            await self.billing.log_session_end(session_id, "completed")
-            return {"texts": texts, "result": result, "cost": cost}
+            result = await self.ml_client.predict(token, model_id, texts)
+        except BaseException as e:
+            await self._refund(token, user_id, model_id, cost, debit_id)
+            await self._end_session(session_start, "failed")
+            raise self._analysis_error(e)
+
+        await self._end_session(session_start, "completed")
+        return {"texts": texts, "result": result, "cost": cost}
 
+    async def _refund(self, token: str, user_id: int, model_id: int, cost: float, debit_id: Optional[int]):
+        try:
+            await self.billing.refund(token, user_id, debit_id)
         except Exception as e:
-            await self.billing.log_session_end(session_id, "failed")
-            raise HTTPException(status_code=500, detail=f"Ошибка анализа: {e}")
\ No newline at end of file
+            # Деньги остались списанными: запись нужна для ручной сверки.
+            logger.error(
+                f"Не удалось вернуть средства: user_id={user_id}, model_id={model_id}, amount={cost}, "
+                f"debit_id={debit_id}: {e!r}"
+            )
+
+    async def _end_session(self, session_start: asyncio.Future, status: str):
+        try:
+            session = await session_start
+        except Exception:
+            # Старт сессии не записался — завершать нечего.
+            return
+        try:
+            await self.billing.log_session_end(session, status)
+        except Exception as e:
+            # Сбой журнала не должен ронять уже оплаченный запрос.
+            logger.error(f"Не удалось записать завершение сессии {session} ({status}): {e!r}")
+
+    @staticmethod
+    def _analysis_error(error: BaseException) -> BaseException:
+        # HTTP-ошибки кошелька и ml-service и отмена запроса пробрасываются как есть.
+        if isinstance(error, HTTPException) or not isinstance(error, Exception):
+            return error
+        return HTTPException(status_code=500, detail=f"Ошибка анализа: {error}")
@@ -0,0 +1,25 @@
+import httpx
+import config
+
+
+def create_client(base_url: str, timeout: float) -> httpx.AsyncClient:
+    """
+    Создать общий клиент для одного сервиса с пулом keep-alive соединений.
+
+    Клиент создаётся один раз при старте приложения и закрывается при остановке,
+    поэтому запросы переиспользуют уже открытые соединения.
+    """
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=config.HTTP2,
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(timeout, connect=config.HTTP_CONNECT_TIMEOUT),
+    )
+
+
+def auth_headers(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
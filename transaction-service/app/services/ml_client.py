@@ -1,31 +1,104 @@
 # ml_client_service.py
 import httpx
+import msgpack
+import numpy as np
 from fastapi import HTTPException
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from services.http import auth_headers
 
-ML_SERVICE_URL = "http://ml-service:8001"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
 
 class MlClient:
-    def __init__(self, token: str):
-        self.token = token
-        self.headers = {"Authorization": f"Bearer {token}"}
+    """
+    Клиент ml-service поверх общего httpx.AsyncClient приложения.
 
-    async def get_models(self) -> List[Dict[str, Any]]:
+    Токен пользователя передаётся в каждый вызов, поэтому один экземпляр
+    обслуживает все запросы.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, request_timeout: Optional[float] = None):
+        self.client = client
+        self.request_timeout = request_timeout
+
+    async def get_models(self, token: str) -> List[Dict[str, Any]]:
         """Получить список доступных моделей"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{ML_SERVICE_URL}/models", headers=self.headers)
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Ошибка при получении списка моделей")
-            return response.json()
-
-    async def predict(self, model_id: int, texts: List[str]) -> List[Dict]:
-        """Выполнить предикт через указанную модель"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{ML_SERVICE_URL}/predict/{model_id}",
-                json={"texts": texts},
-                headers=self.headers
-            )
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Ошибка при выполнении предикта")
-            return response.json()["result"]
\ No newline at end of file
+        response = await self.client.get("/models", headers=auth_headers(token))
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Ошибка при получении списка моделей")
+        return response.json()
+
+    async def predict(self, token: str, model_id: int, texts: List[str]) -> "Predictions":
+        """
+        Выполнить предикт через указанную модель.
+
+        Запрос и ответ передаются в msgpack: метки приходят словарём и массивом
+        uint16-идентификаторов, оценки — массивом float32, и читаются как есть,
+        без разбора JSON по каждому тексту.
+        Возвращает предсказания в порядке texts.
+        Если задан request_timeout, ml-service получает его как дедлайн и не
+        тратит модель на запрос, который клиент уже перестал ждать.
+        """
+        headers = {
+            **auth_headers(token),
+            "Content-Type": MSGPACK_MEDIA_TYPE,
+            "Accept": f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.5",
+        }
+        if self.request_timeout:
+            headers["X-Request-Timeout"] = str(self.request_timeout)
+        response = await self.client.post(
+            f"/predict/{model_id}",
+            content=msgpack.packb({"texts": texts}, use_bin_type=True),
+            headers=headers
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Ошибка при выполнении предикта")
+        if not response.headers.get("content-type", "").startswith(MSGPACK_MEDIA_TYPE):
+            # ml-service без поддержки msgpack отвечает JSON.
+            return Predictions.from_items(response.json()["result"])
+        return Predictions.from_columns(msgpack.unpackb(response.content, raw=False)["result"])
+
+
+class Predictions:
+    """
+    Предсказания в колоночном виде: различные метки, номер метки и оценка
+    float32 для каждого текста.
+    """
+
+    def __init__(self, labels: List[str], label_ids: np.ndarray, scores: np.ndarray):
+        self.labels = labels
+        self.label_ids = label_ids
+        self.scores = scores
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Any]) -> "Predictions":
+        """Прочитать колоночный msgpack-ответ ml-service без копирования массивов."""
+        return cls(
+            columns["labels"],
+            np.frombuffer(columns["label_ids"], dtype="<u2"),
+            np.frombuffer(columns["scores"], dtype="<f4"),
+        )
+
+    @classmethod
+    def from_items(cls, items: List[Dict[str, Any]]) -> "Predictions":
+        """Собрать предсказания из JSON-ответа вида [{label, score}, ...]."""
+        labels: Dict[str, int] = {}
+        label_ids = np.array([labels.setdefault(item["label"], len(labels)) for item in items], dtype="<u2")
+        scores = np.array([item["score"] for item in items], dtype="<f4")
+        return cls(list(labels), label_ids, scores)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def rows(self) -> Iterator[Tuple[str, np.float32]]:
+        """Пары (метка, оценка) по текстам."""
+        labels = self.labels
+        return zip((labels[i] for i in self.label_ids), self.scores)
+
+    def to_frame(self):
+        """DataFrame с колонками label и score; pandas импортируется только здесь."""
+        import pandas as pd
+
+        return pd.DataFrame({
+            "label": pd.Categorical.from_codes(self.label_ids.astype(np.int32), categories=self.labels),
+            "score": self.scores,
+        })
\ No newline at end of file
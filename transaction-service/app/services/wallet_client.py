@@ -1,28 +1,72 @@
 import httpx
 from fastapi import HTTPException
 from typing import Dict, Any
+from services.http import auth_headers
+
+# detail, с которым wallet-service отказывает в списании при нехватке средств.
+INSUFFICIENT_FUNDS = "Insufficient funds"
 
-WALLET_SERVICE_URL = "http://wallet-service:8002/wallet"
 
 class WalletClient:
-    def __init__(self, token: str):
-        self.token = token
-        self.headers = {"Authorization": f"Bearer {token}"}
-
-    async def check_balance(self, user_id: int) -> float:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{WALLET_SERVICE_URL}/{user_id}", headers=self.headers)
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Ошибка кошелька")
-            return response.json()["balance"]
-
-    async def topup(self, user_id: int, amount: float) -> Dict[str, Any]:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{WALLET_SERVICE_URL}/{user_id}/topup",
-                json={"amount": amount},
-                headers=self.headers
-            )
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Ошибка списания")
-            return response.json()
\ No newline at end of file
+    """
+    Клиент wallet-service поверх общего httpx.AsyncClient приложения.
+
+    Токен пользователя передаётся в каждый вызов, поэтому один экземпляр
+    обслуживает все запросы.
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+
+    async def check_balance(self, token: str, user_id: int) -> float:
+        response = await self.client.get(f"/wallet/{user_id}", headers=auth_headers(token))
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Ошибка кошелька")
+        return response.json()["balance"]
+
+    async def topup(self, token: str, user_id: int, amount: float) -> Dict[str, Any]:
+        response = await self.client.post(
+            f"/wallet/{user_id}/topup",
+            json={"amount": amount},
+            headers=auth_headers(token)
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Ошибка списания")
+        return response.json()
+
+    async def debit(self, token: str, user_id: int, amount: float) -> int:
+        """
+        Списать amount одним запросом и вернуть id списания для возврата.
+
+        Проверка баланса и списание — один условный UPDATE в wallet-service,
+        поэтому параллельные списания не уводят баланс в минус.
+        """
+        response = await self.client.post(
+            f"/wallet/{user_id}/debit",
+            json={"amount": amount},
+            headers=auth_headers(token)
+        )
+        if response.status_code == 400 and _detail(response) == INSUFFICIENT_FUNDS:
+            raise HTTPException(status_code=400, detail="Недостаточно средств")
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Ошибка списания")
+        return response.json()["debit_id"]
+
+    async def refund(self, token: str, user_id: int, debit_id: int) -> float:
+        """Вернуть списание debit_id (не больше одного раза) и вернуть новый баланс."""
+        response = await self.client.post(
+            f"/wallet/{user_id}/refund",
+            json={"debit_id": debit_id},
+            headers=auth_headers(token)
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Ошибка возврата средств")
+        return response.json()["balance"]
+
+
+def _detail(response: httpx.Response):
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body.get("detail") if isinstance(body, dict) else None
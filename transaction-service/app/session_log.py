@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from db.models import SessionLog
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionEntry:
+    user_id: int
+    model_id: int
+    char_count: int
+    start_at: datetime
+    id: Optional[int] = None
+
+
+class SessionRecorder:
+    """
+    Пишет сессии анализа напрямую в базу.
+
+    Старт сессии — один INSERT ... RETURNING, завершение — один UPDATE по id,
+    оба вне транзакции запроса, так что соединение не держится на время анализа.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+
+    async def start(self, user_id: int, model_id: int, char_count: int) -> SessionEntry:
+        entry = SessionEntry(user_id, model_id, char_count, datetime.utcnow())
+        stmt = insert(SessionLog).values(
+            user_id=user_id,
+            model_id=model_id,
+            start_at=entry.start_at,
+            status="started",
+            total_words_for_classification=char_count
+        ).returning(SessionLog.id)
+        async with self.engine.connect() as conn:
+            entry.id = (await conn.execute(stmt)).scalar_one()
+        return entry
+
+    async def end(self, entry: SessionEntry, status: str):
+        stmt = update(SessionLog).where(SessionLog.id == entry.id).values(end_at=datetime.utcnow(), status=status)
+        async with self.engine.connect() as conn:
+            await conn.execute(stmt)
+
+    async def close(self):
+        pass
+
+
+class BufferedSessionRecorder(SessionRecorder):
+    """
+    Пишет сессии в базу с отложенной записью (write-behind).
+
+    Старт сессии в базу не ходит: завершённая сессия целиком ставится в очередь,
+    а фоновая задача вставляет накопившиеся строки одним многострочным INSERT
+    раз в flush_interval секунд или по набору max_batch строк. Пока сессия
+    не завершена и не записана, в истории её не видно. При переполнении очереди
+    запросы ждут, пока писатель её разгрузит.
+    """
+
+    def __init__(
+        self, engine: AsyncEngine, max_batch: int = 500, flush_interval: float = 0.2, max_pending: int = 10000
+    ):
+        super().__init__(engine)
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._writer: Optional[asyncio.Task] = None
+
+    async def start(self, user_id: int, model_id: int, char_count: int) -> SessionEntry:
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+        return SessionEntry(user_id, model_id, char_count, datetime.utcnow())
+
+    async def end(self, entry: SessionEntry, status: str):
+        await self._queue.put({
+            "user_id": entry.user_id,
+            "model_id": entry.model_id,
+            "start_at": entry.start_at,
+            "end_at": datetime.utcnow(),
+            "status": status,
+            "total_words_for_classification": entry.char_count,
+        })
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            rows = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(rows) < self.max_batch and rows[-1] is not None:
+                if not self._queue.empty():
+                    rows.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            if rows[-1] is None:
+                # close() просит дописать очередь и завершиться.
+                rows.pop()
+                stopping = self._queue.empty()
+            if rows:
+                await self._write(rows)
+
+    async def _write(self, rows: List[dict]):
+        try:
+            async with self.engine.connect() as conn:
+                await conn.execute(insert(SessionLog).values(rows))
+        except Exception as e:
+            logger.error(f"Не удалось записать {len(rows)} сессий: {e}")
+
+    async def close(self):
+        """Записать всё, что осталось в очереди, и остановить писателя."""
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
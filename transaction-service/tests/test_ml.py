@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from ml import PredictionService
+
+
+class Catalog:
+    async def get(self, model_id):
+        return SimpleNamespace(id=model_id, name="model", price_per_char=0.5) if model_id == 1 else None
+
+
+class Wallet:
+    def __init__(self, balance=10.0, refund_error=None):
+        self.balance = balance
+        self.refund_error = refund_error
+        self.calls = []
+
+    async def debit(self, token, user_id, amount):
+        self.calls.append(("debit", amount))
+        if amount > self.balance:
+            raise HTTPException(status_code=400, detail="Insufficient funds")
+        self.balance -= amount
+        return 42
+
+    async def refund(self, token, user_id, debit_id):
+        self.calls.append(("refund", debit_id))
+        if self.refund_error is not None:
+            raise self.refund_error
+
+
+class Ml:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    async def predict(self, token, model_id, texts):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return [{"label": "positive"} for _ in texts]
+
+
+class Sessions:
+    def __init__(self, end_error=None):
+        self.end_error = end_error
+        self.ended = []
+
+    async def start(self, user_id, model_id, char_count):
+        return "session"
+
+    async def end(self, session, status):
+        self.ended.append(status)
+        if self.end_error is not None:
+            raise self.end_error
+
+
+def analyze(wallet, ml, sessions, model_id=1, texts=("abcd",)):
+    service = PredictionService(Catalog(), wallet, ml, sessions)
+    return asyncio.run(service.analyze_text(list(texts), model_id, 7, "token"))
+
+
+def test_paid_prediction():
+    wallet, sessions = Wallet(), Sessions()
+    result = analyze(wallet, Ml(), sessions)
+    assert result["cost"] == 2.0
+    assert wallet.calls == [("debit", 2.0)]
+    assert sessions.ended == ["completed"]
+
+
+def test_failed_prediction_refunds_the_debit_and_raises_its_error():
+    wallet, sessions = Wallet(), Sessions()
+    with pytest.raises(HTTPException) as error:
+        analyze(wallet, Ml(HTTPException(status_code=504, detail="timeout")), sessions)
+    assert (error.value.status_code, error.value.detail) == (504, "timeout")
+    assert wallet.calls == [("debit", 2.0), ("refund", 42)]
+    assert sessions.ended == ["failed"]
+
+
+def test_failed_refund_is_logged_and_the_prediction_error_raised(caplog):
+    wallet = Wallet(refund_error=HTTPException(status_code=502, detail="wallet down"))
+    with caplog.at_level(logging.ERROR, logger="ml"), pytest.raises(HTTPException) as error:
+        analyze(wallet, Ml(RuntimeError("CUDA out of memory")), Sessions())
+    assert error.value.status_code == 500
+    assert "CUDA out of memory" in error.value.detail
+    assert wallet.calls[-1] == ("refund", 42)
+    [record] = caplog.records
+    assert all(part in record.getMessage() for part in ("user_id=7", "model_id=1", "amount=2.0", "debit_id=42"))
+
+
+def test_session_log_errors_do_not_fail_the_request(caplog):
+    sessions = Sessions(end_error=RuntimeError("database down"))
+    with caplog.at_level(logging.ERROR, logger="ml"):
+        assert analyze(Wallet(), Ml(), sessions)["cost"] == 2.0
+    assert sessions.ended == ["completed"]
+    assert "database down" in caplog.text
+
+
+def test_nothing_is_predicted_or_refunded_without_a_debit():
+    wallet, ml = Wallet(balance=1.0), Ml()
+    with pytest.raises(HTTPException) as error:
+        analyze(wallet, ml, Sessions())
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        analyze(wallet, ml, Sessions(), model_id=2)
+    assert error.value.status_code == 404
+    assert ml.calls == 0
+    assert wallet.calls == [("debit", 2.0)]
+
+    # A free request debits nothing, so a failed prediction has nothing to refund.
+    wallet = Wallet()
+    with pytest.raises(HTTPException):
+        analyze(wallet, Ml(RuntimeError("failed")), Sessions(), texts=("",))
+    assert wallet.calls == []
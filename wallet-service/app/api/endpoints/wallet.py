@@ -2,8 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from db.database import get_db
 from db.models import Wallet
-from schemas import WalletCreate, WalletResponse, TopUpRequest
-from utils import get_wallet, create_wallet, update_balance
+from schemas import WalletCreate, WalletResponse, TopUpRequest, AmountRequest, RefundRequest, DebitResponse
+from utils import get_wallet, create_wallet, update_balance, debit_balance, refund_debit
 from auth import get_current_user
 import logging
 
@@ -46,4 +46,40 @@ async def topup_wallet(
     wallet = await update_balance(db, user_id, amount)
     logger.info("Wallet topped up")
     return wallet
-        
\ No newline at end of file
+
+@router.post("/{user_id}/debit", response_model=DebitResponse)
+async def debit_wallet(
+    user_id: int,
+    request: AmountRequest,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Debits the amount, or responds with 400 if the balance is not enough.
+
+    The response carries the ``debit_id`` that ``/refund`` takes.
+    """
+    if user_id != int(current_user["sub"]):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    wallet, debit_id = await debit_balance(db, user_id, request.amount)
+    logger.info(f"Wallet debited, debit {debit_id}")
+    return DebitResponse(id=wallet.id, user_id=wallet.user_id, balance=wallet.balance, debit_id=debit_id)
+
+@router.post("/{user_id}/refund", response_model=WalletResponse)
+async def refund_wallet(
+    user_id: int,
+    request: RefundRequest,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Returns the amount of one of the caller's debits to the wallet.
+
+    Every debit is refunded at most once: 404 for an unknown debit, 409 for
+    one that was already refunded.
+    """
+    if user_id != int(current_user["sub"]):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    wallet = await refund_debit(db, user_id, request.debit_id)
+    logger.info(f"Wallet refunded, debit {request.debit_id}")
+    return wallet
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, func
 from db.database import Base, engine
 
 class Wallet(Base):
@@ -6,4 +6,14 @@ class Wallet(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, unique=True)
-    balance = Column(Float, default=0.0)
\ No newline at end of file
+    balance = Column(Float, default=0.0)
+
+class WalletDebit(Base):
+    """A debit that can be refunded once, by its id."""
+    __tablename__ = "wallet_debit"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    amount = Column(Float, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+    refunded_at = Column(DateTime)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class WalletCreate(BaseModel):
     user_id: int
@@ -6,10 +6,19 @@ class WalletCreate(BaseModel):
 class TopUpRequest(BaseModel):
     amount: float
 
+class AmountRequest(BaseModel):
+    amount: float = Field(gt=0)
+
+class RefundRequest(BaseModel):
+    debit_id: int
+
 class WalletResponse(BaseModel):
     id: int
     user_id: int
     balance: float
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class DebitResponse(WalletResponse):
+    debit_id: int
\ No newline at end of file
@@ -1,6 +1,7 @@
-from sqlalchemy import select, update
+from typing import Tuple
+from sqlalchemy import func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.models import Wallet
+from db.models import Wallet, WalletDebit
 from fastapi import HTTPException
 
 async def get_wallet(db: AsyncSession, user_id: int) -> Wallet:
@@ -19,15 +20,98 @@ async def create_wallet(db: AsyncSession, user_id: int) -> Wallet:
     return wallet
 
 async def update_balance(db: AsyncSession, user_id: int, amount: float) -> Wallet:
-    wallet = await get_wallet(db, user_id)
+    # One UPDATE ... RETURNING: concurrent top-ups never overwrite each other.
+    stmt = (
+        update(Wallet)
+        .where(Wallet.user_id == user_id)
+        .values(balance=Wallet.balance + amount)
+        .returning(Wallet)
+    )
+    wallet = await _apply(db, stmt)
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
+    return wallet
+
+async def debit_balance(db: AsyncSession, user_id: int, amount: float) -> Tuple[Wallet, int]:
+    """
+    Debits the wallet in a single conditional UPDATE ... RETURNING and records
+    the debit in the same transaction. Returns the wallet and the debit id.
+
+    The balance check and the write are one statement, so parallel debits of
+    the same user can neither overdraw the wallet nor lose an update.
+    """
+    debit = (
+        update(Wallet)
+        .where(Wallet.user_id == user_id, Wallet.balance >= amount)
+        .values(balance=Wallet.balance - amount)
+        .returning(Wallet)
+    )
     try:
-        wallet.balance += amount
-        db.add(wallet)
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
+        wallet = (await db.execute(debit)).scalars().first()
+        debit_id = None
+        if wallet:
+            debit_id = (await db.execute(
+                insert(WalletDebit).values(user_id=user_id, amount=amount).returning(WalletDebit.id)
+            )).scalar_one()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    if not wallet:
+        # Only a failed debit pays for the second query.
+        if not await get_wallet(db, user_id):
+            raise HTTPException(status_code=404, detail="Wallet not found")
+        raise HTTPException(status_code=400, detail="Insufficient funds")
+    return wallet, debit_id
+
+async def refund_debit(db: AsyncSession, user_id: int, debit_id: int) -> Wallet:
+    """
+    Returns the amount of one of the user's debits to the wallet, at most once.
+
+    Marking the debit refunded is a conditional UPDATE in the same transaction
+    as the credit, so a repeated or concurrent refund of the debit credits nothing.
+    """
+    mark = (
+        update(WalletDebit)
+        .where(WalletDebit.id == debit_id, WalletDebit.user_id == user_id, WalletDebit.refunded_at.is_(None))
+        .values(refunded_at=func.now())
+        .returning(WalletDebit.amount)
+    )
+    try:
+        amount = (await db.execute(mark)).scalar()
+        wallet = None
+        if amount is not None:
+            wallet = (await db.execute(
+                update(Wallet)
+                .where(Wallet.user_id == user_id)
+                .values(balance=Wallet.balance + amount)
+                .returning(Wallet)
+            )).scalars().first()
+            if not wallet:
+                await db.rollback()
+                raise HTTPException(status_code=404, detail="Wallet not found")
         await db.commit()
-    return wallet
\ No newline at end of file
+    except HTTPException:
+        raise
+    except Exception:
+        await db.rollback()
+        raise
+    if amount is None:
+        refunded = (await db.execute(
+            select(WalletDebit.refunded_at).where(WalletDebit.id == debit_id, WalletDebit.user_id == user_id)
+        )).first()
+        if refunded is None:
+            raise HTTPException(status_code=404, detail="Debit not found")
+        raise HTTPException(status_code=409, detail="Debit already refunded")
+    return wallet
+
+async def _apply(db: AsyncSession, stmt) -> Wallet:
+    # Database errors are not the client's fault: roll back and let them
+    # surface as a 500 instead of a 400 the caller would take for a refusal.
+    try:
+        wallet = (await db.execute(stmt)).scalars().first()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return wallet
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+pytest.importorskip("aiosqlite")
+
+import utils
+from db.database import Base
+from db.models import Wallet
+
+
+def run(test, tmp_path):
+    """Runs ``test(sessions)`` against a fresh file database holding a wallet of 10 for user 1."""
+    async def main():
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'wallet.db'}", connect_args={"timeout": 30}
+        )
+        sessions = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            async with sessions() as db:
+                db.add(Wallet(user_id=1, balance=10.0))
+                await db.commit()
+            await test(sessions)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+async def balance(sessions, user_id=1):
+    async with sessions() as db:
+        return (await db.execute(select(Wallet.balance).where(Wallet.user_id == user_id))).scalar_one()
+
+
+def test_debit_records_a_refundable_debit(tmp_path):
+    async def test(sessions):
+        async with sessions() as db:
+            wallet, debit_id = await utils.debit_balance(db, 1, 4)
+        assert wallet.balance == 6
+        assert debit_id is not None
+        async with sessions() as db:
+            assert (await utils.refund_debit(db, 1, debit_id)).balance == 10
+
+    run(test, tmp_path)
+
+
+def test_insufficient_funds_debit_nothing(tmp_path):
+    async def test(sessions):
+        async with sessions() as db:
+            with pytest.raises(HTTPException) as error:
+                await utils.debit_balance(db, 1, 10.01)
+            assert (error.value.status_code, error.value.detail) == (400, "Insufficient funds")
+            with pytest.raises(HTTPException) as error:
+                await utils.debit_balance(db, 2, 1)
+            assert (error.value.status_code, error.value.detail) == (404, "Wallet not found")
+        assert await balance(sessions) == 10
+
+    run(test, tmp_path)
+
+
+def test_concurrent_debits_never_overdraw(tmp_path):
+    async def test(sessions):
+        async def debit():
+            async with sessions() as db:
+                try:
+                    return (await utils.debit_balance(db, 1, 3))[1]
+                except HTTPException as e:
+                    assert e.status_code == 400
+                    return None
+
+        debit_ids = await asyncio.gather(*(debit() for _ in range(8)))
+        succeeded = [debit_id for debit_id in debit_ids if debit_id is not None]
+        assert len(succeeded) == 3
+        assert len(set(succeeded)) == 3
+        assert await balance(sessions) == 1
+
+    run(test, tmp_path)
+
+
+def test_a_debit_is_refunded_at_most_once(tmp_path):
+    async def test(sessions):
+        async with sessions() as db:
+            _, debit_id = await utils.debit_balance(db, 1, 4)
+
+        async def refund():
+            async with sessions() as db:
+                try:
+                    await utils.refund_debit(db, 1, debit_id)
+                    return 200
+                except HTTPException as e:
+                    return e.status_code
+
+        assert sorted(await asyncio.gather(*(refund() for _ in range(4)))) == [200, 409, 409, 409]
+        assert await balance(sessions) == 10
+
+    run(test, tmp_path)
+
+
+def test_refunds_only_the_users_own_debits(tmp_path):
+    async def test(sessions):
+        async with sessions() as db:
+            db.add(Wallet(user_id=2, balance=0.0))
+            await db.commit()
+            _, debit_id = await utils.debit_balance(db, 1, 4)
+            for user_id, refunded in ((2, debit_id), (1, debit_id + 1)):
+                with pytest.raises(HTTPException) as error:
+                    await utils.refund_debit(db, user_id, refunded)
+                assert (error.value.status_code, error.value.detail) == (404, "Debit not found")
+        assert await balance(sessions, 1) == 6
+        assert await balance(sessions, 2) == 0
+
+    run(test, tmp_path)